@@ -1,9 +1,66 @@
+"""
+Memory and speed of the core classes.
+
+    python class_benchmarks.py create [npositions]
+
+measures the time and the resident memory needed to create the five
+views (probe, object, exit, diff, mask) and the pod of `npositions`
+scan positions (default 1e5) as well as one batched update of the
+views. Without arguments, the growth of the View records is followed
+with memory_profiler.
+"""
+import sys
+import time
+import resource
 import numpy as np
 import ptypy
 from ptypy import utils as u
 from ptypy.core import View, Container, Storage, Base, POD
-from memory_profiler import profile
 import gc 
+
+
+def rss_mb():
+    """ Current resident set size in MB (Linux only). """
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1e6
+
+
+def creation_benchmark(npos):
+    names = ['probe', 'obj', 'exit', 'diff', 'mask']
+    containers = [Container(data_type='real') for n in names]
+    storages = [C.new_storage(shape=(1, 7, 7), psize=1.) for C in containers]
+    owner = Base()
+    coords = np.random.rand(npos, 2) * 1000.
+    pods = []
+
+    gc.collect()
+    rss0 = rss_mb()
+    t0 = time.perf_counter()
+    for k in range(npos):
+        views = {}
+        for name, C, S in zip(names, containers, storages):
+            views[name] = View(C, ID=None, storageID=S.ID, psize=1., shape=(4, 4), coord=coords[k])
+        pods.append(POD(owner, views=views))
+    dt = time.perf_counter() - t0
+    gc.collect()
+    drss = rss_mb() - rss0
+
+    t0 = time.perf_counter()
+    for S in storages:
+        S.update_views()
+    dtu = time.perf_counter() - t0
+
+    print('%d positions (%d views, %d pods)' % (npos, len(names) * npos, npos))
+    print('%20s : %8.2f s (%6.1f us per position)' % ('creation', dt, dt / npos * 1e6))
+    print('%20s : %8.1f MB (%6.0f bytes per position)' % ('resident memory', drss, drss * 1e6 / npos))
+    print('%20s : %8.2f s' % ('update all views', dtu))
+
+
+if sys.argv[1:2] == ['create']:
+    creation_benchmark(int(float(sys.argv[2])) if len(sys.argv) > 2 else int(1e5))
+    sys.exit(0)
+
+from memory_profiler import profile
 nviews = 5000
 steps = 4
 
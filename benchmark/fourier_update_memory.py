@@ -0,0 +1,70 @@
+"""
+Memory high-water mark of the Fourier update of the numpy backend.
+
+Compares the chunked, in-place FourierUpdateKernel with the equivalent
+full-stack numpy expressions (as used before the kernel was chunked).
+Reports the peak of additional memory allocated during one
+fourier_error / error_reduce / fmag_all_update pass, relative to the
+size of the auxiliary wave stack.
+
+Usage: python fourier_update_memory.py [frames] [frame_size] [nmodes]
+"""
+import sys
+import time
+import tracemalloc
+import numpy as np
+from ptypy.accelerate.base.kernels import FourierUpdateKernel
+
+nframes = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+fsize = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+nmodes = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+pbound = 0.5
+
+
+def full_stack_update(aux, mag, mask, mask_sum, err_sum, denom=1e-7):
+    sh = mag.shape
+    tf = aux.reshape(sh[0], nmodes, sh[1], sh[2])
+    af = np.sqrt((np.abs(tf) ** 2).sum(1))
+    fdev = af - mag
+    ferr = mask * np.abs(fdev) ** 2 / mask_sum.reshape((sh[0], 1, 1))
+    err_sum[:] = ferr.sum(-1).sum(-1)
+    renorm = np.ones((sh[0],), np.float32)
+    ind = err_sum > pbound
+    renorm[ind] = np.sqrt(pbound / err_sum[ind])
+    renorm = renorm.reshape((sh[0], 1, 1))
+    fm = (1 - mask) + mask * (mag + fdev * renorm) / (fdev + mag + denom)
+    aux[:] = (tf * fm[:, np.newaxis, :, :]).reshape(aux.shape)
+
+
+def chunked_update(FUK, aux, mag, mask, mask_sum, err_sum):
+    FUK.fourier_error(aux, None, mag, mask, mask_sum)
+    FUK.error_reduce(None, err_sum)
+    FUK.fmag_all_update(aux, None, mag, mask, err_sum, pbound)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    func(*args)
+    dt = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, dt
+
+
+ash = (nframes * nmodes, fsize, fsize)
+aux = (np.random.rand(*ash) + 1j * np.random.rand(*ash)).astype(np.complex64)
+mag = np.random.rand(nframes, fsize, fsize).astype(np.float32)
+mask = (np.random.rand(nframes, fsize, fsize) > 0.1).astype(np.float32)
+mask_sum = mask.sum(-1).sum(-1)
+err_sum = np.zeros((nframes,), dtype=np.float32)
+
+FUK = FourierUpdateKernel(aux, nmodes)
+FUK.allocate()
+
+print('%d frames of %dx%d, %d mode(s), aux stack is %.1f MB'
+      % (nframes, fsize, fsize, nmodes, aux.nbytes / 1e6))
+for name, func, args in [('full stack', full_stack_update, (aux, mag, mask, mask_sum, err_sum)),
+                         ('chunked', chunked_update, (FUK, aux, mag, mask, mask_sum, err_sum))]:
+    peak, dt = measure(func, *args)
+    print('%12s : peak %9.1f MB (%5.2f x aux), %8.1f ms' % (name, peak / 1e6, peak / aux.nbytes, dt * 1e3))
@@ -0,0 +1,74 @@
+"""
+Write throughput of h5write / h5append for the compression settings
+in ``ptypy.io.h5options``.
+
+A complex64 object storage of the given size is written with h5write
+(as in an autosave), and the same amount of float32 diffraction frames
+is appended in chunks with h5append (as for .ptyd files). Prints
+throughput and compression ratio for each setting.
+
+Usage: python h5write_speed.py [size_in_GB] [frame_size]
+"""
+import sys
+import os
+import time
+import tempfile
+import shutil
+import numpy as np
+from ptypy import io
+
+size = float(sys.argv[1]) if len(sys.argv) > 1 else 1.
+fsize = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+nchunks = 8
+
+# Smooth phase object with some noise, compresses like a reconstruction
+nlayers = max(1, int(size * 1e9 / 8 / fsize**2 / 64))
+ny = nx = 8 * fsize
+y, x = np.indices((ny, nx), dtype=np.float32) / fsize
+phase = np.sin(3 * x) * np.cos(2 * y) + 0.01 * np.random.rand(ny, nx).astype(np.float32)
+obj = np.empty((nlayers, ny, nx), dtype=np.complex64)
+obj[:] = np.exp(1j * phase) * (0.9 + 0.1 * np.cos(y))
+
+# Poisson-like diffraction frames, mostly small integers
+nframes = max(nchunks, int(size * 1e9 / 4 / fsize**2))
+frames = np.random.poisson(np.exp(-np.hypot(*np.indices((fsize, fsize)) - fsize / 2.) / 8.) * 1e3,
+                           size=(nframes // nchunks, fsize, fsize)).astype(np.float32)
+
+settings = [
+    ('gzip (default)', dict(COMPRESSION='gzip', COMPRESSION_OPTS=None, SHUFFLE=False, CHUNKS=None)),
+    ('gzip 1 + shuffle', dict(COMPRESSION='gzip', COMPRESSION_OPTS=1, SHUFFLE=True, CHUNKS=None)),
+    ('gzip 1 + shuffle + frames', dict(COMPRESSION='gzip', COMPRESSION_OPTS=1, SHUFFLE=True, CHUNKS=(1, 0, 0))),
+    ('lzf', dict(COMPRESSION='lzf', COMPRESSION_OPTS=None, SHUFFLE=False, CHUNKS=None)),
+    ('lzf + shuffle', dict(COMPRESSION='lzf', COMPRESSION_OPTS=None, SHUFFLE=True, CHUNKS=None)),
+    ('none', dict(COMPRESSION=None, COMPRESSION_OPTS=None, SHUFFLE=False, CHUNKS=None)),
+]
+
+tmp = tempfile.mkdtemp(prefix='h5write_speed')
+defaults = dict(io.h5options)
+print('object %.2f GB, frames %.2f GB (%d chunks of %dx%d frames)'
+      % (obj.nbytes / 1e9, frames.nbytes * nchunks / 1e9, nchunks, fsize, fsize))
+print('%28s %16s %10s %16s %10s' % ('setting', 'h5write [MB/s]', 'ratio', 'h5append [MB/s]', 'ratio'))
+try:
+    for name, options in settings:
+        io.h5options.update(options)
+
+        fname = os.path.join(tmp, 'obj.h5')
+        t0 = time.perf_counter()
+        io.h5write(fname, content={'obj': {'S00': {'data': obj}}})
+        tw = time.perf_counter() - t0
+        rw = obj.nbytes / os.path.getsize(fname)
+        os.remove(fname)
+
+        fname = os.path.join(tmp, 'frames.h5')
+        t0 = time.perf_counter()
+        for i in range(nchunks):
+            io.h5append(fname, **{'chunk%02d' % i: {'data': frames}})
+        ta = time.perf_counter() - t0
+        ra = frames.nbytes * nchunks / os.path.getsize(fname)
+        os.remove(fname)
+
+        print('%28s %16.1f %10.2f %16.1f %10.2f'
+              % (name, obj.nbytes / tw / 1e6, rw, frames.nbytes * nchunks / ta / 1e6, ra))
+finally:
+    io.h5options.update(defaults)
+    shutil.rmtree(tmp)
@@ -0,0 +1,68 @@
+"""
+Compares the looped and the vectorized (scatter-add) object/probe update
+kernels of the numpy backend. Prints the time for one overlap update
+(ob_update + pr_update) as a function of frame count and frame size.
+"""
+import time
+import numpy as np
+from ptypy.accelerate.base.kernels import PoUpdateKernel, VectorizedPoUpdateKernel
+
+COMPLEX_TYPE = np.complex64
+FLOAT_TYPE = np.float32
+INT_TYPE = np.int32
+
+
+def prepare_arrays(scan_pts=20, frame_size=32, overlap=0.2, num_pr_modes=1, num_ob_modes=1):
+    fsh = (frame_size, frame_size)
+    shift = max(int(frame_size * overlap), 1)
+    X, Y = np.indices((scan_pts, scan_pts)) * shift
+    X = X.flatten() + 5
+    Y = Y.flatten() + 5
+    num_pts = len(X)
+    osh = (Y.max() + 5 + fsh[0], X.max() + 5 + fsh[1])
+    num_modes = num_ob_modes * num_pr_modes
+
+    probe = np.ones((num_pr_modes,) + fsh, dtype=COMPLEX_TYPE)
+    object_array = np.ones((num_ob_modes,) + osh, dtype=COMPLEX_TYPE)
+    exit_wave = np.ones((num_pts * num_modes,) + fsh, dtype=COMPLEX_TYPE)
+    object_array_denominator = np.ones((num_ob_modes,) + osh, dtype=FLOAT_TYPE)
+    probe_denominator = np.ones((num_pr_modes,) + fsh, dtype=FLOAT_TYPE)
+
+    addr = np.zeros((num_pts, num_modes, 5, 3), dtype=INT_TYPE)
+    exit_idx = 0
+    for position_idx, (xpos, ypos) in enumerate(zip(X, Y)):
+        mode_idx = 0
+        for pr_mode in range(num_pr_modes):
+            for ob_mode in range(num_ob_modes):
+                addr[position_idx, mode_idx] = np.array([[pr_mode, 0, 0],
+                                                         [ob_mode, ypos, xpos],
+                                                         [exit_idx, 0, 0],
+                                                         [0, 0, 0],
+                                                         [0, 0, 0]], dtype=INT_TYPE)
+                mode_idx += 1
+                exit_idx += 1
+
+    return addr, object_array, object_array_denominator, probe, exit_wave, probe_denominator
+
+
+def time_update(pok, arrays, repeat=3):
+    addr, ob, obn, pr, ex, prn = arrays
+    best = np.inf
+    for r in range(repeat):
+        t1 = time.perf_counter()
+        pok.ob_update(addr, ob, obn, pr, ex)
+        pok.pr_update(addr, pr, prn, ob, ex)
+        best = min(best, time.perf_counter() - t1)
+    return best
+
+
+looped = PoUpdateKernel()
+vectorized = VectorizedPoUpdateKernel()
+
+print('%8s %8s %12s %12s %8s' % ('frames', 'size', 'looped [ms]', 'vector [ms]', 'speedup'))
+for frame_size in [16, 32, 64, 128]:
+    for scan_pts in [10, 30, 50, 100]:
+        arrays = prepare_arrays(scan_pts, frame_size)
+        tl = time_update(looped, arrays)
+        tv = time_update(vectorized, arrays)
+        print('%8d %8d %12.2f %12.2f %8.2f' % (scan_pts**2, frame_size, tl * 1e3, tv * 1e3, tl / tv))
@@ -0,0 +1,68 @@
+"""
+Convergence per wall-clock time of the ML_serial optimizers, the
+Polak-Ribiere conjugate gradient ('cg') and L-BFGS ('lbfgs'), on the
+moonflower test data. Prints the time per iteration, the error after
+a quarter, half and all of the iterations and the time each optimizer
+needs to get below the final error of CG.
+
+Usage: python ml_lbfgs_speed.py [frames] [frame_size] [iterations] [lbfgs_memory]
+"""
+import sys
+import tempfile
+import numpy as np
+import ptypy
+from ptypy.core import Ptycho
+from ptypy import utils as u
+ptypy.load_gpu_engines("serial")
+
+nframes = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+fsize = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+numiter = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+memory = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+
+
+def run(optimizer):
+    p = u.Param()
+    p.verbose_level = "critical"
+    p.io = u.Param()
+    p.io.home = tempfile.gettempdir()
+    p.io.rfile = None
+    p.io.autosave = u.Param(active=False)
+    p.io.autoplot = u.Param(active=False)
+    p.io.interaction = u.Param(active=False)
+    p.scans = u.Param()
+    p.scans.MF = u.Param()
+    p.scans.MF.name = 'BlockFull'
+    p.scans.MF.propagation = 'farfield'
+    p.scans.MF.data = u.Param()
+    p.scans.MF.data.name = 'MoonFlowerScan'
+    p.scans.MF.data.shape = fsize
+    p.scans.MF.data.num_frames = nframes
+    p.scans.MF.data.save = None
+    p.scans.MF.data.add_poisson_noise = True
+    p.engines = u.Param()
+    p.engines.engine00 = u.Param()
+    p.engines.engine00.name = 'ML_serial'
+    p.engines.engine00.optimizer = optimizer
+    p.engines.engine00.lbfgs_memory = memory
+    p.engines.engine00.numiter = numiter
+    p.engines.engine00.reg_del2 = True
+    p.engines.engine00.reg_del2_amplitude = 1.
+    np.random.seed(0)
+    P = Ptycho(p, level=4)
+    P.run()
+    info = P.runtime.iter_info
+    # Iteration durations exclude the engine setup
+    return np.cumsum([i['duration'] for i in info]), np.array([i['error'][1] for i in info])
+
+
+results = dict((opt, run(opt)) for opt in ['cg', 'lbfgs'])
+target = results['cg'][1][-1]
+
+print('%d frames of %dx%d, %d iterations, L-BFGS memory %d' % (nframes, fsize, fsize, numiter, memory))
+print('%10s %10s %14s %14s %14s %18s' % ('optimizer', 'ms/it', 'error 1/4', 'error 1/2', 'error', 'time to CG error'))
+for opt, (t, err) in results.items():
+    reached = np.nonzero(err <= target)[0]
+    t_target = '%.2f s' % t[reached[0]] if len(reached) else '-'
+    print('%10s %10.1f %14.4g %14.4g %14.4g %18s' % (opt, t[-1] / len(t) * 1e3, err[len(err) // 4 - 1],
+                                                    err[len(err) // 2 - 1], err[-1], t_target))
@@ -0,0 +1,62 @@
+"""
+Compares the noise models of the pod-looped ML engine with the
+frame-batched ones of ML_serial. Prints the wall time of a full run
+(including engine setup) per iteration and the final error for each
+ML_type.
+
+Usage: python ml_models_speed.py [frames] [frame_size] [iterations]
+"""
+import sys
+import time
+import tempfile
+import numpy as np
+import ptypy
+from ptypy.core import Ptycho
+from ptypy import utils as u
+ptypy.load_gpu_engines("serial")
+
+nframes = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+fsize = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+numiter = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+
+def run(engine, ML_type):
+    p = u.Param()
+    p.verbose_level = "critical"
+    p.io = u.Param()
+    p.io.home = tempfile.gettempdir()
+    p.io.rfile = None
+    p.io.autosave = u.Param(active=False)
+    p.io.autoplot = u.Param(active=False)
+    p.io.interaction = u.Param(active=False)
+    p.scans = u.Param()
+    p.scans.MF = u.Param()
+    p.scans.MF.name = 'BlockFull'
+    p.scans.MF.propagation = 'farfield'
+    p.scans.MF.data = u.Param()
+    p.scans.MF.data.name = 'MoonFlowerScan'
+    p.scans.MF.data.shape = fsize
+    p.scans.MF.data.num_frames = nframes
+    p.scans.MF.data.save = None
+    p.scans.MF.data.add_poisson_noise = True
+    p.engines = u.Param()
+    p.engines.engine00 = u.Param()
+    p.engines.engine00.name = engine
+    p.engines.engine00.ML_type = ML_type
+    p.engines.engine00.numiter = numiter
+    p.engines.engine00.reg_del2 = True
+    p.engines.engine00.reg_del2_amplitude = 1.
+    np.random.seed(0)
+    P = Ptycho(p, level=4)
+    t0 = time.perf_counter()
+    P.run()
+    dt = time.perf_counter() - t0
+    return dt / numiter, P.runtime.iter_info[-1]['error'][1]
+
+
+print('%d frames of %dx%d, %d iterations' % (nframes, fsize, fsize, numiter))
+print('%10s %16s %16s %8s %14s %14s' % ('ML_type', 'ML [ms/it]', 'ML_serial [ms/it]', 'speedup', 'error ML', 'error serial'))
+for ML_type in ['Gaussian', 'Poisson', 'Euclid']:
+    tl, el = run('ML', ML_type)
+    tb, eb = run('ML_serial', ML_type)
+    print('%10s %16.1f %16.1f %8.2f %14.4g %14.4g' % (ML_type, tl * 1e3, tb * 1e3, tl / tb, el, eb))
@@ -15,13 +15,14 @@ import numpy as np
 import time
 
 from ptypy.engines.ML import ML, BaseModel
-from .projectional_serial import serialize_array_access
+from .projectional_serial import AddressBook
 from ptypy import utils as u
 from ptypy.utils.verbose import logger, log
 from ptypy.utils import parallel
 from ptypy.engines.utils import Cnorm2, Cdot
 from ptypy.engines import register
-from ptypy.accelerate.base.kernels import GradientDescentKernel, AuxiliaryWaveKernel, PoUpdateKernel, PositionCorrectionKernel
+from ptypy.accelerate.base.kernels import GradientDescentKernel, AuxiliaryWaveKernel, PoUpdateKernel, \
+    VectorizedPoUpdateKernel, PositionCorrectionKernel
 from ptypy.accelerate.base import address_manglers
 from ptypy.accelerate.base.array_utils import complex_gaussian_filter, complex_gaussian_filter_fft
 
@@ -38,6 +39,14 @@ class ML_serial(ML):
     default = convolution
     type = str
     help = Method to be used for smoothing the gradient, choose between ```convolution``` or ```fft```.
+
+    [vectorized_po_update]
+    default = False
+    type = bool
+    help = Use the vectorized scatter-add version of the object and probe update kernels
+    doc = Replaces the Python loop over all views by one gather and one ``np.add.at`` scatter per update.
+      This pays off for scans with many small frames, for large frames the looped version is usually faster.
+    userlevel = 2
     """
 
     def __init__(self, ptycho_parent, pars=None):
@@ -48,6 +57,7 @@ class ML_serial(ML):
 
         self.kernels = {}
         self.diff_info = {}
+        self.address_book = AddressBook()
         self.cn2_ob_grad = 0.
         self.cn2_pr_grad = 0.
 
@@ -64,9 +74,9 @@ class ML_serial(ML):
         if self.p.ML_type.lower() == "gaussian":
             self.ML_model = GaussianModel(self)
         elif self.p.ML_type.lower() == "poisson":
-            raise NotImplementedError('Poisson norm model not yet implemented')
+            self.ML_model = PoissonModel(self)
         elif self.p.ML_type.lower() == "euclid":
-            raise NotImplementedError('Euclid norm model not yet implemented')
+            self.ML_model = EuclidModel(self)
         else:
             raise RuntimeError("Unsupported ML_type: '%s'" % self.p.ML_type)
 
@@ -104,14 +114,14 @@ class ML_serial(ML):
             kern.GDK = GradientDescentKernel(aux, nmodes)
             kern.GDK.allocate()
 
-            kern.POK = PoUpdateKernel()
+            kern.POK = VectorizedPoUpdateKernel() if self.p.vectorized_po_update else PoUpdateKernel()
             kern.POK.allocate()
 
             kern.AWK = AuxiliaryWaveKernel()
             kern.AWK.allocate()
 
-            kern.FW = geo.propagator.fw
-            kern.BW = geo.propagator.bw
+            kern.FW = geo.propagator.fw_inplace
+            kern.BW = geo.propagator.bw_inplace
             kern.resolution = geo.resolution[0]
 
             if self.do_position_refinement:
@@ -131,12 +141,12 @@ class ML_serial(ML):
             # they get overridden if self.p.floating_intensities=True
             prep.float_intens_coeff = np.ones((d.data.shape[0],), dtype=np.float32)
 
-        # Unfortunately this needs to be done for all pods, since
-        # the shape of the probe / object was modified.
-        # TODO: possible scaling issue
+        # The addresses of all pods need to be refreshed since the shape of
+        # the probe / object may have changed, the address book only reads
+        # the views of new pods.
         for label, d in self.di.storages.items():
             prep = self.diff_info[d.ID]
-            prep.view_IDs, prep.poe_IDs, prep.addr = serialize_array_access(d)
+            prep.view_IDs, prep.poe_IDs, prep.addr = self.address_book.serialize(d)
             # Re-create exit addresses when gradient models (single exit buffer per view) are used
             # TODO: this should not be necessary, kernels should not use exit wave information
             if self.kernels[prep.label].scanmodel in ("GradFull", "BlockGradFull"):
@@ -154,12 +164,15 @@ class ML_serial(ML):
 
     def _get_smooth_gradient(self, data, sigma):
         if self.p.smooth_gradient_method == "convolution":
-            return complex_gaussian_filter(data, sigma)
+            return complex_gaussian_filter(data, [sigma, sigma])
         elif self.p.smooth_gradient_method == "fft":
-            return complex_gaussian_filter_fft(data, sigma)
+            return complex_gaussian_filter_fft(data, [sigma, sigma])
         else:
             raise NotImplementedError("smooth_gradient_method should be ```convolution``` or ```fft```.")
 
+    def _smooth(self, data):
+        return self._get_smooth_gradient(data, self.smooth_gradient.sigma)
+
     def _replace_ob_grad(self):
         new_ob_grad = self.ob_grad_new
         # Smoothing preconditioner
@@ -203,6 +216,9 @@ class ML_serial(ML):
             error_dct = self.ML_model.new_grad()
             tg += time.time() - t1
 
+            if self.p.optimizer == 'lbfgs':
+                self._lbfgs_begin_update()
+
             cn2_new_pr_grad, cdotr_pr_grad = self._replace_pr_grad()
             cn2_new_ob_grad, cdotr_ob_grad = self._replace_ob_grad()
 
@@ -222,37 +238,40 @@ class ML_serial(ML):
             else:
                 self.scale_p_o = self.p.scale_probe_object
 
-            ############################
-            # Compute next conjugate
-            ############################
-            if self.curiter == 0:
-                bt = 0.
+            dt = self.ptycho.FType
+            if self.p.optimizer == 'lbfgs':
+                self._lbfgs_direction()
             else:
-                bt_num = (self.scale_p_o * (cn2_new_pr_grad - cdotr_pr_grad) + (cn2_new_ob_grad - cdotr_ob_grad))
+                ############################
+                # Compute next conjugate
+                ############################
+                if self.curiter == 0:
+                    bt = 0.
+                else:
+                    bt_num = (self.scale_p_o * (cn2_new_pr_grad - cdotr_pr_grad) + (cn2_new_ob_grad - cdotr_ob_grad))
 
-                bt_denom = self.scale_p_o * self.cn2_pr_grad + self.cn2_ob_grad
+                    bt_denom = self.scale_p_o * self.cn2_pr_grad + self.cn2_ob_grad
 
-                bt = max(0, bt_num / bt_denom)
+                    bt = max(0, bt_num / bt_denom)
 
-            # logger.info('Polak-Ribiere coefficient: %f ' % bt)
+                # logger.info('Polak-Ribiere coefficient: %f ' % bt)
 
-            self.cn2_ob_grad = cn2_new_ob_grad
-            self.cn2_pr_grad = cn2_new_pr_grad
+                self.cn2_ob_grad = cn2_new_ob_grad
+                self.cn2_pr_grad = cn2_new_pr_grad
 
-            dt = self.ptycho.FType
-            # 3. Next conjugate
-            self.ob_h *= dt(bt / self.tmin)
+                # 3. Next conjugate
+                self.ob_h *= dt(bt / self.tmin)
 
-            # Smoothing preconditioner
-            if self.smooth_gradient:
-                for name, s in self.ob_h.storages.items():
-                    s.data[:] -= self._get_smooth_gradient(self.ob_grad.storages[name].data, self.smooth_gradient.sigma)
-            else:
-                self.ob_h -= self.ob_grad
+                # Smoothing preconditioner
+                if self.smooth_gradient:
+                    for name, s in self.ob_h.storages.items():
+                        s.data[:] -= self._get_smooth_gradient(self.ob_grad.storages[name].data, self.smooth_gradient.sigma)
+                else:
+                    self.ob_h -= self.ob_grad
 
-            self.pr_h *= dt(bt / self.tmin)
-            self.pr_grad *= dt(self.scale_p_o)
-            self.pr_h -= self.pr_grad
+                self.pr_h *= dt(bt / self.tmin)
+                self.pr_grad *= dt(self.scale_p_o)
+                self.pr_h -= self.pr_grad
 
             # In principle, the way things are now programmed this part
             # could be iterated over in a real Newton-Raphson style.
@@ -325,7 +344,7 @@ class ML_serial(ML):
 
                 # We need to re-calculate the current error
                 PCK.build_aux(aux, addr, ob, pr)
-                aux[:] = FW(aux)
+                FW(aux)
                 PCK.log_likelihood_ml(aux, addr, I, w, err_phot)
                 error_state = np.zeros_like(err_phot)
                 error_state[:] = err_phot
@@ -335,7 +354,7 @@ class ML_serial(ML):
                 for i in range(PCK.mangler.nshifts):
                     PCK.mangler.get_address(i, addr, mangled_addr, max_oby, max_obx)
                     PCK.build_aux(aux, mangled_addr, ob, pr)
-                    aux[:] = FW(aux)
+                    FW(aux)
                     PCK.log_likelihood_ml(aux, mangled_addr, I, w, err_phot)
                     PCK.update_addr_and_error_state(addr, error_state, mangled_addr, err_phot)
 
@@ -369,6 +388,10 @@ class ML_serial(ML):
 class BaseModelSerial(BaseModel):
     """
     Base class for log-likelihood models.
+
+    Gradient and line coefficients are computed frame-batched, one
+    diffraction storage at a time. Subclasses provide the noise model
+    specific steps in :py:meth:`_grad_kernels` and :py:meth:`_fill_b`.
     """
 
     def __del__(self):
@@ -377,37 +400,27 @@ class BaseModelSerial(BaseModel):
         """
         pass
 
-
-class GaussianModel(BaseModelSerial):
-    """
-    Gaussian noise model.
-    TODO: feed actual statistical weights instead of using the Poisson statistic heuristic.
-    """
-
-    def __init__(self, MLengine):
+    def _grad_kernels(self, GDK, aux, addr, prep):
         """
-        Core functions for ML computation using a Gaussian model.
+        Turns the propagated exit waves in `aux` into the weighted
+        Fourier-space gradient and fills ``prep.err_phot``.
         """
-        super(GaussianModel, self).__init__(MLengine)
-
-    def prepare(self):
-
-        super(GaussianModel, self).prepare()
-
-        for label, d in self.engine.ptycho.new_data:
-            prep = self.engine.diff_info[d.ID]
-            prep.weights = (self.Irenorm * self.engine.ma.S[d.ID].data
-                            / (1. / self.Irenorm + d.data)).astype(d.data.dtype)
+        raise NotImplementedError
 
-    def __del__(self):
+    def _fill_b(self, GDK, f, a, b, addr, prep, Brenorm, B):
         """
-        Clean up routine
+        Adds the line coefficients of one storage to `B`, `f`, `a`
+        and `b` are the propagated waves of order 0, 1 and 2 in the
+        step size.
         """
-        super(GaussianModel, self).__del__()
+        raise NotImplementedError
+
+    def _Brenorm(self):
+        return 1. / self.LL[0] ** 2
 
     def new_grad(self):
         """
-        Compute a new gradient direction according to a Gaussian noise model.
+        Compute a new gradient direction according to the noise model.
 
         Note: The negative log-likelihood and local errors are also computed
         here.
@@ -416,6 +429,7 @@ class GaussianModel(BaseModelSerial):
         pr_grad = self.engine.pr_grad_new
         ob_grad << 0.
         pr_grad << 0.
+        self._clear_wave_cache()
 
         # We need an array for MPI
         LL = np.array([0.])
@@ -439,31 +453,24 @@ class GaussianModel(BaseModelSerial):
 
             # get addresses and auxilliary array
             addr = prep.addr
-            w = prep.weights
-            err_phot = prep.err_phot
-            fic = prep.float_intens_coeff
 
             # local references
             ob = self.engine.ob.S[oID].data
             obg = ob_grad.S[oID].data
             pr = self.engine.pr.S[pID].data
             prg = pr_grad.S[pID].data
-            I = prep.I
 
             # make propagated exit (to buffer)
             AWK.build_aux_no_ex(aux, addr, ob, pr, add=False)
 
             # forward prop
-            aux[:] = FW(aux)
-
-            GDK.make_model(aux, addr)
+            FW(aux)
+            if self.p.wave_cache:
+                self._keep_wave(dID, aux[:prep.I.shape[0] * GDK.nmodes].copy())
 
-            if self.p.floating_intensities:
-                GDK.floating_intensity(addr, w, I, fic)
+            self._grad_kernels(GDK, aux, addr, prep)
 
-            GDK.main(aux, addr, w, I)
-            GDK.error_reduce(addr, err_phot)
-            aux[:] = BW(aux)
+            BW(aux)
 
             POK.ob_update_ML(addr, obg, pr, aux)
             POK.pr_update_ML(addr, prg, ob, aux)
@@ -477,16 +484,8 @@ class GaussianModel(BaseModelSerial):
             errs = np.ascontiguousarray(np.vstack([err_fourier, err_phot, err_exit]).T)
             error_dct.update(zip(prep.view_IDs, errs))
 
-        # MPI reduction of gradients
-        ob_grad.allreduce()
-        pr_grad.allreduce()
-        parallel.allreduce(LL)
-
-        # Object regularizer
-        if self.regularizer:
-            for name, s in self.engine.ob.storages.items():
-                ob_grad.storages[name].data += self.regularizer.grad(s.data)
-                LL += self.regularizer.LL
+        # MPI reduction of gradients, object regularizer
+        self._reduce_grad(LL)
 
         self.LL = LL / self.tot_measpts
         return error_dct
@@ -498,7 +497,7 @@ class GaussianModel(BaseModelSerial):
         """
 
         B = np.zeros((3,), dtype=np.longdouble)
-        Brenorm = 1. / self.LL[0] ** 2
+        Brenorm = self._Brenorm()
 
         # Outer loop: through diffraction patterns
         for dID in self.di.S.keys():
@@ -520,29 +519,30 @@ class GaussianModel(BaseModelSerial):
 
             # get addresses and auxilliary array
             addr = prep.addr
-            w = prep.weights
-            fic = prep.float_intens_coeff
 
             # local references
             ob = self.ob.S[oID].data
             ob_h = c_ob_h.S[oID].data
             pr = self.pr.S[pID].data
             pr_h = c_pr_h.S[pID].data
-            I = self.di.S[dID].data
 
-            # make propagated exit (to buffer)
-            AWK.build_aux_no_ex(f, addr, ob, pr, add=False)
+            # make propagated exit (to buffer), unless kept from new_grad
+            cached = self._cached_wave(dID)
+            if cached is None:
+                AWK.build_aux_no_ex(f, addr, ob, pr, add=False)
+            else:
+                f = cached
             AWK.build_aux_no_ex(a, addr, ob_h, pr, add=False)
             AWK.build_aux_no_ex(a, addr, ob, pr_h, add=True)
             AWK.build_aux_no_ex(b, addr, ob_h, pr_h, add=False)
 
             # forward prop
-            f[:] = FW(f)
-            a[:] = FW(a)
-            b[:] = FW(b)
+            if cached is None:
+                FW(f)
+            FW(a)
+            FW(b)
 
-            GDK.make_a012(f, a, b, addr, I, fic)
-            GDK.fill_b(addr, Brenorm, w, B)
+            self._fill_b(GDK, f, a, b, addr, prep, Brenorm, B)
 
         parallel.allreduce(B)
 
@@ -555,3 +555,120 @@ class GaussianModel(BaseModelSerial):
         self.B = B
 
         return B
+
+
+class GaussianModel(BaseModelSerial):
+    """
+    Gaussian noise model.
+    TODO: feed actual statistical weights instead of using the Poisson statistic heuristic.
+    """
+
+    def __init__(self, MLengine):
+        """
+        Core functions for ML computation using a Gaussian model.
+        """
+        super(GaussianModel, self).__init__(MLengine)
+
+    def prepare(self):
+
+        super(GaussianModel, self).prepare()
+
+        for label, d in self.engine.ptycho.new_data:
+            prep = self.engine.diff_info[d.ID]
+            prep.weights = (self.Irenorm * self.engine.ma.S[d.ID].data
+                            / (1. / self.Irenorm + d.data)).astype(d.data.dtype)
+
+    def __del__(self):
+        """
+        Clean up routine
+        """
+        super(GaussianModel, self).__del__()
+
+    def _grad_kernels(self, GDK, aux, addr, prep):
+        GDK.make_model(aux, addr)
+
+        if self.p.floating_intensities:
+            GDK.floating_intensity(addr, prep.weights, prep.I, prep.float_intens_coeff)
+
+        GDK.main(aux, addr, prep.weights, prep.I)
+        GDK.error_reduce(addr, prep.err_phot)
+
+    def _fill_b(self, GDK, f, a, b, addr, prep, Brenorm, B):
+        GDK.make_a012(f, a, b, addr, prep.I, prep.float_intens_coeff)
+        GDK.fill_b(addr, Brenorm, prep.weights, B)
+
+
+class PoissonModel(BaseModelSerial):
+    """
+    Poisson noise model.
+    """
+
+    def __init__(self, MLengine):
+        """
+        Core functions for ML computation using a Poisson model.
+        """
+        super(PoissonModel, self).__init__(MLengine)
+
+    def prepare(self):
+
+        super(PoissonModel, self).prepare()
+
+        from scipy import special
+        for label, d in self.engine.ptycho.new_data:
+            prep = self.engine.diff_info[d.ID]
+            prep.weights = self.engine.ma.S[d.ID].data.astype(d.data.dtype)
+            prep.LLbase = special.gammaln(d.data + 1.).sum(-1).sum(-1).astype(np.float64)
+
+    def _grad_kernels(self, GDK, aux, addr, prep):
+        GDK.make_model(aux, addr)
+
+        if self.p.floating_intensities:
+            GDK.floating_intensity_poisson(addr, prep.I, prep.float_intens_coeff)
+
+        GDK.main_poisson(aux, addr, prep.weights, prep.I)
+        GDK.error_reduce(addr, prep.err_phot)
+        prep.err_phot += prep.LLbase
+
+    def _fill_b(self, GDK, f, a, b, addr, prep, Brenorm, B):
+        GDK.make_a012_no_I(f, a, b, addr, prep.I, prep.float_intens_coeff)
+        GDK.fill_b_poisson(addr, Brenorm, prep.weights, prep.I, prep.LLbase, B)
+
+    def _Brenorm(self):
+        return 1. / (self.tot_measpts * self.LL[0]) ** 2
+
+
+class EuclidModel(BaseModelSerial):
+    """
+    Euclidean (Amplitude) noise model.
+    TODO: feed actual statistical weights instead of using a fixed variance.
+    """
+
+    def __init__(self, MLengine):
+        """
+        Core functions for ML computation using a Euclidean model.
+        """
+        super(EuclidModel, self).__init__(MLengine)
+
+    def prepare(self):
+
+        super(EuclidModel, self).prepare()
+
+        for label, d in self.engine.ptycho.new_data:
+            prep = self.engine.diff_info[d.ID]
+            # just the mask for now
+            prep.weights = self.engine.ma.S[d.ID].data.astype(d.data.dtype)
+            prep.A = np.sqrt(d.data)
+
+    def _grad_kernels(self, GDK, aux, addr, prep):
+        GDK.make_model(aux, addr)
+
+        if self.p.floating_intensities:
+            GDK.floating_intensity_euclid(addr, prep.A, prep.float_intens_coeff)
+
+        GDK.main_euclid(aux, addr, prep.weights, prep.A)
+        GDK.error_reduce(addr, prep.err_phot)
+
+    def _fill_b(self, GDK, f, a, b, addr, prep, Brenorm, B):
+        # The floating coefficients scale the amplitudes
+        GDK.make_a012_no_I(f, a, b, addr, prep.I, prep.float_intens_coeff ** 2)
+        GDK.fill_b_euclid(addr, Brenorm, prep.weights, prep.A, B)
@@ -15,7 +15,8 @@ from ptypy.utils.verbose import logger, log
 from ptypy.utils import parallel
 from ptypy.engines import register
 from ptypy.engines.projectional import _ProjectionEngine, DMMixin, RAARMixin
-from ptypy.accelerate.base.kernels import FourierUpdateKernel, AuxiliaryWaveKernel, PoUpdateKernel, PositionCorrectionKernel
+from ptypy.accelerate.base.kernels import FourierUpdateKernel, AuxiliaryWaveKernel, PoUpdateKernel, \
+    VectorizedPoUpdateKernel, PositionCorrectionKernel
 from ptypy.accelerate.base import array_utils as au
 
 
@@ -96,10 +97,223 @@ def serialize_array_access(diff_storage):
     return view_IDs, poe_ID, np.array(addr).astype(np.int32)
 
 
+
+def addressed_box(addr, frame_shape, margin=0):
+    """
+    Bounding box ``(row_start, row_stop, col_start, col_stop)`` of the
+    object region addressed by `addr`, for frames of `frame_shape` and
+    grown by `margin` pixels on every side.
+    """
+    rows, cols = frame_shape
+    obc = addr[:, :, 1, 1:].reshape(-1, 2)
+    return (obc[:, 0].min() - margin, obc[:, 0].max() + rows + margin,
+            obc[:, 1].min() - margin, obc[:, 1].max() + cols + margin)
+
+
+def union_box(boxes, shape):
+    """
+    Smallest box containing all `boxes`, clipped to an array of `shape`.
+    An empty list gives an empty box.
+    """
+    if not boxes:
+        return (0, 0, 0, 0)
+    r0, r1, c0, c1 = np.array(boxes).T
+    return (max(int(r0.min()), 0), min(int(r1.max()), shape[0]),
+            max(int(c0.min()), 0), min(int(c1.max()), shape[1]))
+
+
+def largest_halo(domains):
+    """
+    Largest area that the box of any rank shares with the boxes of all
+    other ranks, counted once per overlapping rank.
+    """
+    halo = 0
+    for r0, r1, c0, c1 in domains:
+        area = 0
+        for s0, s1, d0, d1 in domains:
+            area += max(min(r1, s1) - max(r0, s0), 0) * max(min(c1, d1) - max(c0, d0), 0)
+        halo = max(halo, area - (r1 - r0) * (c1 - c0))
+    return halo
+
+
+def cover_weights(domains, shape):
+    """
+    Per pixel inertia weights for a halo exchange over `domains`. The
+    weights of all ranks whose box contains a pixel add up to the number
+    of ranks, just like the inertia of a full allreduce.
+    """
+    cover = np.zeros(shape, dtype=np.float32)
+    for r0, r1, c0, c1 in domains:
+        cover[r0:r1, c0:c1] += 1
+    return len(domains) / np.maximum(cover, 1)
+
+
+def owner_map(domains, shape, offset=(0, 0)):
+    """
+    Rank that owns each pixel of an array of `shape`, i.e. the lowest
+    rank whose box, shifted by `offset`, contains it. Pixels outside all
+    boxes belong to rank 0.
+    """
+    r, c = offset
+    owner = np.zeros(shape, dtype=int)
+    for n in range(len(domains) - 1, -1, -1):
+        r0, r1, c0, c1 = domains[n]
+        owner[max(r0 + r, 0):max(r1 + r, 0), max(c0 + c, 0):max(c1 + c, 0)] = n
+    return owner
+
+
+
+class AddressBook(object):
+    """
+    Incrementally built address arrays, as returned by
+    :py:func:`serialize_array_access`, for the diffraction storages
+    of an engine.
+
+    Coordinates, shapes and layers of the views of a pod are read only
+    once, when the pod first shows up in its diffraction storage. The
+    addresses themselves depend on the current layout of the storages
+    (the object grows and layers are added as new data arrives) and are
+    recomputed from these tables in a single numpy pass per storage.
+    """
+    _views = ('pr_view', 'ob_view', 'ex_view', 'di_view', 'ma_view')
+
+    def __init__(self):
+        self._entries = {}
+
+    def serialize(self, diff_storage):
+        """
+        Returns view IDs, (probe, object, exit) storage IDs and the int32
+        address array of `diff_storage`, sorted by diffraction layer.
+        """
+        views = diff_storage.views
+        entry = self._entries.get(diff_storage.ID)
+        n = 0 if entry is None else len(entry.view_IDs)
+        if entry is None or [v.ID for v in views[:n]] != entry.view_IDs:
+            # First call or the active views are not those of the last
+            # call followed by new ones, start over
+            entry = self._new_entry()
+            self._entries[diff_storage.ID] = entry
+            n = 0
+        if len(views) > n:
+            self._append(entry, views[n:])
+
+        # Sort views according to layer in diffraction stack
+        addr = self._addresses(entry)
+        order = np.argsort(addr[:, 0, 3, 0], kind='stable')
+        view_IDs = [entry.view_IDs[i] for i in order]
+
+        return view_IDs, entry.poe_ID, addr[order]
+
+    @staticmethod
+    def _new_entry():
+        entry = u.Param()
+        entry.view_IDs = []
+        entry.poe_ID = None
+        # Per view kind: storages and, per pod, storage index, layer, coordinate and shape
+        entry.storages = [[] for k in AddressBook._views]
+        entry.tables = None
+        return entry
+
+    def _append(self, entry, views):
+        """
+        Read the access information of the pods on the new `views`.
+        """
+        if entry.poe_ID is None:
+            mpod = views[0].pod
+            entry.poe_ID = (mpod.pr_view.storage.ID, mpod.ob_view.storage.ID, mpod.ex_view.storage.ID)
+        pr, ob, ex = entry.poe_ID
+
+        # Storage index and access record of each view of each pod
+        sidx = []
+        records = []
+        for view in views:
+            for pod in view.pods.values():
+                for k, name in enumerate(self._views):
+                    v = getattr(pod, name)
+                    storages = entry.storages[k]
+                    if v.storage not in storages:
+                        storages.append(v.storage)
+                    sidx.append(storages.index(v.storage))
+                    records.append(v._record)
+
+                if pod.pr_view.storage.ID != pr:
+                    log(1, "Splitting probes for one diffraction stack is not supported in " + __name__)
+                if pod.ob_view.storage.ID != ob:
+                    log(1, "Splitting objects for one diffraction stack is not supported in " + __name__)
+                if pod.ex_view.storage.ID != ex:
+                    log(1, "Splitting exit stacks for one diffraction stack is not supported in " + __name__)
+
+        sh = (len(views), -1, len(self._views))
+        records = np.array(records, dtype=records[0].dtype)
+        sidx = np.array(sidx).reshape(sh)
+        layer = records['layer'].reshape(sh)
+        coord = records['coord'][:, :2].reshape(sh + (2,))
+        shape = records['shape'][:, :2].reshape(sh + (2,))
+
+        new = (sidx, layer, coord, shape)
+        if entry.tables is None:
+            entry.tables = new
+        else:
+            entry.tables = tuple(np.concatenate([t, n]) for t, n in zip(entry.tables, new))
+        entry.view_IDs.extend(v.ID for v in views)
+
+    def _addresses(self, entry):
+        """
+        Compute (dlayer, dlow) of all views in the current storage layouts,
+        the same way :py:meth:`Storage.update_views` and
+        :py:meth:`Storage.reformat` do it for each view.
+        """
+        sidx, layer, coord, shape = entry.tables
+        addr = np.zeros(layer.shape + (3,), dtype=np.int32)
+        for k in range(len(self._views)):
+            for n, s in enumerate(entry.storages[k]):
+                sel = (sidx[..., k] == n)
+                pcoord = (coord[..., k, :][sel] - s.origin) / s.psize
+                dcoord = np.round(pcoord + 0.00001).astype(int)
+                addr[..., k, 1:][sel] = dcoord - shape[..., k, :][sel] // 2
+                layermap = np.asarray(s.layermap)
+                lorder = np.argsort(layermap)
+                addr[..., k, 0][sel] = lorder[np.searchsorted(layermap, layer[..., k][sel], sorter=lorder)]
+        return addr
+
+
 class _ProjectionEngine_serial(_ProjectionEngine):
     """
     A full-fledged Difference Map engine that uses numpy arrays instead of iteration.
 
+    Defaults:
+
+    [vectorized_po_update]
+    default = False
+    type = bool
+    help = Use the vectorized scatter-add version of the object and probe update kernels
+    doc = Replaces the Python loop over all views by one gather and one ``np.add.at`` scatter per update.
+      This pays off for scans with many small frames, for large frames the looped version is usually faster.
+    userlevel = 2
+
+    [halo_exchange]
+    default = False
+    type = bool
+    help = Exchange only overlapping object regions between MPI ranks in the object update
+    doc = Each rank keeps the object up to date only inside the bounding box of its own views and
+      sums contributions with its neighbours only where these boxes overlap. This reduces the
+      communication from the whole object to a halo of about one probe width per rank. Falls back
+      to a full allreduce if the boxes overlap too much to make this worthwhile, or if ``obj_smooth_std``
+      is set. The full object is reassembled on all ranks whenever it may be read from outside the
+      engine (autosave, autoplot, interaction server), before the boxes change and when the
+      engine finishes.
+    userlevel = 2
+
+    [redistribute_data]
+    default = None
+    type = str
+    help = Redistribute views among MPI ranks into contiguous spatial domains
+    doc = One of ``'rect'``, ``'row'``, ``'column'`` or ``'angle'``, see :py:meth:`Ptycho._redistribute_data`.
+      Use this together with ``halo_exchange`` for scan patterns in which consecutive frames are
+      not close to each other.
+    choices = None, 'rect', 'row', 'column', 'angle'
+    userlevel = 2
+
     """
 
     def __init__(self, ptycho_parent, pars=None):
@@ -123,10 +337,17 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
         # Stores all information needed with respect to the diffraction storages.
         self.diff_info = {}
+        self.address_book = AddressBook()
         self.ob_cfact = {}
         self.pr_cfact = {}
         self.kernels = {}
 
+        # Per object storage, the bounding boxes of all ranks and the
+        # resulting inertia weights (halo exchange)
+        self.ob_domains = {}
+        self.ob_cover = {}
+        self.ob_origins = {}
+
     def engine_initialize(self):
         """
         Prepare for reconstruction.
@@ -182,14 +403,14 @@ class _ProjectionEngine_serial(_ProjectionEngine):
             kern.FUK = FourierUpdateKernel(aux, nmodes)
             kern.FUK.allocate()
 
-            kern.POK = PoUpdateKernel()
+            kern.POK = VectorizedPoUpdateKernel() if self.p.vectorized_po_update else PoUpdateKernel()
             kern.POK.allocate()
 
             kern.AWK = AuxiliaryWaveKernel()
             kern.AWK.allocate()
 
-            kern.FW = geo.propagator.fw
-            kern.BW = geo.propagator.bw
+            kern.FW = geo.propagator.fw_inplace
+            kern.BW = geo.propagator.bw_inplace
             kern.resolution = geo.resolution[0]
 
             if self.do_position_refinement:
@@ -198,29 +419,41 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
     def engine_prepare(self):
 
+        # Move views into contiguous spatial domains before serialization
+        new_data = self.ptycho.new_data
+        if self.p.redistribute_data and new_data and parallel.MPIenabled:
+            self.ptycho._redistribute_data(div=self.p.redistribute_data)
+            # diffraction stacks may have grown, resize the kernel buffers
+            for s in self.di.storages.values():
+                scan = self.ptycho.model.scans[s.label]
+                scan.max_frames_per_block = max(scan.max_frames_per_block, s.nlayers)
+            self._setup_kernels()
+            # frames have moved in and out of all diffraction storages
+            new_data = [(d.label, d) for d in self.di.storages.values()]
+
         super().engine_prepare()
 
         ## Serialize new data ##
 
-        for label, d in self.ptycho.new_data:
+        for label, d in new_data:
             prep = u.Param()
 
             prep.label = label
             self.diff_info[d.ID] = prep
-            prep.mag = np.sqrt(np.abs(d.data))
-            prep.ma = self.ma.S[d.ID].data.astype(np.float32)
+            prep.mag, prep.ma = self._block_arrays(d)
             # self.ma.S[d.ID].data = prep.ma
             prep.ma_sum = prep.ma.sum(-1).sum(-1)
             prep.err_phot = np.zeros_like(prep.ma_sum)
             prep.err_fourier = np.zeros_like(prep.ma_sum)
             prep.err_exit = np.zeros_like(prep.ma_sum)
 
-        # Unfortunately this needs to be done for all pods, since
-        # the shape of the probe / object was modified.
-        # TODO: possible scaling issue, remove the need for padding
+        # The addresses of all pods need to be refreshed since the shape of
+        # the probe / object may have changed, the address book only reads
+        # the views of new pods.
+        # TODO: remove the need for padding
         for label, d in self.di.storages.items():
             prep = self.diff_info[d.ID]
-            prep.view_IDs, prep.poe_IDs, prep.addr = serialize_array_access(d)
+            prep.view_IDs, prep.poe_IDs, prep.addr = self.address_book.serialize(d)
             if self.do_position_refinement:
                 prep.original_addr = np.zeros_like(prep.addr)
                 prep.original_addr[:] = prep.addr
@@ -234,6 +467,107 @@ class _ProjectionEngine_serial(_ProjectionEngine):
             cfact = self.p.probe_inertia * len(pr.views) / pr.data.shape[0]
             self.pr_cfact[pID] = cfact / u.parallel.size
 
+        self._update_object_domains()
+
+    def _block_arrays(self, d):
+        """
+        Fourier magnitudes and float mask of the new diffraction block `d`.
+        """
+        return np.sqrt(np.abs(d.data)), self.ma.S[d.ID].data.astype(np.float32)
+
+    def _update_object_domains(self):
+        """
+        Work out the bounding box of the object region addressed by the
+        views of this rank and share it with all other ranks. Object
+        storages for which the halo regions would not be smaller than the
+        object itself fall back to a full allreduce.
+        """
+        # Pixels outside the old boxes are only up to date after assembly
+        self._assemble_object()
+        self.ob_domains = {}
+        self.ob_cover = {}
+        self.ob_origins = {}
+        if not (self.p.halo_exchange and parallel.MPIenabled):
+            return
+        if self.p.obj_smooth_std is not None:
+            # Smoothing would mix outdated pixels into the boxes
+            log(3, 'Halo exchange is not available with object smoothing, using allreduce')
+            return
+
+        boxes = {}
+        for dID in self.di.S.keys():
+            prep = self.diff_info[dID]
+            pID, oID, eID = prep.poe_IDs
+            kern = self.kernels[prep.label]
+            # views may be shifted by position refinement
+            if self.do_position_refinement:
+                margin = int(np.ceil(self.p.position_refinement.max_shift / kern.resolution))
+            else:
+                margin = 0
+            boxes.setdefault(oID, []).append(addressed_box(prep.addr, kern.aux.shape[-2:], margin))
+
+        for oID, ob in self.ob.storages.items():
+            sh = ob.shape[-2:]
+            domains = parallel.comm.allgather(union_box(boxes.get(oID, []), sh))
+            halo = largest_halo(domains)
+            if halo < sh[0] * sh[1]:
+                self.ob_domains[oID] = domains
+                self.ob_origins[oID] = ob.origin.copy()
+                self.ob_cover[oID] = cover_weights(domains, sh)
+                log(3, 'Halo exchange for object %s, largest halo is %.1f%% of the object'
+                    % (oID, 100. * halo / (sh[0] * sh[1])))
+            else:
+                log(3, 'Halo exchange for object %s would not save communication, using allreduce' % oID)
+
+    def _object_cfact(self, oID, cfact):
+        """
+        Object inertia factor, per pixel if object `oID` uses halo exchange.
+        """
+        weight = self.ob_cover.get(oID)
+        return cfact if weight is None else cfact * weight
+
+    def _allreduce_object(self, oID, ob, obn):
+        """
+        Sum object and object normalization across ranks, either over the
+        halo regions only or over the full storage.
+        """
+        parallel.waitall(self._iallreduce_object(oID, ob, obn))
+
+    def _iallreduce_object(self, oID, ob, obn):
+        """
+        As :py:meth:`_allreduce_object`, but the full storage sums are
+        only started. Returns the requests to wait for.
+        """
+        domains = self.ob_domains.get(oID)
+        if domains is not None:
+            parallel.allreduce_halo(ob.data, domains)
+            parallel.allreduce_halo(obn.data, domains)
+            return []
+        else:
+            return [parallel.iallreduce(ob.data), parallel.iallreduce(obn.data)]
+
+    def _assemble_object(self):
+        """
+        Make the full object consistent on all ranks after halo exchanges.
+        Each pixel is taken from the lowest rank whose box contains it.
+        """
+        for oID, domains in self.ob_domains.items():
+            ob = self.ob.S[oID]
+            # The object may have been reformatted since the boxes were set up
+            offset = np.round((self.ob_origins[oID] - ob.origin) / ob.psize).astype(int)
+            ob.data *= (owner_map(domains, ob.shape[-2:], offset) == parallel.rank)
+            parallel.allreduce(ob.data)
+
+    def _object_requested(self):
+        """
+        Whether the object may be read from outside the engine before
+        the next call to :py:meth:`engine_iterate`.
+        """
+        io = self.ptycho.p.io
+        if io.interaction.active or io.autoplot.active:
+            return True
+        return io.autosave.active and io.autosave.interval > 0 and self.curiter % io.autosave.interval == 0
+
     def engine_iterate(self, num=1):
         """
         Compute one iteration.
@@ -276,7 +610,7 @@ class _ProjectionEngine_serial(_ProjectionEngine):
                 if self.p.compute_log_likelihood:
                     t1 = time.time()
                     AWK.build_aux_no_ex(aux, addr, ob, pr)
-                    aux[:] = FW(aux)
+                    FW(aux)
                     FUK.log_likelihood(aux, addr, mag, ma, err_phot)
                     self.benchmark.F_LLerror += time.time() - t1
 
@@ -287,7 +621,7 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
                 ## forward FFT
                 t1 = time.time()
-                aux[:] = FW(aux)
+                FW(aux)
                 self.benchmark.B_Prop += time.time() - t1
 
                 ## Deviation from measured data
@@ -299,7 +633,7 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
                 ## backward FFT
                 t1 = time.time()
-                aux[:] = BW(aux)
+                BW(aux)
                 self.benchmark.D_iProp += time.time() - t1
 
                 ## build exit wave
@@ -329,6 +663,9 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
             self.curiter += 1
 
+        if self.ob_domains and self._object_requested():
+            self._assemble_object()
+
         self.error = error
         return error
 
@@ -372,7 +709,7 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
                 # We need to re-calculate the current error
                 PCK.build_aux(aux, addr, ob, pr)
-                aux[:] = FW(aux)
+                FW(aux)
                 if self.p.position_refinement.metric == "fourier":
                     PCK.fourier_error(aux, addr, mag, ma, ma_sum)
                     PCK.error_reduce(addr, err_fourier)
@@ -386,7 +723,7 @@ class _ProjectionEngine_serial(_ProjectionEngine):
                 for i in range(PCK.mangler.nshifts):
                     PCK.mangler.get_address(i, addr, mangled_addr, max_oby, max_obx)
                     PCK.build_aux(aux, mangled_addr, ob, pr)
-                    aux[:] = FW(aux)
+                    FW(aux)
                     if self.p.position_refinement.metric == "fourier":
                         PCK.fourier_error(aux, mangled_addr, mag, ma, ma_sum)
                         PCK.error_reduce(mangled_addr, err_fourier)
@@ -397,6 +734,8 @@ class _ProjectionEngine_serial(_ProjectionEngine):
                 prep.err_fourier = error_state
                 prep.addr = addr
 
+            self._update_object_domains()
+
 
     def overlap_update(self, MPI=True):
         """
@@ -436,6 +775,9 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
             if self.p.obj_smooth_std is not None:
                 log(4, 'Smoothing object, cfact is %.2f' % cfact)
+            cfact = self._object_cfact(oID, cfact)
+
+            if self.p.obj_smooth_std is not None:
                 smooth_mfs = [self.p.obj_smooth_std, self.p.obj_smooth_std]
                 ob.data = cfact * au.complex_gaussian_filter(ob.data, smooth_mfs)
             else:
@@ -458,15 +800,16 @@ class _ProjectionEngine_serial(_ProjectionEngine):
                                self.pr.S[pID].data,
                                self.ex.S[eID].data)
 
+        # MPI test, start all reductions and finish the storages one by one
+        requests = {}
+        if MPI:
+            for oID, ob in self.ob.storages.items():
+                requests[oID] = self._iallreduce_object(oID, ob, self.ob_nrm.S[oID])
+
         for oID, ob in self.ob.storages.items():
             obn = self.ob_nrm.S[oID]
-            # MPI test
-            if MPI:
-                parallel.allreduce(ob.data)
-                parallel.allreduce(obn.data)
-                ob.data /= obn.data
-            else:
-                ob.data /= obn.data
+            parallel.waitall(requests.get(oID))
+            ob.data /= obn.data
 
             # Clip object (This call takes like one ms. Not time critical)
             if self.p.clip_object is not None:
@@ -481,6 +824,12 @@ class _ProjectionEngine_serial(_ProjectionEngine):
         self.benchmark.object_update += time.time() - t1
         self.benchmark.calls_object += 1
 
+    def _blocks(self):
+        """
+        IDs of the diffraction storages, in the order they are processed.
+        """
+        return list(self.di.S.keys())
+
     ## probe update
     def probe_update(self, MPI=False):
         t1 = time.time()
@@ -494,7 +843,7 @@ class _ProjectionEngine_serial(_ProjectionEngine):
             pr.data *= cfact
             prn.data.fill(cfact)
 
-        for dID in self.di.S.keys():
+        for dID in self._blocks():
             prep = self.diff_info[dID]
 
             POK = self.kernels[prep.label].POK
@@ -511,19 +860,19 @@ class _ProjectionEngine_serial(_ProjectionEngine):
             self.benchmark.probe_update += time.time() - t1
             self.benchmark.calls_probe += 1
 
+        # MPI test, start all reductions and finish the storages one by one
+        requests = {}
+        if MPI:
+            for pID, pr in self.pr.storages.items():
+                requests[pID] = [parallel.iallreduce(pr.data), parallel.iallreduce(self.pr_nrm.S[pID].data)]
+
         for pID, pr in self.pr.storages.items():
 
             buf = self.pr_buf.S[pID]
             prn = self.pr_nrm.S[pID]
 
-            # MPI test
-            if MPI:
-                # if False:
-                parallel.allreduce(pr.data)
-                parallel.allreduce(prn.data)
-                pr.data /= prn.data
-            else:
-                pr.data /= prn.data
+            parallel.waitall(requests.get(pID))
+            pr.data /= prn.data
 
             self.support_constraint(pr)
 
@@ -558,6 +907,12 @@ class _ProjectionEngine_serial(_ProjectionEngine):
 
         self._reset_benchmarks()
 
+        # Reassemble the full object on all ranks
+        self._assemble_object()
+        self.ob_domains = {}
+        self.ob_cover = {}
+        self.ob_origins = {}
+
         if self.do_position_refinement and self.p.position_refinement.record:
             for label, d in self.di.storages.items():
                 prep = self.diff_info[d.ID]
@@ -40,7 +40,106 @@ MPI = (parallel.size > 1)
 class DM_serial_stream(DM_serial):
     """
     A full-fledged Difference Map engine that uses numpy arrays instead of iteration.
+
+    Defaults:
+
+    [name]
+    default = DM_serial_stream
+    type = str
+    help =
+    doc =
+
+    [read_ahead]
+    default = 1
+    type = int
+    lowlim = 0
+    help = Number of blocks requested from disk ahead of the one being processed
+    doc = Used for the diffraction blocks of scans with ``out_of_core`` set. The magnitudes, mask
+      and exit waves of these blocks are kept in file-backed memory as well, and the pages of a
+      block are released once it has been processed.
+    userlevel = 2
     """
+
+    def engine_initialize(self):
+        """
+        Prepare for reconstruction.
+        """
+        super().engine_initialize()
+        # mmaps of the file-backed arrays of each diffraction block
+        self._mapped = {}
+
+    def engine_prepare(self):
+        super().engine_prepare()
+        for label, d in self.ptycho.new_data:
+            directory = self._out_of_core(d)
+            if directory is not None:
+                self._map_block(d.ID, directory)
+
+    def _out_of_core(self, d):
+        """
+        Directory for the file-backed arrays of diffraction block `d`,
+        None if the block is held in memory.
+        """
+        if u.mmap_of(d.data) is None:
+            return None
+        return self.ptycho.model.scans[d.label].p.get('out_of_core')
+
+    def _block_arrays(self, d):
+        """
+        Fourier magnitudes and float mask of the new diffraction block `d`,
+        computed straight into file-backed memory if the block is.
+        """
+        directory = self._out_of_core(d)
+        if directory is None:
+            return super()._block_arrays(d)
+        mag = u.file_backed_zeros(d.data.shape, d.data.dtype, directory)
+        np.abs(d.data, out=mag)
+        np.sqrt(mag, out=mag)
+        ma = u.file_backed_zeros(d.data.shape, np.float32, directory)
+        ma[:] = self.ma.S[d.ID].data
+        return mag, ma
+
+    def _map_block(self, dID, directory):
+        """
+        Moves the exit waves of diffraction block `dID` into file-backed
+        memory and releases the pages of all its arrays.
+        """
+        prep = self.diff_info[dID]
+        ex = self.ex.S[prep.poe_IDs[2]]
+        if u.mmap_of(ex.data) is None:
+            data = u.file_backed_zeros(ex.data.shape, ex.data.dtype, directory)
+            data[:] = ex.data
+            ex.fill(data, copy=False)
+        self._mapped[dID] = [u.mmap_of(a) for a in (self.di.S[dID].data, self.ma.S[dID].data,
+                                                    ex.data, prep.mag, prep.ma)]
+        self._advise(dID, 'MADV_DONTNEED')
+
+    def _advise(self, dID, advice):
+        """
+        Passes `advice` (name of a mmap.MADV_* constant) for the
+        file-backed arrays of block `dID` on to the kernel.
+        """
+        for buf in self._mapped.get(dID, []):
+            if buf is not None:
+                u.advise_pages(buf, advice)
+
+    def _blocks(self):
+        """
+        Yields the IDs of the diffraction blocks. Out of core, the next
+        `read_ahead` blocks are requested from disk while a block is
+        processed, and its pages are released afterwards.
+        """
+        dIDs = super()._blocks()
+        if not self._mapped:
+            yield from dIDs
+            return
+        n = len(dIDs)
+        for k, dID in enumerate(dIDs):
+            for j in range(1, min(self.p.read_ahead, n - 1) + 1):
+                self._advise(dIDs[(k + j) % n], 'MADV_WILLNEED')
+            yield dID
+            self._advise(dID, 'MADV_DONTNEED')
+
     def engine_iterate(self, num=1):
         """
         Compute one iteration.
@@ -61,7 +160,7 @@ class DM_serial_stream(DM_serial):
                 # initialize probe and object buffer to receive an update
                 if do_update_object:
                     for oID, ob in self.ob.storages.items():
-                        cfact = self.ob_cfact[oID]
+                        cfact = self._object_cfact(oID, self.ob_cfact[oID])
                         obn = self.ob_nrm.S[oID]
                         obb = self.ob_buf.S[oID]
                         """
@@ -80,7 +179,7 @@ class DM_serial_stream(DM_serial):
                         obn.data[:] = cfact
 
                 # First cycle: Fourier + object update
-                for dID in self.di.S.keys():
+                for dID in self._blocks():
                     t1 = time.time()
 
                     prep = self.diff_info[dID]
@@ -121,7 +220,7 @@ class DM_serial_stream(DM_serial):
 
                         ## FFT
                         t1 = time.time()
-                        aux[:] = FW(aux)
+                        FW(aux)
                         self.benchmark.B_Prop += time.time() - t1
 
                         ## Deviation from measured data
@@ -132,7 +231,7 @@ class DM_serial_stream(DM_serial):
                         self.benchmark.C_Fourier_update += time.time() - t1
 
                         t1 = time.time()
-                        aux[:] = BW(aux)
+                        BW(aux)
                         self.benchmark.D_iProp += time.time() - t1
 
                         ## apply changes #2
@@ -169,8 +268,7 @@ class DM_serial_stream(DM_serial):
                         obb = self.ob_buf.S[oID]
                         # MPI test
                         if MPI:
-                            parallel.allreduce(obb.data)
-                            parallel.allreduce(obn.data)
+                            self._allreduce_object(oID, obb, obn)
                             obb.data /= obn.data
                         else:
                             obb.data /= obn.data
@@ -263,5 +361,8 @@ class DM_serial_stream(DM_serial):
             parallel.barrier()
             self.curiter += 1
 
+        if self.ob_domains and self._object_requested():
+            self._assemble_object()
+
         self.error = error
         return error
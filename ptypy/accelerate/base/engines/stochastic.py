@@ -9,6 +9,9 @@ This file is part of the PTYPY package.
 """
 import numpy as np
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from scipy.spatial import cKDTree
 
 from ptypy import utils as u
 from ptypy.utils.verbose import logger, log
@@ -18,9 +21,11 @@ from ptypy.engines import register
 from ptypy.engines.stochastic import _StochasticEngine, EPIEMixin, SDRMixin
 #from ptypy.core.manager import Full, Vanilla, Bragg3dModel, BlockVanilla, BlockFull
 from ptypy.accelerate.base.engines import projectional_serial
-from ptypy.accelerate.base.kernels import FourierUpdateKernel, AuxiliaryWaveKernel, PoUpdateKernel, PositionCorrectionKernel
+from ptypy.accelerate.base.kernels import FourierUpdateKernel, AuxiliaryWaveKernel, PoUpdateKernel, \
+    VectorizedPoUpdateKernel, PositionCorrectionKernel
 from ptypy.accelerate.base import address_manglers
 from ptypy.accelerate.base import array_utils as au
+from ptypy.core.geometry import HAVE_FFTW
 
 __all__ = ["EPIE_serial", "SDR_serial"]
 
@@ -40,6 +45,37 @@ class _StochasticEngineSerial(_StochasticEngine):
     type = bool
     help = A switch for computing the fourier error (this can impact the performance of the engine)
 
+    [vectorized_po_update]
+    default = False
+    type = bool
+    help = Use the vectorized scatter-add version of the object and probe update kernels
+    doc = Replaces the Python loop over all views by one gather and one ``np.add.at`` scatter per update.
+      This pays off for scans with many small frames, for large frames the looped version is usually faster.
+    userlevel = 2
+
+    [minibatch_size]
+    default = 1
+    type = int
+    lowlim = 1
+    help = Maximum number of views updated together
+    doc = If larger than 1, each shuffled epoch is split into sets of views whose object footprints
+      do not overlap, and every set goes through one batched propagation and one object / probe update.
+      Object updates are the same as in a sequential pass over the views of a set, probe updates of a set
+      are accumulated. Not combined with position refinement.
+    userlevel = 2
+
+    [threads]
+    default = 1
+    type = int
+    lowlim = 1
+    help = Number of threads updating views concurrently
+    doc = If larger than 1, the views of each set of non-overlapping views (see ``minibatch_size``)
+      are distributed over a pool of threads that share the object and probe in memory. As the object
+      regions of a set are disjoint, only the probe update is locked, the probe is read without a lock.
+      The FFTs have to be thread safe, which is not the case for pyFFTW plans. Not combined with
+      position refinement.
+    userlevel = 2
+
     """
 
     #SUPPORTED_MODELS = [Full, Vanilla, Bragg3dModel, BlockVanilla, BlockFull]
@@ -55,9 +91,11 @@ class _StochasticEngineSerial(_StochasticEngine):
 
         # Stores all information needed with respect to the diffraction storages.
         self.diff_info = {}
+        self.address_book = projectional_serial.AddressBook()
         self.ob_cfact = {}
         self.pr_cfact = {}
         self.kernels = {}
+        self.workers = {}
 
     def engine_initialize(self):
         """
@@ -66,6 +104,18 @@ class _StochasticEngineSerial(_StochasticEngine):
         super().engine_initialize()
 
         self.error = []
+        self._minibatch_size = self.p.minibatch_size
+        if self._minibatch_size > 1 and self.do_position_refinement:
+            logger.warning('Mini-batches are not combined with position refinement, '
+                           'views will be updated one by one.')
+            self._minibatch_size = 1
+        self._threads = self.p.threads
+        if self._threads > 1 and self.do_position_refinement:
+            logger.warning('Threads are not combined with position refinement, '
+                           'views will be updated one by one.')
+            self._threads = 1
+        self._probe_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(self._threads) if self._threads > 1 else None
         self._reset_benchmarks()
         self._setup_kernels()
 
@@ -103,29 +153,47 @@ class _StochasticEngineSerial(_StochasticEngine):
             except:
                 nmodes = 1
 
-            # create buffer arrays
-            ash = (nmodes,) + tuple(geo.shape)
-            aux = np.zeros(ash, dtype=np.complex64)
-            kern.aux = aux
-
             # setup kernels, one for each SCAN.
-            kern.FUK = FourierUpdateKernel(aux, nmodes)
-            kern.FUK.allocate()
-
-            kern.POK = PoUpdateKernel()
-            kern.POK.allocate()
-
-            kern.AWK = AuxiliaryWaveKernel()
-            kern.AWK.allocate()
-
-            kern.FW = geo.propagator.fw
-            kern.BW = geo.propagator.bw
+            self._setup_update_kernels(kern, geo, nmodes)
             kern.resolution = geo.resolution[0]
 
+            # every additional thread gets its own buffers
+            nworkers = self._threads
+            if nworkers > 1 and HAVE_FFTW and str(geo.propagator.FFTch.ffttype) in ['fftw', 'planned']:
+                logger.warning('pyFFTW plans are not thread safe, the views of scan %s '
+                               'will be updated by one thread.' % label)
+                nworkers = 1
+            self.workers[label] = [kern]
+            for i in range(1, nworkers):
+                worker = u.Param()
+                self._setup_update_kernels(worker, geo, nmodes)
+                self.workers[label].append(worker)
+
             if self.do_position_refinement:
-                kern.PCK = PositionCorrectionKernel(aux, nmodes, self.p.position_refinement, geo.resolution)
+                kern.PCK = PositionCorrectionKernel(kern.aux, nmodes, self.p.position_refinement, geo.resolution)
                 kern.PCK.allocate()
 
+    def _setup_update_kernels(self, kern, geo, nmodes):
+        """
+        Buffers and kernels for the update of a single view or mini-batch.
+        """
+        # create buffer arrays
+        ash = (nmodes * self._minibatch_size,) + tuple(geo.shape)
+        aux = np.zeros(ash, dtype=np.complex64)
+        kern.aux = aux
+
+        kern.FUK = FourierUpdateKernel(aux, nmodes)
+        kern.FUK.allocate()
+
+        kern.POK = VectorizedPoUpdateKernel() if self.p.vectorized_po_update else PoUpdateKernel()
+        kern.POK.allocate()
+
+        kern.AWK = AuxiliaryWaveKernel()
+        kern.AWK.allocate()
+
+        kern.FW = geo.propagator.fw_inplace
+        kern.BW = geo.propagator.bw_inplace
+
     def engine_prepare(self):
         """
         Last minute initialization.
@@ -152,12 +220,13 @@ class _StochasticEngineSerial(_StochasticEngine):
             prep.err_fourier = np.zeros_like(prep.ma_sum)
             prep.err_exit = np.zeros_like(prep.ma_sum)
 
-        # Unfortunately this needs to be done for all pods, since
-        # the shape of the probe / object was modified.
-        # TODO: possible scaling issue, remove the need for padding
+        # The addresses of all pods need to be refreshed since the shape of
+        # the probe / object may have changed, the address book only reads
+        # the views of new pods.
+        # TODO: remove the need for padding
         for label, d in self.di.storages.items():
             prep = self.diff_info[d.ID]
-            prep.view_IDs, prep.poe_IDs, prep.addr = projectional_serial.serialize_array_access(d)
+            prep.view_IDs, prep.poe_IDs, prep.addr = self.address_book.serialize(d)
             if self.do_position_refinement:
                 prep.original_addr = np.zeros_like(prep.addr)
                 prep.original_addr[:] = prep.addr
@@ -179,6 +248,55 @@ class _StochasticEngineSerial(_StochasticEngine):
             prep.obn = np.zeros_like(prep.mag[0,None], dtype=np.float32)
             prep.prn = np.zeros_like(prep.mag[0,None], dtype=np.float32)
 
+            if self._minibatch_size > 1 or self._threads > 1:
+                # Addresses into the full exit wave stack and one norm
+                # layer per view of a mini-batch and thread
+                prep.addr_batch = prep.addr.copy()
+                prep.addr_batch[:,:,2,0] += prep.addr_ex[:,0,None]
+                prep.obn = np.zeros((self._minibatch_size * self._threads,) + prep.mag.shape[-2:], dtype=np.float32)
+                prep.prn = np.zeros_like(prep.obn)
+                prep.overlaps = self._find_overlaps(prep.addr, prep.mag.shape[-2:])
+
+    def _find_overlaps(self, addr, shape):
+        """
+        Neighbour lists (in CSR layout) of the views whose object
+        footprints overlap.
+        """
+        nviews = addr.shape[0]
+        # Two frames overlap if they are less than a frame apart in both
+        # directions. With this scaling, that is a distance <= 1
+        # in the maximum norm for the integer offsets.
+        pos = addr[:, 0, 1, 1:] / (np.array(shape) - 0.5)
+        pairs = cKDTree(pos).query_pairs(1., p=np.inf, output_type='ndarray')
+        rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        indptr = np.zeros((nviews + 1,), dtype=int)
+        np.cumsum(np.bincount(rows, minlength=nviews), out=indptr[1:])
+        return indptr, cols[np.argsort(rows, kind='stable')]
+
+    def _minibatches(self, prep):
+        """
+        Greedily splits the current view order into sets of views with
+        disjoint object footprints and at most `minibatch_size` members
+        per thread.
+        """
+        indptr, neighbours = prep.overlaps
+        size = self._minibatch_size * len(self.workers[prep.label])
+        vieworder = prep.vieworder
+        color = np.full(vieworder.shape, -1)
+        sizes = []
+        for i in vieworder:
+            taken = set(color[neighbours[indptr[i]:indptr[i+1]]].tolist())
+            c = 0
+            while c in taken or (c < len(sizes) and sizes[c] >= size):
+                c += 1
+            if c == len(sizes):
+                sizes.append(0)
+            sizes[c] += 1
+            color[i] = c
+        order = vieworder[np.argsort(color[vieworder], kind='stable')]
+        return np.split(order, np.cumsum(sizes)[:-1])
+
     def engine_iterate(self, num=1):
         """
         Compute one iteration.
@@ -212,6 +330,11 @@ class _StochasticEngineSerial(_StochasticEngine):
                 vieworder = prep.vieworder
                 prep.rng.shuffle(vieworder)
 
+                if self._minibatch_size > 1 or self._threads > 1:
+                    for views in self._minibatches(prep):
+                        self._update_set(prep, views, ob, pr)
+                    vieworder = []
+
                 # Iterate through views
                 for i in vieworder:
 
@@ -238,7 +361,7 @@ class _StochasticEngineSerial(_StochasticEngine):
 
                     ## forward FFT
                     t1 = time.time()
-                    aux[:] = FW(aux)
+                    FW(aux)
                     self.benchmark.B_Prop += time.time() - t1
 
                     ## Deviation from measured data
@@ -253,7 +376,7 @@ class _StochasticEngineSerial(_StochasticEngine):
 
                     ## backward FFT
                     t1 = time.time()
-                    aux[:] = BW(aux)
+                    BW(aux)
                     self.benchmark.D_iProp += time.time() - t1
 
                     ## build exit wave
@@ -293,7 +416,7 @@ class _StochasticEngineSerial(_StochasticEngine):
                     ## compute log-likelihood
                     if self.p.compute_log_likelihood:
                         t1 = time.time()
-                        aux[:] = FW(aux)
+                        FW(aux)
                         FUK.log_likelihood(aux, addr, mag, ma, err_phot)
                         self.benchmark.F_LLerror += time.time() - t1
 
@@ -312,6 +435,119 @@ class _StochasticEngineSerial(_StochasticEngine):
         #error = parallel.gather_dict(error_dct)
         return error_dct
 
+    def _update_set(self, prep, views, ob, pr):
+        """
+        Updates a set of views with non-overlapping object footprints,
+        split evenly among the threads.
+        """
+        nworkers = len(self.workers[prep.label])
+        if nworkers == 1:
+            self._update_minibatch(prep, views, ob, pr)
+            return
+        chunks = [c for c in np.array_split(views, nworkers) if len(c)]
+        # list() waits for all threads and raises their exceptions
+        list(self._pool.map(lambda w: self._update_minibatch(prep, chunks[w], ob, pr, w),
+                            range(len(chunks))))
+
+    def _update_minibatch(self, prep, views, ob, pr, worker=0):
+        """
+        One batched update of the views `views`, whose object footprints
+        must not overlap, with the buffers of thread `worker`.
+        """
+        kern = self.workers[prep.label][worker]
+        FUK = kern.FUK
+        AWK = kern.AWK
+        POK = kern.POK
+        FW = kern.FW
+        BW = kern.BW
+
+        # Get local adresses and arrays
+        nviews = len(views)
+        addr = prep.addr_batch[views]
+        addr[:,:,4,0] = np.arange(nviews)[:,None]
+        aux = kern.aux[:nviews * addr.shape[1]]
+        ex = prep.ex
+        mag = prep.mag[views]
+        ma = prep.ma[views]
+        ma_sum = prep.ma_sum[views]
+        layers = slice(worker * self._minibatch_size, worker * self._minibatch_size + nviews)
+        obn = prep.obn[layers]
+        prn = prep.prn[layers]
+        err_phot = prep.err_phot[views]
+        err_fourier = prep.err_fourier[views]
+        err_exit = prep.err_exit[views]
+
+        ## build auxilliary wave
+        t1 = time.time()
+        AWK.make_aux(aux, addr, ob, pr, ex, c_po=self._c, c_e=1-self._c)
+        self.benchmark.A_Build_aux += time.time() - t1
+
+        ## forward FFT
+        t1 = time.time()
+        FW(aux)
+        self.benchmark.B_Prop += time.time() - t1
+
+        ## Deviation from measured data
+        t1 = time.time()
+        if self.p.compute_fourier_error:
+            FUK.fourier_error(aux, addr, mag, ma, ma_sum)
+            FUK.error_reduce(addr, err_fourier)
+        else:
+            FUK.fourier_deviation(aux, addr, mag)
+        FUK.fmag_update_nopbound(aux, addr, mag, ma)
+        self.benchmark.C_Fourier_update += time.time() - t1
+
+        ## backward FFT
+        t1 = time.time()
+        BW(aux)
+        self.benchmark.D_iProp += time.time() - t1
+
+        ## build exit wave
+        t1 = time.time()
+        AWK.make_exit(aux, addr, ob, pr, ex, c_a=self._b, c_po=self._a, c_e=-(self._a+self._b))
+        if self.p.compute_exit_error:
+            FUK.exit_error(aux,addr)
+            FUK.error_reduce(addr, err_exit)
+        self.benchmark.E_Build_exit += time.time() - t1
+        self.benchmark.calls_fourier += nviews
+
+        ## build auxilliary wave (ob * pr product)
+        t1 = time.time()
+        AWK.build_aux_no_ex(aux, addr, ob, pr)
+        self.benchmark.A_Build_aux += time.time() - t1
+
+        # object update
+        t1 = time.time()
+        POK.pr_norm_local(addr, pr, prn)
+        POK.ob_update_local(addr, ob, pr, ex, aux, prn, a=self._ob_a, b=self._ob_b)
+        self.benchmark.object_update += time.time() - t1
+        self.benchmark.calls_object += nviews
+
+        # probe update, the object norm maximum is taken per view
+        t1 = time.time()
+        if self._object_norm_is_global and self._pr_a == 0:
+            obn_max = au.max_abs2(ob)
+            obn[:] = 0
+        else:
+            POK.ob_norm_local(addr, ob, obn)
+            obn_max = obn.reshape(nviews, -1).max(-1).reshape(nviews, 1, 1)
+        if self.p.probe_update_start <= self.curiter:
+            with self._probe_lock:
+                POK.pr_update_local(addr, pr, ob, ex, aux, obn, obn_max, a=self._pr_a, b=self._pr_b)
+        self.benchmark.probe_update += time.time() - t1
+        self.benchmark.calls_probe += nviews
+
+        ## compute log-likelihood
+        if self.p.compute_log_likelihood:
+            t1 = time.time()
+            FW(aux)
+            FUK.log_likelihood(aux, addr, mag, ma, err_phot)
+            self.benchmark.F_LLerror += time.time() - t1
+
+        prep.err_phot[views] = err_phot
+        prep.err_fourier[views] = err_fourier
+        prep.err_exit[views] = err_exit
+
     def position_update_local(self, prep, i):
         """
         Position refinement update for current view.
@@ -349,7 +585,7 @@ class _StochasticEngineSerial(_StochasticEngine):
 
             # We first need to calculate the current error
             PCK.build_aux(aux, addr, ob, pr)
-            aux[:] = FW(aux)
+            FW(aux)
             if self.p.position_refinement.metric == "fourier":
                 PCK.fourier_error(aux, addr, mag, ma, ma_sum)
                 PCK.error_reduce(addr, err_fourier)
@@ -363,7 +599,7 @@ class _StochasticEngineSerial(_StochasticEngine):
             for i in range(PCK.mangler.nshifts):
                 PCK.mangler.get_address(i, addr, mangled_addr, max_oby, max_obx)
                 PCK.build_aux(aux, mangled_addr, ob, pr)
-                aux[:] = FW(aux)
+                FW(aux)
                 if self.p.position_refinement.metric == "fourier":
                     PCK.fourier_error(aux, mangled_addr, mag, ma, ma_sum)
                     PCK.error_reduce(mangled_addr, err_fourier)
@@ -398,6 +634,10 @@ class _StochasticEngineSerial(_StochasticEngine):
 
         self._reset_benchmarks()
 
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
         if self.do_position_refinement:
             for label, d in self.di.storages.items():
                 prep = self.diff_info[d.ID]
@@ -22,7 +22,7 @@ class BaseKernel(object):
 
 class FourierUpdateKernel(BaseKernel):
 
-    def __init__(self, aux, nmodes=1):
+    def __init__(self, aux, nmodes=1, chunk_size=None):
 
         super(FourierUpdateKernel, self).__init__()
         self.denom = 1e-7
@@ -30,10 +30,20 @@ class FourierUpdateKernel(BaseKernel):
         ash = aux.shape
         self.fshape = (ash[0] // nmodes, ash[1], ash[2])
 
+        # number of frames processed at once, by default about 1 MB per scratch buffer
+        if chunk_size is None:
+            chunk_size = max(1, 2**18 // (ash[1] * ash[2]))
+        self.chunk_size = min(chunk_size, max(self.fshape[0], 1))
+
         # temporary buffer arrays
         self.npy.fdev = None
         self.npy.ferr = None
 
+        # scratch buffers, one chunk of frames each
+        self.npy.ftmp1 = None
+        self.npy.ftmp2 = None
+        self.npy.renorm = None
+
         self.kernels = [
             'fourier_error',
             'error_reduce',
@@ -49,9 +59,44 @@ class FourierUpdateKernel(BaseKernel):
         self.npy.fdev = np.zeros(self.fshape, dtype=np.float32)
         self.npy.ferr = np.zeros(self.fshape, dtype=np.float32)
 
-    def fourier_error(self, b_aux, addr, mag, mask, mask_sum):
-        # reference shape (write-to shape)
+        # scratch buffer arrays
+        csh = (self.chunk_size,) + self.fshape[1:]
+        self.npy.ftmp1 = np.zeros(csh, dtype=np.float32)
+        self.npy.ftmp2 = np.zeros(csh, dtype=np.float32)
+        self.npy.renorm = np.ones((self.fshape[0],), dtype=np.float32)
+
+    def _chunks(self, maxz):
+        """
+        Iterate over the frame stack in chunks, yields slices for frames
+        and for the (mode-expanded) auxiliary waves.
+        """
+        nmodes = self.nmodes
+        for i0 in range(0, maxz, self.chunk_size):
+            i1 = min(i0 + self.chunk_size, maxz)
+            yield slice(i0, i1), slice(i0 * nmodes, i1 * nmodes)
+
+    @staticmethod
+    def _take(arr, sl):
+        # masks may be shared among all frames
+        return arr if arr.shape[0] == 1 else arr[sl]
+
+    def _model_magnitude(self, aux, out, tmp):
+        """
+        Fourier magnitude of the model, summing up all modes of
+        `aux` incoherently. Written to `out`, `tmp` is scratch space.
+        """
         sh = self.fshape
+        tf = aux.reshape(out.shape[0], self.nmodes, sh[1], sh[2])
+        np.abs(tf[:, 0], out=out)
+        np.square(out, out=out)
+        for m in range(1, self.nmodes):
+            np.abs(tf[:, m], out=tmp)
+            np.square(tmp, out=tmp)
+            out += tmp
+        np.sqrt(out, out=out)
+        return out
+
+    def fourier_error(self, b_aux, addr, mag, mask, mask_sum):
         # stopper
         maxz = mag.shape[0]
 
@@ -62,21 +107,26 @@ class FourierUpdateKernel(BaseKernel):
 
         ## Actual math ##
 
-        # build model from complex fourier magnitudes, summing up
-        # all modes incoherently
-        tf = aux.reshape(maxz, self.nmodes, sh[1], sh[2])
-        af = np.sqrt((np.abs(tf) ** 2).sum(1))
+        for fsl, asl in self._chunks(maxz):
+            n = fsl.stop - fsl.start
+            af = self.npy.ftmp1[:n]
+            tmp = self.npy.ftmp2[:n]
 
-        # calculate difference to real data (g_mag)
-        fdev[:] = af - mag
+            # build model from complex fourier magnitudes, summing up
+            # all modes incoherently
+            self._model_magnitude(aux[asl], af, tmp)
 
-        # Calculate error on fourier magnitudes on a per-pixel basis
-        ferr[:] = mask * np.abs(fdev) ** 2 / mask_sum.reshape((maxz, 1, 1))
+            # calculate difference to real data (g_mag)
+            np.subtract(af, mag[fsl], out=fdev[fsl])
+
+            # Calculate error on fourier magnitudes on a per-pixel basis
+            np.abs(fdev[fsl], out=tmp)
+            np.square(tmp, out=tmp)
+            np.multiply(self._take(mask, fsl), tmp, out=tmp)
+            np.divide(tmp, mask_sum[fsl].reshape((n, 1, 1)), out=ferr[fsl])
         return
 
     def fourier_deviation(self, b_aux, addr, mag):
-        # reference shape (write-to shape)
-        sh = self.fshape
         # stopper
         maxz = mag.shape[0]
 
@@ -86,13 +136,17 @@ class FourierUpdateKernel(BaseKernel):
 
         ## Actual math ##
 
-        # build model from complex fourier magnitudes, summing up
-        # all modes incoherently
-        tf = aux.reshape(maxz, self.nmodes, sh[1], sh[2])
-        af = np.sqrt((np.abs(tf) ** 2).sum(1))
+        for fsl, asl in self._chunks(maxz):
+            n = fsl.stop - fsl.start
+            af = self.npy.ftmp1[:n]
+            tmp = self.npy.ftmp2[:n]
 
-        # calculate difference to real data (g_mag)
-        fdev[:] = af - mag
+            # build model from complex fourier magnitudes, summing up
+            # all modes incoherently
+            self._model_magnitude(aux[asl], af, tmp)
+
+            # calculate difference to real data (g_mag)
+            np.subtract(af, mag[fsl], out=fdev[fsl])
 
         return
 
@@ -113,27 +167,25 @@ class FourierUpdateKernel(BaseKernel):
         err_sum[:] = ferr.sum(-1).sum(-1)
         return
 
-    def fmag_all_update(self, b_aux, addr, mag, mask, err_sum, pbound=0.0):
-
+    def _apply_fm(self, aux, fm):
+        """
+        Multiply all modes of `aux` in place with the magnitude correction `fm`.
+        """
         sh = self.fshape
-        nmodes = self.nmodes
+        tf = aux.reshape(fm.shape[0], self.nmodes, sh[1], sh[2])
+        tf *= fm[:, np.newaxis, :, :]
+
+    def fmag_all_update(self, b_aux, addr, mag, mask, err_sum, pbound=0.0):
 
         # stopper
         maxz = mag.shape[0]
 
         # batch buffers
         fdev = self.npy.fdev[:maxz]
-        aux = b_aux[:maxz * nmodes]
-
-        # write-to shape
-        ish = aux.shape
+        aux = b_aux[:maxz * self.nmodes]
 
         ## Actual math ##
 
-        # local values
-        fm = np.ones((maxz, sh[1], sh[2]), np.float32)
-        renorm = np.ones((maxz,), np.float32)
-
         ## As opposed to DM we use renorm to differentiate the cases.
 
         # pbound >= g_err_sum
@@ -144,43 +196,58 @@ class FourierUpdateKernel(BaseKernel):
         # pbound == 0.0
         # fm = (1 - g_mask) + g_mask * g_mag / (af + 1e-10) (as renorm=0)
 
+        renorm = self.npy.renorm[:maxz]
+        renorm.fill(1.)
         ind = err_sum > pbound
         renorm[ind] = np.sqrt(pbound / err_sum[ind])
-        renorm = renorm.reshape((renorm.shape[0], 1, 1))
-
-        af = fdev + mag
-        fm[:] = (1 - mask) + mask * (mag + fdev * renorm) / (af + self.denom)
 
-        #fm[:] = mag / (af + 1e-6)
-        # upcasting
-        aux[:] = (aux.reshape(ish[0] // nmodes, nmodes, ish[1], ish[2]) * fm[:, np.newaxis, :, :]).reshape(ish)
+        for fsl, asl in self._chunks(maxz):
+            n = fsl.stop - fsl.start
+            fm = self.npy.ftmp1[:n]
+            tmp = self.npy.ftmp2[:n]
+            ma = self._take(mask, fsl)
+
+            # fm = (1 - mask) + mask * (mag + fdev * renorm) / (af + denom)
+            np.multiply(fdev[fsl], renorm[fsl].reshape((n, 1, 1)), out=fm)
+            np.add(mag[fsl], fm, out=fm)
+            np.multiply(ma, fm, out=fm)
+            np.add(fdev[fsl], mag[fsl], out=tmp)
+            np.add(tmp, self.denom, out=tmp)
+            np.divide(fm, tmp, out=fm)
+            np.subtract(1, ma, out=tmp)
+            np.add(tmp, fm, out=fm)
+
+            # upcasting
+            self._apply_fm(aux[asl], fm)
         return
 
     def fmag_update_nopbound(self, b_aux, addr, mag, mask):
 
-        sh = self.fshape
-        nmodes = self.nmodes
-
         # stopper
         maxz = mag.shape[0]
 
         # batch buffers
         fdev = self.npy.fdev[:maxz]
-        aux = b_aux[:maxz * nmodes]
-
-        # write-to shape
-        ish = aux.shape
+        aux = b_aux[:maxz * self.nmodes]
 
         ## Actual math ##
 
-        # local values
-        fm = np.ones((maxz, sh[1], sh[2]), np.float32)
-
-        af = fdev + mag
-        fm[:] = (1 - mask) + mask * mag / (af + self.denom)
-
-        # upcasting
-        aux[:] = (aux.reshape(ish[0] // nmodes, nmodes, ish[1], ish[2]) * fm[:, np.newaxis, :, :]).reshape(ish)
+        for fsl, asl in self._chunks(maxz):
+            n = fsl.stop - fsl.start
+            fm = self.npy.ftmp1[:n]
+            tmp = self.npy.ftmp2[:n]
+            ma = self._take(mask, fsl)
+
+            # fm = (1 - mask) + mask * mag / (af + denom)
+            np.multiply(ma, mag[fsl], out=fm)
+            np.add(fdev[fsl], mag[fsl], out=tmp)
+            np.add(tmp, self.denom, out=tmp)
+            np.divide(fm, tmp, out=fm)
+            np.subtract(1, ma, out=tmp)
+            np.add(tmp, fm, out=fm)
+
+            # upcasting
+            self._apply_fm(aux[asl], fm)
         return
 
     def log_likelihood(self, b_aux, addr, mag, mask, err_phot):
@@ -239,9 +306,16 @@ class GradientDescentKernel(BaseKernel):
             'make_model',
             'error_reduce',
             'make_a012',
+            'make_a012_no_I',
             'fill_b',
+            'fill_b_poisson',
+            'fill_b_euclid',
             'main',
-            'floating_intensity'
+            'main_poisson',
+            'main_euclid',
+            'floating_intensity',
+            'floating_intensity_poisson',
+            'floating_intensity_euclid'
         ]
 
     def allocate(self):
@@ -270,6 +344,14 @@ class GradientDescentKernel(BaseKernel):
         Imodel[:] = ((tf * tf.conj()).real).sum(1)
 
     def make_a012(self, b_f, b_a, b_b, addr, I, fic):
+        self.make_a012_no_I(b_f, b_a, b_b, addr, I, fic)
+        self.npy.Imodel[:I.shape[0]] -= I
+
+    def make_a012_no_I(self, b_f, b_a, b_b, addr, I, fic):
+        """
+        As make_a012, but A0 is the model intensity itself instead of
+        its difference to the measured intensity `I`.
+        """
 
         # reference shape (= GPU global dims)
         sh = I.shape
@@ -290,7 +372,7 @@ class GradientDescentKernel(BaseKernel):
         fc = fic.reshape((maxz,1,1))
         A0.fill(0.)
         tf = np.real(f * f.conj()).astype(self.ftype)
-        A0[:maxz] = np.double(tf.reshape(maxz, self.nmodes, sh[1], sh[2]).sum(1) * fc) - I
+        A0[:maxz] = tf.reshape(maxz, self.nmodes, sh[1], sh[2]).sum(1) * fc
 
         A1.fill(0.)
         tf = 2. * np.real(f * a.conj())
@@ -321,6 +403,45 @@ class GradientDescentKernel(BaseKernel):
         B[2] += np.dot(w.flat, (A1 ** 2 + 2 * A0 * A2).flat) * Brenorm
         return
 
+    def fill_b_poisson(self, addr, Brenorm, m, I, LLbase, B):
+
+        # stopper
+        maxz = m.shape[0]
+
+        A0 = self.npy.Imodel[:maxz]
+        A1 = self.npy.LLerr[:maxz]
+        A2 = self.npy.LLden[:maxz]
+
+        ## Actual math ## (A0 from make_a012_no_I)
+        # The terms span many orders of magnitude, so they are summed in
+        # double precision
+        A0 = np.double(A0) + 1e-6
+        DI = 1. - I / A0
+
+        B[0] += (LLbase.sum() + np.dot(m.flat, (A0 - I * np.log(A0)).flat)) * Brenorm
+        B[1] += np.dot(m.flat, (A1 * DI).flat) * Brenorm
+        B[2] += (np.dot(m.flat, (A2 * DI).flat) + 0.5 * np.dot(m.flat, (I * (A1 / A0) ** 2).flat)) * Brenorm
+        return
+
+    def fill_b_euclid(self, addr, Brenorm, w, A, B):
+
+        # stopper
+        maxz = w.shape[0]
+
+        A0 = self.npy.Imodel[:maxz]
+        A1 = self.npy.LLerr[:maxz]
+        A2 = self.npy.LLden[:maxz]
+
+        ## Actual math ## (A0 from make_a012_no_I)
+        A0 += 1e-12
+        Amodel = np.sqrt(A0)
+        DA = 1. - A / Amodel
+
+        B[0] += np.dot(w.flat, ((Amodel - A) ** 2).flat) * Brenorm
+        B[1] += np.dot(w.flat, (A1 * DA).flat) * Brenorm
+        B[2] += (np.dot(w.flat, (A2 * DA).flat) + 0.25 * np.dot(w.flat, (A1 ** 2 * A / (A0 * Amodel)).flat)) * Brenorm
+        return
+
     def error_reduce(self, addr, err_sum):
 
         # reference shape  (= GPU global dims)
@@ -360,6 +481,36 @@ class GradientDescentKernel(BaseKernel):
         fic/=fic_tmp
         Imodel *= fic.reshape(Imodel.shape[0], 1, 1)
 
+    def floating_intensity_poisson(self, addr, I, fic):
+
+        # stopper
+        maxz = fic.shape[0]
+
+        # internal buffers
+        Imodel = self.npy.Imodel[:maxz]
+        fic_tmp = self.npy.fic_tmp[:maxz]
+
+        ## math ##
+        fic[:] = I.sum(-1).sum(-1)
+        fic_tmp[:] = Imodel.sum(-1).sum(-1)
+        fic /= fic_tmp
+        Imodel *= fic.reshape(maxz, 1, 1)
+
+    def floating_intensity_euclid(self, addr, A, fic):
+
+        # stopper
+        maxz = fic.shape[0]
+
+        # internal buffers
+        Imodel = self.npy.Imodel[:maxz]
+        fic_tmp = self.npy.fic_tmp[:maxz]
+
+        ## math ## (fic scales the amplitudes)
+        fic[:] = A.sum(-1).sum(-1)
+        fic_tmp[:] = np.sqrt(Imodel).sum(-1).sum(-1)
+        fic /= fic_tmp
+        Imodel *= (fic ** 2).reshape(maxz, 1, 1)
+
     def main(self, b_aux, addr, w, I):
 
         nmodes = self.nmodes
@@ -382,6 +533,51 @@ class GradientDescentKernel(BaseKernel):
         aux[:] = (aux.reshape(ish[0] // nmodes, nmodes, ish[1], ish[2]) * tmp[:, np.newaxis, :, :]).reshape(ish)
         return
 
+    def main_poisson(self, b_aux, addr, m, I):
+
+        nmodes = self.nmodes
+        # stopper
+        maxz = I.shape[0]
+
+        # batch buffers
+        err = self.npy.LLerr[:maxz]
+        Imodel = self.npy.Imodel[:maxz]
+        aux = b_aux[:maxz*nmodes]
+
+        # write-to shape  (= GPU global dims)
+        ish = aux.shape
+
+        ## math ##
+        Imodel += 1e-6
+        DI = m * (1. - I / Imodel)
+        err[:] = m * (Imodel - I * np.log(Imodel))
+
+        aux[:] = (aux.reshape(ish[0] // nmodes, nmodes, ish[1], ish[2]) * DI[:, np.newaxis, :, :]).reshape(ish)
+        return
+
+    def main_euclid(self, b_aux, addr, w, A):
+
+        nmodes = self.nmodes
+        # stopper
+        maxz = A.shape[0]
+
+        # batch buffers
+        err = self.npy.LLerr[:maxz]
+        Imodel = self.npy.Imodel[:maxz]
+        aux = b_aux[:maxz*nmodes]
+
+        # write-to shape  (= GPU global dims)
+        ish = aux.shape
+
+        ## math ##
+        Amodel = np.sqrt(Imodel) + 1e-6
+        DA = Amodel - A
+        err[:] = w * DA * DA
+        tmp = w * DA / Amodel
+
+        aux[:] = (aux.reshape(ish[0] // nmodes, nmodes, ish[1], ish[2]) * tmp[:, np.newaxis, :, :]).reshape(ish)
+        return
+
 
 class AuxiliaryWaveKernel(BaseKernel):
 
@@ -695,6 +891,127 @@ class PoUpdateKernel(BaseKernel):
         arr[:] = np.where(is_zero, nmr, nmr / dnm)
 
 
+class VectorizedPoUpdateKernel(PoUpdateKernel):
+    """
+    Drop-in replacement for the :py:class:`PoUpdateKernel` that replaces the
+    Python loop over all (pod, mode) rows of the address array with a single
+    gather, one vectorized product and an unbuffered scatter-add
+    (``np.add.at``) over precomputed flat indices.
+
+    Contributions to the same pixel are still summed in address order, so the
+    result is identical to the looped version.
+    """
+
+    def __init__(self):
+
+        super(VectorizedPoUpdateKernel, self).__init__()
+
+    @staticmethod
+    def _flat_index(coords, arr, rows, cols):
+        """
+        Flat indices into `arr` of all ``rows x cols`` frames addressed by
+        the (layer, row, column) triplets in `coords`.
+        """
+        sh = arr.shape
+        start = (coords[:, 0].astype(np.intp) * sh[1] + coords[:, 1]) * sh[2] + coords[:, 2]
+        offset = np.arange(rows, dtype=np.intp)[:, None] * sh[2] + np.arange(cols, dtype=np.intp)
+        return start[:, None, None] + offset
+
+    @staticmethod
+    def _gather(arr, ind):
+        return arr.reshape(-1)[ind] if arr.flags.c_contiguous else arr[np.unravel_index(ind, arr.shape)]
+
+    @staticmethod
+    def _scatter_add(arr, ind, val):
+        if arr.flags.c_contiguous:
+            np.add.at(arr.reshape(-1), ind.ravel(), val.ravel())
+        else:
+            np.add.at(arr, np.unravel_index(ind, arr.shape), val)
+
+    def _indices(self, addr, rows, cols, **arrays):
+        """
+        Flat indices for each array given as ``<column>=<array>`` where
+        column is one of ``pr``, ``ob``, ``ex``, ``ma``, ``di``.
+        """
+        sh = addr.shape
+        flat_addr = addr.reshape(sh[0] * sh[1], sh[2], sh[3])
+        columns = {'pr': 0, 'ob': 1, 'ex': 2, 'ma': 3, 'di': 4}
+        return [self._flat_index(flat_addr[:, columns[k], :], arr, rows, cols)
+                for k, arr in arrays.items()]
+
+    def ob_update(self, addr, ob, obn, pr, ex):
+
+        rows, cols = ex.shape[-2:]
+        ipr, iob, iex = self._indices(addr, rows, cols, pr=pr, ob=ob, ex=ex)
+        prc = self._gather(pr, ipr)
+        self._scatter_add(ob, iob, prc.conj() * self._gather(ex, iex))
+        self._scatter_add(obn, iob, (prc.conj() * prc).real)
+        return
+
+    def pr_update(self, addr, pr, prn, ob, ex):
+
+        rows, cols = ex.shape[-2:]
+        ipr, iob, iex = self._indices(addr, rows, cols, pr=pr, ob=ob, ex=ex)
+        obc = self._gather(ob, iob)
+        self._scatter_add(pr, ipr, obc.conj() * self._gather(ex, iex))
+        self._scatter_add(prn, ipr, (obc.conj() * obc).real)
+        return
+
+    def ob_update_ML(self, addr, ob, pr, ex, fac=2.0):
+
+        rows, cols = ex.shape[-2:]
+        ipr, iob, iex = self._indices(addr, rows, cols, pr=pr, ob=ob, ex=ex)
+        self._scatter_add(ob, iob, self._gather(pr, ipr).conj() * self._gather(ex, iex) * fac)
+        return
+
+    def pr_update_ML(self, addr, pr, ob, ex, fac=2.0):
+
+        rows, cols = ex.shape[-2:]
+        ipr, iob, iex = self._indices(addr, rows, cols, pr=pr, ob=ob, ex=ex)
+        self._scatter_add(pr, ipr, self._gather(ob, iob).conj() * self._gather(ex, iex) * fac)
+        return
+
+    def ob_update_local(self, addr, ob, pr, ex, aux, prn, a=0., b=1.):
+
+        rows, cols = ex.shape[-2:]
+        pr_norm = (1 - a) * prn.max() + a * prn
+        ipr, iob, iex, idi = self._indices(addr, rows, cols, pr=pr, ob=ob, ex=ex, di=pr_norm)
+        naux = ipr.shape[0]
+        self._scatter_add(ob, iob, (a + b) * self._gather(pr, ipr).conj() *
+                          (self._gather(ex, iex) - aux[:naux]) / self._gather(pr_norm, idi))
+        return
+
+    def pr_update_local(self, addr, pr, ob, ex, aux, obn, obn_max, a=0., b=1.):
+
+        rows, cols = ex.shape[-2:]
+        ob_norm = (1 - a) * obn_max + a * obn
+        ipr, iob, iex, idi = self._indices(addr, rows, cols, pr=pr, ob=ob, ex=ex, di=ob_norm)
+        naux = ipr.shape[0]
+        self._scatter_add(pr, ipr, (a + b) * self._gather(ob, iob).conj() *
+                          (self._gather(ex, iex) - aux[:naux]) / self._gather(ob_norm, idi))
+        return
+
+    def ob_norm_local(self, addr, ob, obn):
+
+        rows, cols = obn.shape[-2:]
+        obn[:] = 0.
+        # each object mode should only be counted once
+        iob, idi = self._indices(addr[addr[:, :, 0, 0] == 0][None], rows, cols, ob=ob, di=obn)
+        obc = self._gather(ob, iob)
+        self._scatter_add(obn, idi, (obc.conj() * obc).real)
+        return
+
+    def pr_norm_local(self, addr, pr, prn):
+
+        rows, cols = prn.shape[-2:]
+        prn[:] = 0.
+        # each probe mode should only be counted once
+        ipr, idi = self._indices(addr[addr[:, :, 1, 0] == 0][None], rows, cols, pr=pr, di=prn)
+        prc = self._gather(pr, ipr)
+        self._scatter_add(prn, idi, (prc.conj() * prc).real)
+        return
+
+
 class PositionCorrectionKernel(BaseKernel):
     from ptypy.accelerate.base import address_manglers
 
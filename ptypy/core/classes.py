@@ -83,6 +83,9 @@ GEO_PREFIX = 'G'
 # TODO: make this dynamic from available memory.
 MEGAPIXEL_LIMIT = 100
 
+# Factor by which the layer capacity of a storage grows when it runs out
+LAYER_GROWTH = 2
+
 
 class Base(object):
 
@@ -144,8 +147,11 @@ class Base(object):
             prefix = self._CHILD_PREFIX
 
         if self._pool.get(prefix) is None:
-            self._pool[prefix] = OrderedDict()
-            self._recs[prefix] = np.zeros((8,),dtype=obj.__class__._fields)
+            self._pool[prefix] = {}
+            fields = obj._record_fields(self)
+            # Objects without data fields besides the ID need no record table
+            if len(fields) > 1:
+                self._recs[prefix] = np.zeros((8,), dtype=fields)
             
         d = self._pool[prefix]
         # Check if ID is already taken and assign a new one
@@ -176,18 +182,29 @@ class Base(object):
         obj.ID = nID
         idx = len(d)
         obj.numID = idx
-        recs = self._recs[prefix]
+        recs = self._recs.get(prefix)
+        if recs is None:
+            obj._record = None
+            return
         l = len(recs)
         if idx >= l:
-            nl = l + 8192 if idx > 10000 else 2*l
-            recs = np.resize(recs,(nl,))
+            recs = np.resize(recs, (2 * l,))
             self._recs[prefix] = recs
+            # Records are views into the table, point them to the new one
+            for o in d.values():
+                o._record = recs[o.numID]
         rec = recs[idx] 
         obj._record = rec
         rec['ID'] = nID
         
         return
         
+    def _record_fields(self, owner):
+        """
+        Fields of the record that `owner` keeps for this object.
+        """
+        return self._fields
+
     @staticmethod
     def _num_to_id(num):
         """
@@ -195,6 +212,14 @@ class Base(object):
         """
         return '%04d' % num
 
+    @classmethod
+    def _all_slots(cls):
+        """
+        Instance slots declared by this class and its bases.
+        """
+        return [k for c in reversed(cls.__mro__)
+                for k in c.__dict__.get('__slots__', ()) if k != '__weakref__']
+
     @classmethod
     def _from_dict(cls, dct):
         """
@@ -202,7 +227,7 @@ class Base(object):
         should be compatible with _to_dict()
         """
         inst = cls.__new__(cls)
-        for k in inst.__slots__:
+        for k in cls._all_slots():
             if k not in dct:
                 continue
             else:
@@ -229,7 +254,7 @@ class Base(object):
         Default. Returns shallow copy of internal dict as default
         """
         res = OrderedDict()
-        for k in self.__slots__:
+        for k in self._all_slots():
             res[k] = getattr(self, k)
         if hasattr(self, '__dict__'):
             res.update(self.__dict__.copy())
@@ -382,6 +407,12 @@ class Storage(Base):
         # Additional padding around tight field of view
         self.padding = padding
 
+        # Buffer with spare layers, self.data is a view on its first layers
+        self._layer_buffer = None
+
+        # Hashed layer -> buffer index lookup, see _slot_index()
+        self._slot_cache = None
+
         # dimensionality suggestion from container
         ndim = container.ndim if container.ndim is not None else 2
 
@@ -510,7 +541,7 @@ class Storage(Base):
             new_storage.fill(self.data.copy())
         return new_storage
 
-    def fill(self, fill=None):
+    def fill(self, fill=None, copy=True):
         """
         Fill managed buffer.
 
@@ -521,6 +552,10 @@ class Storage(Base):
                as self.dtype and self.shape is updated to reflect the
                new buffer shape. If fill is None, use default value
                (self.fill_value).
+
+        copy : bool
+               If False, a numpy array `fill` of matching dimensionality
+               and dtype becomes the buffer itself instead of a copy.
         """
         if self.data is None:
             self.data = np.empty(self.shape)
@@ -541,8 +576,10 @@ class Storage(Base):
                     % (self.ndim, self.ndim, self.ndim+1, fill.ndim))
             elif fill.ndim == self.ndim:
                 fill = np.resize(fill, (self.shape[0],) + fill.shape)
-            self.data = fill.astype(self.dtype)
+            self.data = fill.astype(self.dtype, copy=copy)
             self.shape = self.data.shape
+            # Spare layers of the old buffer are of no use anymore
+            self._layer_buffer = None
 
     def update(self):
         """
@@ -568,8 +605,7 @@ class Storage(Base):
             the view is actually on self. Use cautiously.
         """
         if v is None:
-            for v in self.views:
-                self.update_views(v)
+            self._update_all_views()
             return
 
         if not self.ndim == v.ndim:
@@ -577,26 +613,71 @@ class Storage(Base):
                 'Storage %s(ndim=%d) and View %s(ndim=%d) have conflicting '
                 'data dimensions' % (self.ID, self.ndim, v.ID, v.ndim))
 
+        # Work on the record in plain python, this is called for every new view
+        rec = v._record
+        nd = v.ndim
+        psize = self.psize
+        origin = self.origin
+
         # Synchronize pixel size
-        v.psize = self.psize #.copy()
+        rec['psize'][:nd] = psize
 
         # Convert the physical coordinates of the view to pixel coordinates
-        pcoord = self._to_pix(v.coord)
+        pcoord = [(c - o) / p for c, o, p in zip(rec['coord'][:nd].tolist(), origin.tolist(), psize.tolist())]
 
-        # Integer part (note that np.round is not stable for odd arrays)
-        v.dcoord = np.round(pcoord + 0.00001).astype(int)
+        # Integer part (note that np.round is not stable for odd arrays,
+        # round() rounds half to even as well)
+        dcoord = [int(round(pc + 0.00001)) for pc in pcoord]
+        rec['dcoord'][:nd] = dcoord
 
         # These are the important attributes used when accessing the data
-        v.dlow = v.dcoord - v.shape // 2
-        v.dhigh = v.dcoord + (v.shape + 1) // 2
+        shape = rec['shape'][:nd].tolist()
+        rec['dlow'][:nd] = [dc - sh // 2 for dc, sh in zip(dcoord, shape)]
+        rec['dhigh'][:nd] = [dc + (sh + 1) // 2 for dc, sh in zip(dcoord, shape)]
 
         # Subpixel offset
-        v.sp = pcoord - v.dcoord
+        rec['sp'][:nd] = [pc - dc for pc, dc in zip(pcoord, dcoord)]
         # if self.layermap is None:
         #     v.slayer = 0
         # else:
         #     v.slayer = self.layermap.index(v.layer)
 
+    def _view_table(self, views):
+        """
+        Returns the record table holding the access information of all
+        views in the (original) container and the slots of `views` in it.
+        """
+        recs = self.owner.original._recs[VIEW_PREFIX]
+        slots = np.fromiter((v.numID for v in views), dtype=int, count=len(views))
+        return recs, slots
+
+    def _update_all_views(self):
+        """
+        Same as :py:meth:`update_views` for each view, in a single pass
+        over the record table.
+        """
+        views = self.views
+        if not views:
+            return
+
+        nd = self.ndim
+        for v in views:
+            if not nd == v.ndim:
+                raise ValueError(
+                    'Storage %s(ndim=%d) and View %s(ndim=%d) have conflicting '
+                    'data dimensions' % (self.ID, nd, v.ID, v.ndim))
+
+        recs, slots = self._view_table(views)
+
+        recs['psize'][slots, :nd] = self.psize
+        pcoord = self._to_pix(recs['coord'][slots, :nd])
+        dcoord = np.round(pcoord + 0.00001).astype(int)
+        shape = recs['shape'][slots, :nd]
+        recs['dcoord'][slots, :nd] = dcoord
+        recs['dlow'][slots, :nd] = dcoord - shape // 2
+        recs['dhigh'][slots, :nd] = dcoord + (shape + 1) // 2
+        recs['sp'][slots, :nd] = pcoord - dcoord
+
     def reformat(self, newID=None, update=True):
         """
         Crop or pad if required.
@@ -637,24 +718,16 @@ class Storage(Base):
 
         sh = self.data.shape
 
-        # Loop through all active views to get individual boundaries
+        # Boundaries of all active views and (unique) list of layers
         dlow_fov = [np.inf] * self.ndim
         dhigh_fov = [-np.inf] * self.ndim
         layers = []
         dims = list(range(self.ndim))
-        for v in views:
-            if not v.active:
-                continue
-
-            # Accumulate the regions of interest to
-            # compute the full field of view
-            for d in dims:
-                dlow_fov[d] = min(dlow_fov[d], v.dlow[d])
-                dhigh_fov[d] = max(dhigh_fov[d], v.dhigh[d])
-                
-            # Gather a (unique) list of layers
-            if v.layer not in layers:
-                layers.append(v.layer)
+        if views:
+            recs, slots = self._view_table(views)
+            dlow_fov = recs['dlow'][slots, :self.ndim].min(0).tolist()
+            dhigh_fov = recs['dhigh'][slots, :self.ndim].max(0).tolist()
+            layers = np.unique(recs['layer'][slots]).tolist()
 
         # Check if storage is scattered
         # A storage is "scattered" if and only if layer maps are different across nodes.
@@ -728,12 +801,19 @@ class Storage(Base):
             new_center = self.center
         
         # Deal with layermap
-        if self.layermap != new_layermap:
+        nold = len(self.layermap)
+        if self.layermap != new_layermap and nold == len(new_data) and new_layermap[:nold] == self.layermap:
+            # Only new layers at the end
+            new_data = self._append_layers(new_data, len(new_layermap) - nold)
+            new_shape = new_data.shape
+            self.layermap = new_layermap
+        elif self.layermap != new_layermap:
             relaid_data = []
+            old_slots = self._slot_index()
             for i in new_layermap:
-                if i in self.layermap:
+                if i in old_slots:
                     # This layer already exists
-                    d = new_data[self.layermap.index(i)]
+                    d = new_data[old_slots[i]]
                 else:
                     # A new layer
                     d = np.empty(new_shape[-self.ndim:], self.dtype)
@@ -746,8 +826,9 @@ class Storage(Base):
         self.nlayers = len(new_layermap)
         
         # set layer index in the view
-        for v in views:
-            v.dlayer = self.layermap.index(v.layer)
+        layermap = np.asarray(self.layermap)
+        order = np.argsort(layermap)
+        recs['dlayer'][slots] = order[np.searchsorted(layermap, recs['layer'][slots], sorter=order)]
 
         logger.debug('%s[%s] :: shape: %s -> %s'
                      % (self.owner.ID, self.ID, str(sh), str(new_shape)))
@@ -756,6 +837,72 @@ class Storage(Base):
         self.shape = new_shape
         self.center = new_center
                 
+    def _append_layers(self, data, nnew):
+        """
+        Returns `data` with `nnew` layers of the fill value appended.
+        The layers live in a buffer with spare capacity that grows by
+        LAYER_GROWTH, such that adding layers in many small steps
+        copies each layer only a few times.
+        """
+        nold = len(data)
+        n = nold + nnew
+        buf = getattr(self, '_layer_buffer', None)
+        if (buf is None or data.base is not buf or len(buf) < n
+                or data.__array_interface__['data'][0] != buf.__array_interface__['data'][0]):
+            buf = np.empty((max(n, LAYER_GROWTH * nold),) + data.shape[1:], self.dtype)
+            buf[:nold] = data
+            self._layer_buffer = buf
+        buf[nold:n].fill(self.fill_value)
+        return buf[:n]
+
+    def _slot_index(self):
+        """
+        Dict mapping each layer of :py:attr:`layermap` to its index in
+        the data buffer. It is rebuilt only when the layermap has been
+        replaced or changed length, so lookups are O(1) instead of the
+        linear ``layermap.index()``.
+        """
+        cache = getattr(self, '_slot_cache', None)
+        if cache is None or cache[0] is not self.layermap or cache[1] != len(self.layermap):
+            # Walk backwards such that the first occurrence wins, as with index()
+            index = {}
+            for slot in range(len(self.layermap) - 1, -1, -1):
+                index[self.layermap[slot]] = slot
+            cache = (self.layermap, len(self.layermap), index)
+            self._slot_cache = cache
+        return cache[2]
+
+    def slots(self, layers):
+        """
+        Buffer indices of one or several layers.
+
+        Parameters
+        ----------
+        layers : int or sequence of int
+            Layer(s) as listed in :py:attr:`layermap`.
+
+        Returns
+        -------
+        int or ndarray
+            Index into the first axis of :py:attr:`data`, an integer
+            array for a sequence of layers.
+        """
+        index = self._slot_index()
+        try:
+            if np.ndim(layers) == 0:
+                return index[layers]
+            return np.array([index[l] for l in layers], dtype=int)
+        except KeyError as e:
+            raise ValueError("Layer '%s' is not present in storage %s"
+                             % (e.args[0], self.ID))
+
+    def _to_dict(self):
+        # The spare layers and the layer index are not part of the state
+        res = super(Storage, self)._to_dict()
+        res.pop('_layer_buffer', None)
+        res.pop('_slot_cache', None)
+        return res
+
     def _to_pix(self, coord):
         """
         Transforms physical coordinates `coord` to pixel coordinates.
@@ -854,6 +1001,22 @@ class Storage(Base):
         if not self._is_scattered:
             u.parallel.allreduce(self.data, op=op)
 
+    def iallreduce(self, op=None):
+        """
+        Non-blocking version of :py:meth:`allreduce`. The data buffer
+        must not be accessed until the returned request is completed.
+
+        :param op: Reduction operation. If ``None`` uses sum.
+        :returns: Request handle or None (no MPI or distributed storage)
+
+        See also
+        --------
+        ptypy.utils.parallel.iallreduce
+        ptypy.utils.parallel.waitall
+        """
+        if not self._is_scattered:
+            return u.parallel.iallreduce(self.data, op=op)
+
     def zoom_to_psize(self, new_psize, **kwargs):
         """
         Changes pixel size and zooms the data buffer along last two axis
@@ -1050,8 +1213,8 @@ class Storage(Base):
                 return shift(self.data[
                              v.dlayer, v.dlow[0]:v.dhigh[0], v.dlow[1]:v.dhigh[1],
                              v.dlow[2]:v.dhigh[2]], v.sp)
-        elif v in self.layermap:
-            return self.data[self.layermap.index(v)]
+        elif v in self._slot_index():
+            return self.data[self._slot_index()[v]]
         else:
             raise ValueError("View or layer '%s' is not present in storage %s"
                              % (v, self.ID))
@@ -1102,8 +1265,8 @@ class Storage(Base):
                           v.dlow[2]:v.dhigh[2],
                           v.dlow[3]:v.dhigh[3],
                           v.dlow[4]:v.dhigh[4]] = (shift(newdata, -v.sp))
-        elif v in self.layermap:
-            self.data[self.layermap.index(v)] = newdata
+        elif v in self._slot_index():
+            self.data[self._slot_index()[v]] = newdata
         else:
             raise ValueError("View or layer '%s' is not present in storage %s"
                              % (v, self.ID))
@@ -1150,7 +1313,7 @@ class View(Base):
                 ('psize', '(5,)f8'),
                 ('coord', '(5,)f8'),
                 ('sp', '(5,)f8')]
-    __slots__ = Base.__slots__ + ['_ndim', 'storage', 'storageID', '_pod', '_pods', 'error']
+    __slots__ = ['_ndim', 'storage', 'storageID', '_pod', '_pods', 'error']
     ########
     # TODO #
     ########
@@ -1232,39 +1395,42 @@ class View(Base):
         """
         Store internal info to get/set the 2D data in the container.
         """
-        rule = u.Param(self.DEFAULT_ACCESSRULE)
+        # Plain dict, this is called for every view
+        rule = dict(self.DEFAULT_ACCESSRULE)
         if accessrule is not None:
             rule.update(accessrule)
         rule.update(kwargs)
 
-        self.active = True if rule.active else False
+        self.active = True if rule['active'] else False
 
-        self.storageID = rule.storageID
+        self.storageID = rule['storageID']
 
         # shape == None means "full frame"
-        self.shape = rule.shape
+        self.shape = rule['shape']
 
         # Look for storage, create one if necessary
         s = self.owner.storages.get(self.storageID, None)
         if s is None:
             sh = (1,) + tuple(self.shape) if self.shape is not None else None
             s = self.owner.new_storage(ID=self.storageID,
-                                       psize=rule.psize,
-                                       origin=rule.coord,
+                                       psize=rule['psize'],
+                                       origin=rule['coord'],
                                        shape=sh)
         self.storage = s
 
 
-        if self.shape is None:
+        if rule['shape'] is None:
             self._set_full_frame(s)
 
         # Information to access the slice within the storage buffer
-        self.psize = rule.psize
-        self.coord = rule.coord
-        self.layer = rule.layer
-
-        if (self.psize is not None
-                and not np.allclose(self.storage.psize, self.psize)):
+        self.psize = rule['psize']
+        self.coord = rule['coord']
+        self.layer = rule['layer']
+
+        psize = self.psize
+        if (psize is not None
+                and not (self.storage.psize == psize).all()
+                and not np.allclose(self.storage.psize, psize)):
             logger.warning(
                 'Inconsistent pixel size when creating view.\n (%s vs %s)'
                 % (str(self.storage.psize), str(self.psize)))
@@ -1273,6 +1439,11 @@ class View(Base):
         if self.active:
             self.storage.update_views(self)
 
+    def _record_fields(self, owner):
+        # Size the per-dimension fields to the data dimensions of the container
+        nd = getattr(owner, 'ndim', 5)
+        return [(name, fmt.replace('(5,)', '(%d,)' % nd)) for name, fmt in self._fields]
+
     def _set_full_frame(self, storage):
         self.shape = storage.shape[1:]
         pcoord = self.shape / 2.
@@ -1289,7 +1460,8 @@ class View(Base):
 
     def copy(self,ID=None, update = True):
         nView = View(self.owner, ID)
-        nView._record = self._record.copy()
+        for name in self._fields[1:]:
+            nView._record[name[0]] = self._record[name[0]]
         nView._ndim = self._ndim
         nView.storage = self.storage
         nView.storageID = self.storageID
@@ -1779,6 +1951,22 @@ class Container(Base):
         for s in self.storages.values():
             s.allreduce(op=op)
 
+    def iallreduce(self, op=None):
+        """
+        Starts a non-blocking ``allreduce`` for all :any:`Storage`
+        instances held by *self*. Complete it with
+        :py:func:`ptypy.utils.parallel.waitall` before using the data.
+
+        :param op: Reduction operation. If ``None`` uses sum.
+        :returns: List of request handles
+
+        See also
+        --------
+        ptypy.utils.parallel.iallreduce
+        Storage.iallreduce
+        """
+        return [s.iallreduce(op=op) for s in self.storages.values()]
+
     def clear(self):
         """
         Reduce / delete all data in attached storages
@@ -2061,6 +2249,11 @@ class POD(Base):
 
     _PREFIX = POD_PREFIX
 
+    # No instance dict, there is one POD per view and mode
+    __slots__ = ['__weakref__', 'model', 'is_empty', 'probe_weight', 'object_weight',
+                 'V', 'geometry', 'ob_view', 'pr_view', 'di_view', 'ex_view', 'ma_view',
+                 'use_exit_container', '_exit']
+
     def __init__(self, ptycho=None, model=None, ID=None, views=None,
                  geometry=None, **kwargs):
         """
@@ -20,6 +20,9 @@ This file is part of the PTYPY package.
 import numpy as np
 import os
 import h5py
+import contextlib
+import queue
+import threading
 from . import geometry
 from . import xy
 from .. import utils as u
@@ -232,6 +235,17 @@ class PtyScan(object):
     default = False
     type = bool
     help = Decides whether the scan should have poisson noise or not
+
+    [prefetch]
+    type = int
+    default = 0
+    help = Number of data chunks prepared ahead in a background thread
+    doc = If larger than ``0``, the next data chunks are loaded, corrected and cropped
+      in a background thread while the engine iterates, and up to this many chunks
+      are kept ready. Only available for a single process, as the preparation of a
+      chunk involves MPI collectives.
+    userlevel = 2
+    lowlim = 0
     """
 
     WAIT = WAIT
@@ -314,6 +328,20 @@ class PtyScan(object):
         self._flags = np.array([0, 0, 0], dtype=int)
         self.is_initialized = False
 
+        # Background loading
+        self.prefetch = self.info.prefetch
+        if self.prefetch and parallel.size > 1:
+            logger.warning('Data prefetching is not available with MPI, '
+                           'data will be loaded synchronously.')
+            self.prefetch = 0
+        self._prefetcher = None
+
+        self.block_dtypes = None
+        """ If set to a pair of (data, weights) dtypes, the frames of
+            each chunk are stacked into contiguous blocks of these dtypes
+            (``chunk.data_block`` and ``chunk.weights_block``), which a
+            scan model can adopt as storage buffers without a copy. """
+
     def initialize(self):
         """
         Begins the Data preparation and intended as the first method
@@ -815,14 +843,31 @@ class PtyScan(object):
                     'shape (%s).' % (rebin, str(tuple(sh))))
 
             # restore contiguity of the cropped/padded/rotated/flipped array
-            d = np.ascontiguousarray(d)
-            w = np.ascontiguousarray(w)
+            if has_data and self.block_dtypes is not None:
+                d = np.ascontiguousarray(d, dtype=self.block_dtypes[0])
+                w = np.ascontiguousarray(w, dtype=self.block_dtypes[1])
+            else:
+                d = np.ascontiguousarray(d)
+                w = np.ascontiguousarray(w)
 
             if has_data:
                 # Translate back to dictionaries
                 data = dict(zip(indices.node, d))
                 weights = dict(zip(indices.node, w))
 
+        data_block = None
+        weights_block = None
+        if has_data and self.block_dtypes is not None:
+            if do_flip or do_crop or do_rebin:
+                data_block, weights_block = d, w
+            else:
+                data_block = self._stack_frames(data, indices.node, self.block_dtypes[0])
+                if data_block is not None:
+                    data = dict(zip(indices.node, data_block))
+                    weights_block = self._stack_frames(weights, indices.node, self.block_dtypes[1])
+                if weights_block is not None:
+                    weights = dict(zip(indices.node, weights_block))
+
         # Adapt geometric info
         self.meta.center = cen / float(self.rebin)
         self.meta.shape = u.expect2(sh) // self.rebin
@@ -836,9 +881,11 @@ class PtyScan(object):
         chunk.indices_node = indices.node
         chunk.num = self.chunknum
         chunk.data = data
+        chunk.data_block = data_block
         
         # chunk now always has weights
         chunk.weights = weights
+        chunk.weights_block = weights_block
         
         # If there are weights we add them to chunk,
         # otherwise we push it into meta
@@ -881,6 +928,22 @@ class PtyScan(object):
 
         return chunk
 
+    @staticmethod
+    def _stack_frames(frames, indices, dtype):
+        """
+        Copies the `frames` at `indices` into one contiguous block of
+        `dtype`. Returns None if frames are missing or differ in shape.
+        """
+        if any(frames.get(ind) is None for ind in indices):
+            return None
+        shape = np.shape(frames[indices[0]])
+        if any(np.shape(frames[ind]) != shape for ind in indices):
+            return None
+        block = np.empty((len(indices),) + shape, dtype=dtype)
+        for k, ind in enumerate(indices):
+            block[k] = frames[ind]
+        return block
+
     def auto(self, frames):
         """
         Repeated calls to this function will process the data.
@@ -898,6 +961,38 @@ class PtyScan(object):
                 but no data could be prepared yet
               - EOS, if scan's end is reached
               - a data package otherwise
+
+        If :py:data:`prefetch` is set, the data packages are prepared
+        in a background thread and handed over here. WAIT is then also
+        returned while the next package is still being prepared.
+        """
+        if self.prefetch:
+            if self._prefetcher is None:
+                self._prefetcher = _ChunkPrefetcher(self, frames, self.prefetch)
+            return self._prefetcher.get(frames)
+
+        return self._auto(frames)
+
+    def locked(self):
+        """
+        Returns a context in which the state of the scan (:py:attr:`info`,
+        :py:attr:`meta`, chunk counters) is not changed by a prefetching
+        thread. Wrap reads of that state from outside :py:meth:`auto` in it.
+        """
+        if self._prefetcher is None:
+            return contextlib.nullcontext()
+        return self._prefetcher.lock
+
+    def stop_prefetch(self):
+        """
+        Stops the background loading of data chunks, if running.
+        """
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+
+    def _auto(self, frames):
+        """
+        Prepares the next data package synchronously, see :py:meth:`auto`.
         """
         # attempt to get data:
         msg = self.get_data_chunk(frames)
@@ -948,7 +1043,7 @@ class PtyScan(object):
                 except AttributeError:
                     fallback = np.ones_like(frame['data'])
                 w = chunk.weights.get(index, fallback)
-                frame['mask'] = (w > 0)
+                frame['mask'] = w if w.dtype == bool else (w > 0)
 
             iterables.append(frame)
 
@@ -970,9 +1065,6 @@ class PtyScan(object):
         if self.load_in_parallel:
             # All nodes load raw_data and slice according to indices
             raw, pos, weights = self.load(indices=indices.node)
-
-            # Gather position information as every node needs it later
-            pos = parallel.gather_dict(pos)
         else:
             if parallel.master:
                 raw, pos, weights = self.load(indices=indices.chunk)
@@ -981,18 +1073,72 @@ class PtyScan(object):
                 pos = {}
                 weights = {}
             # Distribute raw data across nodes according to indices
-            raw = parallel.bcast_dict(raw, indices.node)
-            weights = parallel.bcast_dict(weights, indices.node)
+            raw = self._mpi_scatter_frames(raw, indices)
+            weights = self._mpi_scatter_frames(weights, indices)
 
-        # (re)distribute position information - every node should now be
+        # Distribute position information - every node should now be
         # aware of all positions
-        pos = parallel.bcast_dict(pos)
+        pos = self._mpi_allgather_positions(pos)
 
         # Prepare data across nodes
         data, weights = self.correct(raw, weights, self.common)
 
         return data, pos, weights
 
+    def _mpi_scatter_frames(self, frames, indices):
+        """
+        Sends the frames loaded by the master node to the nodes they are
+        assigned to. Frames of equal shape and type are packed into one
+        contiguous array and scattered, so that each node only receives
+        its own frames. Otherwise falls back to :py:func:`parallel.bcast_dict`.
+        """
+        if not parallel.MPIenabled:
+            return dict(frames)
+
+        if parallel.master:
+            packable = all(k in frames for k in indices.chunk)
+            if packable:
+                first = np.asarray(frames[indices.chunk[0]])
+                packable = all(np.shape(frames[k]) == first.shape
+                               and np.asarray(frames[k]).dtype == first.dtype
+                               for k in indices.chunk)
+        else:
+            packable = None
+        packable = parallel.bcast(packable)
+
+        if not packable:
+            return parallel.bcast_dict(frames, indices.node)
+
+        ranks = range(parallel.size)
+        counts = [len(indices.lm[r]) for r in ranks]
+        if parallel.master:
+            order = [indices.chunk[k] for r in ranks for k in indices.lm[r]]
+            stack = np.array([frames[k] for k in order])
+        else:
+            stack = None
+        local = parallel.scatterv(stack, counts)
+        return dict(zip(indices.node, local))
+
+    def _mpi_allgather_positions(self, pos):
+        """
+        Shares the positions known to each node with all nodes. The
+        positions are packed into arrays and exchanged with a single
+        :py:func:`parallel.allgatherv`.
+        """
+        if not parallel.MPIenabled:
+            return dict(pos)
+
+        keys = np.array(list(pos.keys()), dtype=np.int64)
+        values = [np.asarray(pos[k], dtype=float).ravel() for k in pos]
+        width = int(parallel.MPImax([max([len(v) for v in values] + [0])]))
+        if width == 0:
+            return {}
+        values = np.array(values, dtype=float).reshape(len(keys), width)
+
+        keys = parallel.allgatherv(keys)
+        values = parallel.allgatherv(values)
+        return dict(zip(keys.tolist(), values))
+
     def check(self, frames=None, start=None):
         """
         **Override in subclass for custom implementation**
@@ -1043,6 +1189,11 @@ class PtyScan(object):
 
     @property
     def end_of_scan(self):
+        # Outside the loading thread, the end of the scan is only reached
+        # once the last prefetched package has been handed over.
+        pf = self._prefetcher
+        if pf is not None and threading.current_thread() is not pf.thread:
+            return pf.end_of_scan
         return not (self._flags[1] == 0)
 
     @end_of_scan.setter
@@ -1220,6 +1371,84 @@ class PtyScan(object):
         parallel.barrier()
 
 
+class _ChunkPrefetcher(object):
+    """
+    Prepares the data packages of a :py:class:`PtyScan` in a background
+    thread and keeps up to `depth` of them in a queue.
+    """
+    POLL = 0.1
+    """ Seconds to wait before checking again for new frames """
+
+    def __init__(self, scan, frames, depth):
+        self.queue = queue.Queue(maxsize=depth)
+        self.lock = threading.RLock()
+        """ Held by the loading thread while it changes the state of the scan """
+        self.frames = frames
+        """ Number of frames of the next package, as last requested """
+        self.end_of_scan = False
+        self.delivered = 0
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(scan,),
+                                       name='PtyScan-prefetch', daemon=True)
+        self.thread.start()
+
+    def _run(self, scan):
+        while not self._stop.is_set():
+            try:
+                with self.lock:
+                    msg = scan._auto(self.frames)
+                    if msg not in (WAIT, EOS):
+                        # The meta data is updated with every chunk
+                        msg['common'] = msg['common'].copy(99)
+                    eos = scan.end_of_scan
+            except Exception as e:
+                self._put((e, True))
+                return
+            if msg == WAIT:
+                self._stop.wait(self.POLL)
+                continue
+            self._put((msg, eos))
+            if msg == EOS:
+                return
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=self.POLL)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, frames):
+        """
+        Returns the next prepared data package, EOS at the end of the
+        scan or WAIT if the next package is not ready yet. Blocks only
+        until the first package is available. Packages prepared from
+        now on hold up to `frames` frames.
+        """
+        self.frames = frames
+        try:
+            msg, eos = self.queue.get(block=(self.delivered == 0))
+        except queue.Empty:
+            return WAIT
+        if isinstance(msg, Exception):
+            self.end_of_scan = True
+            self.stop()
+            raise msg
+        self.delivered += 1
+        self.end_of_scan = eos
+        if msg == EOS:
+            self.stop()
+        return msg
+
+    def stop(self):
+        """
+        Stops the loading thread after the chunk in preparation.
+        """
+        self._stop.set()
+        self.thread.join()
+
+
 @defaults_tree.parse_doc('scandata.PtydScan')
 class PtydScan(PtyScan):
     """
@@ -6,6 +6,7 @@ This file is part of the PTYPY package.
     :copyright: Copyright 2014 by the PTYPY team, see AUTHORS.
     :license: see LICENSE for details.
 """
+import os
 import numpy as np
 import scipy.fft
 
@@ -17,8 +18,9 @@ from ..utils.descriptor import EvalDescriptor
 try:
     import pyfftw
     import pyfftw.interfaces.numpy_fft as fftw_np
+    HAVE_FFTW = True
 except ImportError:
-    pass
+    HAVE_FFTW = False
     #logger.warning("Unable to import pyFFTW! Will use a slower FFT method.")
 
 __all__ = ['Geo', 'BasicNearfieldPropagator', 'BasicFarfieldPropagator']
@@ -112,10 +114,22 @@ class Geo(Base):
     type = str
     default = scipy
     help = FFT library
-    doc = Choose which library to use for FFTs
-    choices = 'numpy', 'scipy', 'fftw'
+    doc = Choose which library to use for FFTs. ``'planned'`` keeps one
+          reusable plan per array shape and dtype (pyFFTW if available,
+          scipy otherwise), transforms batched stacks over the last two
+          axes and can write into a caller-provided output buffer.
+    choices = 'numpy', 'scipy', 'fftw', 'planned'
     userlevel = 1
 
+    [fft_workers]
+    type = int
+    default = 1
+    help = Number of threads for the FFTs
+    doc = Used by the ``'scipy'`` and ``'planned'`` FFT types. A negative
+          value counts back from the number of available cores (-1 uses all of them).
+          Zero is not a valid number of threads and raises a ValueError.
+    userlevel = 2
+
     [shape]
     type = int, tuple
     default = 256
@@ -443,12 +457,100 @@ def get_propagator(geo_dct, **kwargs):
         return BasicNearfieldPropagator(geo_dct, ffttype=geo_dct["ffttype"], **kwargs)
 
 
+class FFTPlan(object):
+    """
+    Reusable 2D transform over the last two axes of arrays with a fixed
+    shape and dtype, i.e. batched over any leading (stack) axes.
+    Uses a pyFFTW plan if pyFFTW is available and scipy.fft otherwise.
+    The dtype of the input is kept (no upcast of complex64).
+    """
+    def __init__(self, shape, dtype, inverse=False, workers=1, inplace=False):
+        """
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the arrays to transform, including the batch axes.
+
+        dtype : dtype
+            Complex data type of input and output.
+
+        inverse : bool
+            If True, the plan computes the (normalized) inverse transform.
+
+        workers : int
+            Number of threads, negative values count back from the
+            number of available cores. Must not be zero.
+
+        inplace : bool
+            If True, the plan overwrites its input with the result,
+            otherwise input and output are always different arrays.
+        """
+        if workers == 0:
+            raise ValueError('The number of FFT workers must not be zero.')
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.inverse = inverse
+        self.workers = workers
+        self.inplace = inplace
+        self._fftw = None
+        if HAVE_FFTW:
+            threads = workers if workers > 0 else max(1, (os.cpu_count() or 1) + 1 + workers)
+            a = pyfftw.empty_aligned(self.shape, dtype=self.dtype)
+            b = a if inplace else pyfftw.empty_aligned(self.shape, dtype=self.dtype)
+            # FFTW may only execute a plan on arrays of the same in-placeness
+            # and alignment, these buffers stand in for those that are not
+            self._buffers = (a, b)
+            self._fftw = pyfftw.FFTW(a, b,
+                                     axes=(-2, -1),
+                                     direction='FFTW_BACKWARD' if inverse else 'FFTW_FORWARD',
+                                     flags=('FFTW_MEASURE',),
+                                     threads=threads)
+        else:
+            self._transform = scipy.fft.ifft2 if inverse else scipy.fft.fft2
+
+    def _fits(self, a):
+        """
+        Whether the pyFFTW plan can be executed on array `a` directly.
+        """
+        return (a.dtype == self.dtype and a.shape == self.shape and a.flags.c_contiguous
+                and a.ctypes.data % self._fftw.input_alignment == 0
+                and a.ctypes.data % self._fftw.output_alignment == 0)
+
+    def __call__(self, x, out=None):
+        """
+        Transform `x` and write the result into `out` (allocated if None).
+        `out` may be `x` itself.
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        if self._fftw is not None:
+            if self.inplace:
+                if out is not x:
+                    out[...] = x
+                buf = out if self._fits(out) else self._buffers[0]
+                if buf is not out:
+                    buf[...] = out
+                self._fftw(buf, buf)
+            else:
+                src = x if self._fits(x) else self._buffers[0]
+                if src is not x:
+                    src[...] = x
+                buf = out if (out is not x and self._fits(out)) else self._buffers[1]
+                self._fftw(src, buf)
+            if buf is not out:
+                out[...] = buf
+        else:
+            out[...] = self._transform(x, axes=(-2, -1), workers=self.workers,
+                                       overwrite_x=out is x)
+        return out
+
+
 class FFTchooser(object):
     """
     Chooses the desired FFT algo, and assigns scaling.
     If pyFFTW is not available, falls back to scipy.
     """
-    def __init__(self, ffttype='scipy'):
+    def __init__(self, ffttype='scipy', workers=1):
         """
         Parameters
         ----------
@@ -458,10 +560,29 @@ class FFTchooser(object):
             - 'fftw' for pyFFTW
             - 'numpy' for numpy.fft.fft2
             - 'scipy' for scipy.fft.fft2
+            - 'planned' for cached :any:`FFTPlan` instances
             - 2 or 4-tuple of (forward_fft2(), inverse_fft2(),
               [scaling, inverse_scaling])
+
+        workers : int
+            Number of threads for the 'scipy' and 'planned' types,
+            negative values count back from the number of available
+            cores. Must not be zero.
         """
         self.ffttype = ffttype
+        self.workers = workers
+        self._plans = {}
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @workers.setter
+    def workers(self, workers):
+        if workers == 0:
+            raise ValueError('The number of FFT workers must not be zero, '
+                             'use -1 for all available cores.')
+        self._workers = workers
 
     def _FFTW_fft(self):
         pyfftw.interfaces.cache.enable()
@@ -471,13 +592,29 @@ class FFTchooser(object):
         self.ifft = lambda x: fftw_np.ifft2(x, planner_effort=pe)
 
     def _scipy_fft(self):
-        self.fft = lambda x: scipy.fft.fft2(x).astype(x.dtype)
-        self.ifft = lambda x: scipy.fft.ifft2(x).astype(x.dtype)
+        self.fft = lambda x: scipy.fft.fft2(x, workers=self.workers).astype(x.dtype, copy=False)
+        self.ifft = lambda x: scipy.fft.ifft2(x, workers=self.workers).astype(x.dtype, copy=False)
 
     def _numpy_fft(self):
         self.fft = lambda x: np.ascontiguousarray(np.fft.fft2(x).astype(x.dtype))
         self.ifft = lambda x: np.ascontiguousarray(np.fft.ifft2(x).astype(x.dtype))
 
+    def _planned_fft(self):
+        self.fft = lambda x, out=None: self.get_plan(x.shape, x.dtype)(x, out)
+        self.ifft = lambda x, out=None: self.get_plan(x.shape, x.dtype, inverse=True)(x, out)
+
+    def get_plan(self, shape, dtype, inverse=False, inplace=False):
+        """
+        Return the cached :any:`FFTPlan` for arrays of this (batch) shape
+        and dtype, creating it on first use.
+        """
+        key = (tuple(shape), np.dtype(dtype), inverse, self.workers, inplace)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = FFTPlan(shape, dtype, inverse=inverse, workers=self.workers, inplace=inplace)
+            self._plans[key] = plan
+        return plan
+
     def assign_scaling(self, shape):
         if isinstance(self.ffttype, tuple) and len(self.ffttype) > 2:
             self.sc = self.ffttype[2]
@@ -498,12 +635,36 @@ class FFTchooser(object):
             self._scipy_fft()
         elif str(self.ffttype) == 'numpy':
             self._numpy_fft()
+        elif str(self.ffttype) == 'planned':
+            self._planned_fft()
         elif isinstance(self.ffttype, tuple):
             self.fft = self.ffttype[0]
             self.ifft = self.ffttype[1]
 
         return (self.fft, self.ifft)
 
+    def assign_fft_inplace(self):
+        """
+        Return transforms that overwrite their input with the result.
+        Only the 'planned' type avoids a temporary array.
+        """
+        if str(self.ffttype) == 'planned':
+            self.fft_inplace = lambda x: self.get_plan(x.shape, x.dtype, inplace=True)(x, x)
+            self.ifft_inplace = lambda x: self.get_plan(x.shape, x.dtype, inverse=True, inplace=True)(x, x)
+        else:
+            def fft_inplace(x):
+                x[:] = self.fft(x)
+                return x
+
+            def ifft_inplace(x):
+                x[:] = self.ifft(x)
+                return x
+
+            self.fft_inplace = fft_inplace
+            self.ifft_inplace = ifft_inplace
+
+        return (self.fft_inplace, self.ifft_inplace)
+
 
 class BasicFarfieldPropagator(object):
     """
@@ -528,6 +689,7 @@ class BasicFarfieldPropagator(object):
             - 'fftw' for pyFFTW
             - 'numpy' for numpy.fft.fft2
             - 'scipy' for scipy.fft.fft2
+            - 'planned' for cached, batched :any:`FFTPlan` instances
             - 2 or 4-tuple of (forward_fft2(), inverse_fft2(),
               [scaling, inverse_scaling])
         """
@@ -542,6 +704,8 @@ class BasicFarfieldPropagator(object):
         self.post_fft = None
         self.pre_ifft = None
         self.post_ifft = None
+        self._fw_factors = (None, None)
+        self._bw_factors = (None, None)
 
         # Get default parameters and update
         self.p = u.Param(Geo.DEFAULT)
@@ -551,6 +715,7 @@ class BasicFarfieldPropagator(object):
             self.dtype = np.complex128
         self.FFTch = FFTchooser(ffttype)
         self.fft, self.ifft = self.FFTch.assign_fft()
+        self.fft_inplace, self.ifft_inplace = self.FFTch.assign_fft_inplace()
         self.update(geo_pars, **kwargs)
 
     def update(self, geo_pars=None, **kwargs):
@@ -565,6 +730,8 @@ class BasicFarfieldPropagator(object):
             if k in p:
                 p[k] = v
 
+        self.FFTch.workers = p.fft_workers
+
         # Wavelength * distance factor
         lz = p.lam * p.distance
 
@@ -631,6 +798,12 @@ class BasicFarfieldPropagator(object):
         self.post_ifft = self.pre_fft.conj()
         self.sc, self.isc = self.FFTch.assign_scaling(self.sh)
 
+        # Factors for the in-place operations, with the scaling folded in
+        # and identity factors dropped
+        self._fw_factors = (_non_identity(self.pre_fft),
+                            _non_identity((self.post_fft * self.sc).astype(self.dtype)))
+        self._bw_factors = (_non_identity(self.pre_ifft),
+                            _non_identity((self.post_ifft * self.isc).astype(self.dtype)))
 
     def fw(self, W):
         """
@@ -670,6 +843,39 @@ class BasicFarfieldPropagator(object):
         else:
             return w
 
+    def fw_inplace(self, W):
+        """
+        Forward propagates wavefront (stack) W in place and returns it.
+        """
+        return self._propagate_inplace(W, self._fw_factors, self.fft_inplace, self.fw)
+
+    def bw_inplace(self, W):
+        """
+        Backward propagates wavefront (stack) W in place and returns it.
+        """
+        return self._propagate_inplace(W, self._bw_factors, self.ifft_inplace, self.bw)
+
+    def _propagate_inplace(self, W, factors, fft_inplace, fallback):
+        if (self.crop_pad != 0).any():
+            # Shape changes in between, no way around the copy
+            W[:] = fallback(W)
+            return W
+
+        pre, post = factors
+        if pre is not None:
+            W *= pre
+        fft_inplace(W)
+        if post is not None:
+            W *= post
+        return W
+
+
+def _non_identity(factor):
+    """
+    Returns `factor`, or None if multiplying with it is a no-op.
+    """
+    return None if np.all(factor == 1) else factor
+
 
 def translate_to_pix(sh, center):
     """
@@ -707,6 +913,7 @@ class BasicNearfieldPropagator(object):
             - 'fftw' for pyFFTW
             - 'numpy' for numpy.fft.fft2
             - 'scipy' for scipy.fft.fft2
+            - 'planned' for cached, batched :any:`FFTPlan` instances
             - 2 or 4-tuple of (forward_fft2(),inverse_fft2(),
               [scaling,inverse_scaling])
         """
@@ -720,9 +927,10 @@ class BasicNearfieldPropagator(object):
         # Get default parameters and update
         self.p = u.Param(Geo.DEFAULT)
         self.dtype = kwargs['dtype'] if 'dtype' in kwargs else np.complex128
-        self.update(geo_pars, **kwargs)
         self.FFTch = FFTchooser(ffttype)
         self.fft, self.ifft = self.FFTch.assign_fft()
+        self.fft_inplace, self.ifft_inplace = self.FFTch.assign_fft_inplace()
+        self.update(geo_pars, **kwargs)
 
     def update(self, geo_pars=None, **kwargs):
         """
@@ -737,6 +945,7 @@ class BasicNearfieldPropagator(object):
                 p[k] = v
 
         self.sh = p.shape
+        self.FFTch.workers = p.fft_workers
 
         # Calculate the grids
         [X, Y] = u.grids(self.sh, p.resolution, p.origin)
@@ -771,6 +980,22 @@ class BasicNearfieldPropagator(object):
         """
         return self.ifft(self.fft(W) * self.ikernel)
 
+    def fw_inplace(self, W):
+        """
+        Forward propagates wavefront (stack) W in place and returns it.
+        """
+        self.fft_inplace(W)
+        W *= self.kernel
+        return self.ifft_inplace(W)
+
+    def bw_inplace(self, W):
+        """
+        Backward propagates wavefront (stack) W in place and returns it.
+        """
+        self.fft_inplace(W)
+        W *= self.ikernel
+        return self.ifft_inplace(W)
+
 
 ############
 # TESTING ##
@@ -48,6 +48,21 @@ class _LogTime(object):
         self._t = time.time()
 
 
+def _insert_frames(storage, layers, frames):
+    """
+    Copies `frames` into the buffer of `storage` at the given `layers`
+    with a single (fancy-indexed) assignment.
+    """
+    if not layers:
+        return
+    slots = storage.slots(layers)
+    if np.all(np.diff(slots) == 1):
+        # Contiguous layers, plain slice
+        storage.data[slots[0]:slots[-1] + 1] = frames
+    else:
+        storage.data[slots] = frames
+
+
 @defaults_tree.parse_doc('scan.ScanModel')
 class ScanModel(object):
     """
@@ -78,10 +93,17 @@ class ScanModel(object):
     type = str
     default = scipy
     help = FFT library
-    doc = Choose from "numpy", "scipy" or "fftw"
-    choices = ['numpy', 'scipy', 'fftw']
+    doc = Choose from "numpy", "scipy", "fftw" or "planned"
+    choices = ['numpy', 'scipy', 'fftw', 'planned']
     userlevel = 1
 
+    [fft_workers]
+    type = int
+    default = 1
+    help = Number of threads for the FFTs
+    doc = Used by the "scipy" and "planned" FFT types, see :py:data:`.scan.geometry`
+    userlevel = 2
+
     [data]
     default =
     type = @scandata.*
@@ -169,6 +191,9 @@ class ScanModel(object):
         # By default we create a new exit buffer for each view
         self._single_exit_buffer_for_all_views = False
 
+        # Running data statistics, see _update_stats()
+        self._stats = None
+
     @classmethod
     def makePtyScan(cls, pars):
         """
@@ -245,25 +270,25 @@ class ScanModel(object):
             self.diff = self.Cdiff.new_storage(shape=sh, psize=self.psize, padonly=True,
                                                layermap=None)
             old_diff_views = []
-            old_diff_layers = []
+            old_diff_layers = {}
         else:
             # ok storage exists already. Views most likely also. We store them so we can update their status later.
             old_diff_views = self.Cdiff.views_in_storage(self.diff, active_only=False)
-            old_diff_layers = []
+            old_diff_layers = {}
             for v in old_diff_views:
-                old_diff_layers.append(v.layer)
+                old_diff_layers.setdefault(v.layer, v)
 
         # Same for mask
         if self.mask is None:
             self.mask = self.Cmask.new_storage(shape=sh, psize=self.psize, padonly=True,
                                                layermap=None)
             old_mask_views = []
-            old_mask_layers = []
+            old_mask_layers = {}
         else:
             old_mask_views = self.Cmask.views_in_storage(self.mask, active_only=False)
-            old_mask_layers = []
+            old_mask_layers = {}
             for v in old_mask_views:
-                old_mask_layers.append(v.layer)
+                old_mask_layers.setdefault(v.layer, v)
 
         # this is a hack for now
         dp = self._new_data_extra_analysis(dp)
@@ -300,15 +325,15 @@ class ScanModel(object):
             AR_mask.active = active
 
             # check here: is there already a view to this layer? Is it active?
-            try:
-                old_view = old_diff_views[old_diff_layers.index(index)]
+            old_view = old_diff_layers.get(index)
+            if old_view is not None:
                 old_active = old_view.active
                 old_view.active = active
 
                 logger.debug(
                     'Diff view with layer/index %s of scan %s exists. \nSetting view active state from %s to %s' % (
                         index, label, old_active, active))
-            except ValueError:
+            else:
                 v = View(self.Cdiff, accessrule=AR_diff)
                 diff_views.append(v)
                 logger.debug(
@@ -317,10 +342,10 @@ class ScanModel(object):
                 # append position also
                 positions.append(pos)
 
-            try:
-                old_view = old_mask_views[old_mask_layers.index(index)]
+            old_view = old_mask_layers.get(index)
+            if old_view is not None:
                 old_view.active = active
-            except ValueError:
+            else:
                 v = View(self.Cmask, accessrule=AR_mask)
                 mask_views.append(v)
 
@@ -331,17 +356,19 @@ class ScanModel(object):
         report_time('creating views and storages')
         logger.info('Inserting data in diff and mask storages')
 
-        # Second pass: copy the data 
-        # Benchmark: scales quadratic (!!) with number of frames per node.
+        # Second pass: copy the data of the whole chunk at once
+        indices = []
+        frames = []
+        masks = []
         for dct in dp['iterable']:
             if dct['data'] is None:
                 continue
-            diff_data = dct['data']
-            idx = dct['index']
+            indices.append(dct['index'])
+            frames.append(dct['data'])
+            masks.append(dct.get('mask', np.ones_like(dct['data'])))
 
-            # FIXME: Find a more transparent way than this.
-            self.diff.data[self.diff.layermap.index(idx)][:] = diff_data
-            self.mask.data[self.mask.layermap.index(idx)][:] = dct.get('mask', np.ones_like(diff_data))
+        _insert_frames(self.diff, indices, frames)
+        _insert_frames(self.mask, indices, masks)
 
         # Update maximum nr. of frames in a block
         self.max_frames_per_block = self.diff.nlayers
@@ -413,11 +440,18 @@ class ScanModel(object):
 
     def _update_stats(self):
         """
-        (Re)compute the statistics for the data stored in the scan.
+        Update the statistics for the data stored in the scan.
         These statistics are:
          * Itotal: The integrated power per frame
          * max/min/mean_frame: pixel-by-pixel maximum, minimum and
            average among all frames.
+
+        Only frames that became active since the last call are folded
+        into running (local) accumulators, which are then reduced across
+        processes with one packed sum and one packed maximum. If a frame
+        that has been folded in is no longer active (e.g. it was moved to
+        another process by :py:meth:`Ptycho._redistribute_data`), the
+        accumulators are rebuilt from all active frames.
         """
         mask_views = self.mask_views
         diff_views = self.diff_views
@@ -425,38 +459,68 @@ class ScanModel(object):
         # Nothing to do if no view exist
         if not self.diff: return
 
-        # Reinitialize containers
-        Itotal = []
-        max_frame = np.zeros(diff_views[0].shape)
-        min_frame = np.zeros_like(max_frame)
-        mean_frame = np.zeros_like(max_frame)
-        norm = np.zeros_like(max_frame)
-
-        for maview, diview in zip(mask_views, diff_views):
+        if self._stats is not None and not all(d.active for m, d in self._stats['included']):
+            self._stats = None
+
+        if self._stats is None:
+            sh = diff_views[0].shape
+            self._stats = dict(
+                nviews=0,            # views inspected so far
+                pending=[],          # inactive views, folded in once active
+                included=[],         # views folded in so far
+                Itotal=[],           # integrated power of the folded frames
+                sums=np.zeros((2,) + tuple(sh)),   # mean_frame and norm
+                max_frame=np.zeros(sh),
+                min_frame=np.zeros(sh),
+            )
+        st = self._stats
+        n = st['nviews']
+        new_views = st['pending'] + list(zip(mask_views[n:], diff_views[n:]))
+        st['nviews'] = len(diff_views)
+        st['pending'] = []
+
+        mean_frame, norm = st['sums']
+        max_frame = st['max_frame']
+        min_frame = st['min_frame']
+        for maview, diview in new_views:
             if not diview.active:
+                st['pending'].append((maview, diview))
                 continue
             dv = diview.data
             m = maview.data
             v = m * dv
-            Itotal.append(np.sum(v))
-            max_frame[max_frame < v] = v[max_frame < v]
-            min_frame[min_frame > v] = v[min_frame > v]
+            st['included'].append((maview, diview))
+            st['Itotal'].append(np.sum(v))
+            np.fmax(max_frame, v, out=max_frame)
+            np.fmin(min_frame, v, out=min_frame)
             mean_frame += v
             norm += m
 
-        parallel.allreduce(mean_frame)
-        parallel.allreduce(norm)
+        # Pack the local results, one reduction for the sums and one for the extrema
+        Itotal = st['Itotal']
+        sh = max_frame.shape
+        npix = max_frame.size
+        sums = np.append(st['sums'], np.sum(Itotal) if Itotal else 0.)
+        parallel.allreduce(sums)
+        extrema = np.append([max_frame, -min_frame], np.max(Itotal) if Itotal else -np.inf)
         if parallel.MPIenabled:
-            parallel.allreduce(max_frame, parallel.MPI.MAX)
-            parallel.allreduce(min_frame, parallel.MPI.MIN)
+            parallel.allreduce(extrema, parallel.MPI.MAX)
+            min_frame = -extrema[npix:2 * npix].reshape(sh)
+        else:
+            min_frame = min_frame.copy()
+
+        mean_frame = sums[:npix].reshape(sh)
+        norm = sums[npix:2 * npix].reshape(sh)
         mean_frame /= (norm + (norm == 0))
         self.diff.norm = norm
-        self.diff.max_power = parallel.MPImax(Itotal)
-        self.diff.tot_power = parallel.MPIsum(Itotal)
+        # The total powers keep the precision of the frames
+        ptype = np.asarray(Itotal[0]).dtype if Itotal else sums.dtype
+        self.diff.max_power = extrema[-1].astype(ptype)
+        self.diff.tot_power = sums[-1].astype(ptype)
         self.diff.mean_power = self.diff.tot_power / (len(diff_views) * np.prod(self.diff_shape))
         self.diff.pbound_stub = self.diff.max_power / np.prod(self.diff_shape)
         self.diff.mean = mean_frame
-        self.diff.max = max_frame
+        self.diff.max = extrema[:npix].reshape(sh)
         self.diff.min = min_frame
         self.diff.label = self.label
 
@@ -510,6 +574,24 @@ class ScanModel(object):
 
 @defaults_tree.parse_doc('scan.BlockScanModel')
 class BlockScanModel(ScanModel):
+    """
+    Scan model that keeps each chunk of frames in its own diffraction
+    storage.
+
+    Defaults:
+
+    [out_of_core]
+    default = None
+    type = str
+    help = Directory for file-backed diffraction blocks
+    doc = If set, the diffraction data and mask of each block are written straight into unlinked
+      temporary files in this directory and memory-mapped, and blocks are loaded one at a time,
+      each followed by an engine preparation, before the reconstruction starts. Together with
+      ``DM_serial_stream``, which also keeps the magnitudes and exit waves of these blocks in
+      files, resident memory scales with ``frames_per_block`` instead of the size of the scan.
+      Unless ``illumination.photons`` is set, the probe is scaled to the first block only.
+    userlevel = 2
+    """
 
     def new_data(self, max_frames):
         """
@@ -524,6 +606,14 @@ class BlockScanModel(ScanModel):
 
         report_time('ptyscan init')
 
+        # Create containers if not already done
+        if not self.containers_initialized:
+            self._initialize_containers()
+
+        # Let the frames of a chunk arrive as blocks that can become
+        # the storage buffers
+        self.ptyscan.block_dtypes = (self.Cdiff.dtype, self.Cmask.dtype)
+
         dp = self._get_data(max_frames)
         if dp is None:
             return None
@@ -535,10 +625,6 @@ class BlockScanModel(ScanModel):
         if not self.geometries:
             self._initialize_geo(dp['common'])
 
-        # Create containers if not already done
-        if not self.containers_initialized:
-            self._initialize_containers()
-
         sh = (1,) + tuple(self.diff_shape)
 
         # this is a hack for now
@@ -554,10 +640,31 @@ class BlockScanModel(ScanModel):
 
         indices_node = chunk['indices_node']
 
-        diff = self.Cdiff.new_storage(shape=sh, psize=self.psize, padonly=True,
+        # Adopt the frame blocks of the chunk as buffers if they fit
+        data_block = chunk.get('data_block')
+        weights_block = chunk.get('weights_block')
+        if data_block is None or data_block.shape != sh:
+            data_block = None
+        if weights_block is None or weights_block.shape != sh:
+            weights_block = None
+        copy_data = data_block is None
+        copy_weights = weights_block is None
+        if self.p.out_of_core is not None:
+            # Frames go straight into file-backed buffers
+            data_block = self._file_backed(data_block, sh, self.Cdiff.dtype, 0.0)
+            weights_block = self._file_backed(weights_block, sh, self.Cmask.dtype, 1.0)
+
+        diff = self.Cdiff.new_storage(shape=sh if data_block is None else (1,) + sh[1:],
+                                      psize=self.psize, padonly=True,
                                       fill=0.0, layermap=indices_node)
-        mask = self.Cmask.new_storage(shape=sh, psize=self.psize, padonly=True,
+        mask = self.Cmask.new_storage(shape=sh if weights_block is None else (1,) + sh[1:],
+                                      psize=self.psize, padonly=True,
                                       fill=1.0, layermap=indices_node)
+        if data_block is not None:
+            diff.fill(data_block, copy=False)
+        if weights_block is not None:
+            mask.fill(weights_block, copy=False)
+        slots = diff._slot_index()
 
         # Prepare for View generation
         AR_diff = DEFAULT_ACCESSRULE.copy()
@@ -600,11 +707,13 @@ class BlockScanModel(ScanModel):
             mask_views.append(mv)
 
             if active:
-                l = indices_node.index(index)
+                l = slots[index]
                 dv.dlayer = l
                 mv.dlayer = l
-                dv.data[:] = maybe_data
-                mv.data[:] = weights.get(index, np.ones_like(maybe_data))
+                if copy_data:
+                    dv.data[:] = maybe_data
+                if copy_weights:
+                    mv.data[:] = weights.get(index, np.ones_like(maybe_data))
 
                 # positions
         positions = chunk.positions
@@ -632,6 +741,9 @@ class BlockScanModel(ScanModel):
         logger.info('Data organization complete, updating stats')
 
         self._update_stats()
+        if self.p.out_of_core is not None:
+            u.advise_pages(diff.data, 'MADV_DONTNEED')
+            u.advise_pages(mask.data, 'MADV_DONTNEED')
 
         # Create new views on object, probe, and exit wave, and connect
         # these through new pods.
@@ -647,6 +759,18 @@ class BlockScanModel(ScanModel):
 
         return diff, new_probe_ids, new_object_ids, new_pods
 
+    def _file_backed(self, block, shape, dtype, fill):
+        """
+        Copies a frame block, or the fill value if there is none, into a
+        file-backed buffer in the ``out_of_core`` directory.
+        """
+        buf = u.file_backed_zeros(shape, dtype, self.p.out_of_core)
+        if block is None:
+            buf.fill(fill)
+        else:
+            buf[:] = block
+        return buf
+
 
 class _Vanilla(object):
     """
@@ -786,6 +910,7 @@ class _Vanilla(object):
         geo_pars.center = center
         geo_pars.propagation = self.p.propagation
         geo_pars.ffttype = self.p.ffttype
+        geo_pars.fft_workers = self.p.fft_workers
         geo_pars.psize = psize
 
         # make a Geo instance and fix resolution
@@ -1078,6 +1203,7 @@ class _Full(object):
         # Add propagation info from this scan model
         geo_pars.propagation = self.p.propagation
         geo_pars.ffttype = self.p.ffttype
+        geo_pars.fft_workers = self.p.fft_workers
 
         # The multispectral case will have multiple geometries
         for ii, fac in enumerate(self.p.coherence.energies):
@@ -1546,6 +1672,7 @@ class Bragg3dModel(Vanilla):
         geo_pars = u.Param({key: common[key] for key in get_keys})
         geo_pars.propagation = self.p.propagation
         geo_pars.ffttype = self.p.ffttype
+        geo_pars.fft_workers = self.p.fft_workers
         # take extra Bragg information into account
         psize = tuple(common['psize'])
         geo_pars.psize = (self.ptyscan.common.rocking_step,) + psize
@@ -1654,6 +1781,14 @@ class ModelManager(object):
     def end_of_scan(self):
         return all(s.ptyscan.end_of_scan for s in list(self.scans.values()))
 
+    @property
+    def blocks_pending(self):
+        """
+        True if a scan that is loaded out of core has more blocks to load.
+        """
+        return any(s.p.get('out_of_core') is not None and not s.ptyscan.end_of_scan
+                   for s in list(self.scans.values()))
+
     def new_data(self):
         """
         Get all new diffraction patterns and create all views and pods
@@ -1687,6 +1822,10 @@ class ModelManager(object):
                     pod_ids = pod_ids.union(nd[3])
                     ilog_streamer('%s: loading data for scan %s (%d diffraction frames, %d PODs, %d probe(s) and %d object(s))' 
                                    %(type(scan).__name__,label, sum([d.shape[0] if l==label else 0 for l,d in new_data]), len(pod_ids), len(prb_ids), len(obj_ids)))
+                    if scan.p.get('out_of_core') is not None:
+                        # One block per call, such that the engine can move
+                        # it out of memory before the next one is loaded
+                        break
                     nd = scan.new_data(_nframes)
                 ilog_newline()
 
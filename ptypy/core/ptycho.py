@@ -10,6 +10,7 @@ This file is part of the PTYPY package.
 import numpy as np
 import time
 import json
+import threading
 from . import paths
 from collections import OrderedDict
 
@@ -160,6 +161,17 @@ class Ptycho(Base):
        - ``'used_params'``: Same as minimal but including all used parameters 
     choices = 'minimal','dls','used_params'
 
+    [io.background_save]
+    default = False
+    type = bool
+    help = Write save files in a background thread
+    doc = If ``True``, autosaves and the save after engine completion copy probe and object into
+      reusable buffers and leave the HDF5 write to a background thread, so that the iterations
+      continue while the file is written. A save waits for the previous one to finish. Pending
+      saves are complete when :py:meth:`finalize` or :py:meth:`run` (called without an engine
+      instance) return.
+    userlevel = 2
+
     [io.interaction]
     default = None
     type = Param
@@ -363,6 +375,7 @@ class Ptycho(Base):
         self.plotter = None
         self.record_positions = False
         self._jupyter_client = None
+        self._saver = None
 
         # Early boot strapping
         self._configure()
@@ -694,12 +707,16 @@ class Ptycho(Base):
                 if (len(self.diff.V) < self.p.min_frames_for_recon) and not self.model.end_of_scan:
                     continue
 
+                # Out-of-core scans are loaded completely, block by block
+                if self.model.blocks_pending:
+                    continue
+
                 auto_save = self.p.io.autosave
                 if auto_save.active and auto_save.interval > 0:
                     if engine.curiter % auto_save.interval == 0:
                         auto = self.paths.auto_file(self.runtime)
                         logger.info(headerline('Autosaving'))
-                        self.save_run(auto, 'dump')
+                        self.save_run(auto, 'dump', background=self.p.io.background_save)
                         self.runtime.last_save = engine.curiter
                         logger.info(headerline())
 
@@ -746,7 +763,7 @@ class Ptycho(Base):
 
             # Save
             if self.p.io.rfile:
-                self.save_run(kind=self.p.io.rformat)
+                self.save_run(kind=self.p.io.rformat, background=self.p.io.background_save)
             else:
                 pass
             # Time the initialization
@@ -772,6 +789,7 @@ class Ptycho(Base):
             engine = self.engines.get(label, None)
             if engine is not None:
                 self.run(engine=engine)
+                self._wait_for_save()
             else:
                 self.init_engine(label=label)
                 self.run(label=label)
@@ -782,11 +800,25 @@ class Ptycho(Base):
             self.runtime.allstop = None
             for engine in self.engines.values():
                 self.run(engine=engine)
+            self._wait_for_save()
+
+    def _wait_for_save(self):
+        """
+        Waits for a save in the background to finish and releases
+        the save buffers.
+        """
+        if self._saver is not None:
+            saver, self._saver = self._saver, None
+            saver.wait()
 
     def finalize(self):
         """
         Cleanup
         """
+        self._wait_for_save()
+        if self.model is not None:
+            for scan in self.model.scans.values():
+                scan.ptyscan.stop_prefetch()
         # 'allstop' will be interpreted as 'quit' on threaded plot clients
         self.runtime.allstop = time.asctime()
         if parallel.master and self.interactor is not None:
@@ -887,7 +919,7 @@ class Ptycho(Base):
             P.init_data()
         return P
 
-    def save_run(self, alt_file=None, kind='minimal', force_overwrite=True):
+    def save_run(self, alt_file=None, kind='minimal', force_overwrite=True, background=False):
         """
         Save run to file.
 
@@ -905,14 +937,21 @@ class Ptycho(Base):
                   storages, positions and runtime information is saved.
                 - *'full_flat'*, (almost) complete environment
 
+        background : bool
+            If True, the file is written in a background thread from a
+            copy of probe and object, the copy reuses the buffers of the
+            previous background save.
         """
         from . import save_load
-        from .. import io
 
         dest_file = None
 
         if parallel.master:
 
+            # The previous background save may still use the buffers
+            if self._saver is not None:
+                self._saver.wait()
+
             if alt_file is not None:
                 dest_file = u.clean_path(alt_file)
             else:
@@ -1032,18 +1071,25 @@ class Ptycho(Base):
                     content.pars.engines[name] = engine.p
                 for name, scan in self.model.scans.items():
                     content.pars.scans[name] = scan.p
-                    content.pars.scans[name].data = scan.ptyscan.p
+                    with scan.ptyscan.locked():
+                        content.pars.scans[name].data = scan.ptyscan.p.copy(99)
 
             if kind in ['minimal', 'dls'] and self.record_positions:
                 content.positions = {}
                 for ID, S in self.obj.storages.items():
                     content.positions[ID] = np.array([v.coord for v in S.views if v.pod.pr_view.layer==0])
 
-            h5opt = io.h5options['UNSUPPORTED']
-            io.h5options['UNSUPPORTED'] = 'ignore'
-            logger.info('Saving to %s' % dest_file)
-            io.h5write(dest_file, header=header, content=content)
-            io.h5options['UNSUPPORTED'] = h5opt
+            if background and kind != 'fullflat':
+                if self._saver is None:
+                    self._saver = _BackgroundSaver()
+                content.probe = self._saver.snapshot(content.probe, ('probe',))
+                content.obj = self._saver.snapshot(content.obj, ('obj',))
+                content.runtime = content.runtime.copy()
+                if 'iter_info' in content.runtime:
+                    content.runtime.iter_info = list(content.runtime.iter_info)
+                self._saver.start(self._write_run, dest_file, header, content)
+            else:
+                self._write_run(dest_file, header, content)
         else:
             pass
         # We have to wait for all processes, just in case the script isn't
@@ -1051,6 +1097,16 @@ class Ptycho(Base):
         parallel.barrier()
         return dest_file
 
+    @staticmethod
+    def _write_run(dest_file, header, content):
+        """
+        Writes the content of a save file.
+        """
+        from .. import io
+        logger.info('Saving to %s' % dest_file)
+        io.h5write(dest_file, header=header, content=content,
+                   options={'UNSUPPORTED': 'ignore'})
+
     def print_stats(self, table_format=None, detail='summary'):
         """
         Calculates the memory usage and other info of ptycho instance
@@ -1288,3 +1344,65 @@ class Ptycho(Base):
         Work out the best arrangement of domains for a given number of
         nodes. Assumes a roughly square scan.
         """
+
+
+class _BackgroundSaver(object):
+    """
+    Writes one save file at a time in a background thread. Arrays are
+    copied into buffers that are reused from one save to the next.
+    """
+
+    def __init__(self):
+        self.thread = None
+        self.error = None
+        self.buffers = {}
+
+    def snapshot(self, obj, key=()):
+        """
+        Copy of the nested dicts and lists in `obj` with all arrays
+        copied into the buffers. Other objects are not copied.
+        """
+        if isinstance(obj, np.ndarray):
+            buf = self.buffers.get(key)
+            if buf is None or buf.shape != obj.shape or buf.dtype != obj.dtype:
+                buf = np.empty_like(obj)
+                self.buffers[key] = buf
+            np.copyto(buf, obj)
+            return buf
+        elif isinstance(obj, dict):
+            res = type(obj)()
+            for k, v in obj.items():
+                res[k] = self.snapshot(v, key + (k,))
+            return res
+        elif isinstance(obj, list):
+            return [self.snapshot(v, key + (i,)) for i, v in enumerate(obj)]
+        else:
+            return obj
+
+    def start(self, func, *args):
+        """
+        Calls `func(*args)` in the background once the previous save
+        has finished.
+        """
+        self.wait()
+
+        def target():
+            try:
+                func(*args)
+            except Exception as e:
+                self.error = e
+
+        self.thread = threading.Thread(target=target, name='ptypy_save')
+        self.thread.start()
+
+    def wait(self):
+        """
+        Blocks until the current save has finished and raises its
+        exception, if any.
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
@@ -291,8 +291,9 @@ def init_storage(storage, sample_pars=None, energy=None):
         u.diversify(model, **p.diversity)
     # Return back to storage
     s.fill(model)
-    # avoids sharp edges on resize
-    s.fill_value = model.mean()
+    # avoids sharp edges on resize, accumulated in double precision
+    # such that the mean of a flat model does not depend on its size
+    s.fill_value = model.mean(dtype=np.promote_types(model.dtype, np.float64)).astype(s.dtype)
 
 
 def simulate(A, pars, energy, fill=1.0, prefix="", **kwargs):
@@ -17,7 +17,7 @@ import time
 from .. import utils as u
 from ..utils.verbose import logger
 from ..utils import parallel
-from .utils import Cnorm2, Cdot
+from .utils import Cnorm2, Cdot, Caxpy
 from . import register
 from .base import BaseEngine, PositionCorrectionEngine
 from ..core.manager import Full, Vanilla, Bragg3dModel, BlockVanilla, BlockFull, GradFull, BlockGradFull
@@ -106,6 +106,30 @@ class ML(PositionCorrectionEngine):
     help = How many coefficients to be used in the the linesearch
     doc = choose between the 'quadratic' approximation (default) or 'all'
 
+    [optimizer]
+    default = 'cg'
+    type = str
+    help = Method for the minimization direction
+    choices = ['cg','lbfgs']
+    doc = Either Polak-Ribière nonlinear conjugate gradient ('cg') or limited-memory BFGS ('lbfgs').
+      Both take the step length from the polynomial line search. Only available in ``ML`` and ``ML_serial``.
+
+    [lbfgs_memory]
+    default = 5
+    type = int
+    lowlim = 1
+    help = Number of past updates kept by the L-BFGS optimizer
+    doc = Each update is stored as two extra object and probe containers.
+
+    [wave_cache]
+    default = 0.
+    type = float
+    lowlim = 0.0
+    help = Memory budget in MB for far-field waves kept between gradient and line search
+    doc = The line search reuses the propagated waves of the current object and probe from the
+      gradient computation instead of propagating them again. Waves that do not fit into the
+      budget are recomputed, 0 turns the cache off. Used by ``ML`` and ``ML_serial``.
+
     """
 
     SUPPORTED_MODELS = [Full, Vanilla, Bragg3dModel, BlockVanilla, BlockFull, GradFull, BlockGradFull]
@@ -137,6 +161,11 @@ class ML(PositionCorrectionEngine):
         # Probe gradient
         self.pr_grad_new = None
 
+        # L-BFGS history of steps and gradient changes, oldest first,
+        # and the unused history slots
+        self.lbfgs_history = None
+        self.lbfgs_pool = None
+        self._lbfgs_slot = None
 
         # Other
         self.tmin = None
@@ -174,6 +203,9 @@ class ML(PositionCorrectionEngine):
 
         self.tmin = 1.
 
+        if self.p.optimizer == 'lbfgs':
+            self._lbfgs_initialize()
+
         # Other options
         self.smooth_gradient = prepare_smoothing_preconditioner(
             self.p.smooth_gradient)
@@ -220,6 +252,9 @@ class ML(PositionCorrectionEngine):
             new_ob_grad, new_pr_grad = self.ob_grad_new, self.pr_grad_new
             tg += time.time() - t1
 
+            if self.p.optimizer == 'lbfgs':
+                self._lbfgs_begin_update()
+
             if self.p.probe_update_start <= self.curiter:
                 # Apply probe support if needed
                 for name, s in new_pr_grad.storages.items():
@@ -254,41 +289,46 @@ class ML(PositionCorrectionEngine):
             else:
                 self.scale_p_o = self.p.scale_probe_object
 
-            ############################
-            # Compute next conjugate
-            ############################
-            if self.curiter == 0:
-                bt = 0.
+            dt = self.ptycho.FType
+            if self.p.optimizer == 'lbfgs':
+                self.ob_grad << new_ob_grad
+                self.pr_grad << new_pr_grad
+                self._lbfgs_direction()
             else:
-                bt_num = (self.scale_p_o
-                          * (Cnorm2(new_pr_grad)
-                             - np.real(Cdot(new_pr_grad, self.pr_grad)))
-                          + (Cnorm2(new_ob_grad)
-                             - np.real(Cdot(new_ob_grad, self.ob_grad))))
+                ############################
+                # Compute next conjugate
+                ############################
+                if self.curiter == 0:
+                    bt = 0.
+                else:
+                    bt_num = (self.scale_p_o
+                              * (Cnorm2(new_pr_grad)
+                                 - np.real(Cdot(new_pr_grad, self.pr_grad)))
+                              + (Cnorm2(new_ob_grad)
+                                 - np.real(Cdot(new_ob_grad, self.ob_grad))))
 
-                bt_denom = self.scale_p_o*Cnorm2(self.pr_grad) + Cnorm2(self.ob_grad)
+                    bt_denom = self.scale_p_o*Cnorm2(self.pr_grad) + Cnorm2(self.ob_grad)
 
-                bt = max(0, bt_num/bt_denom)
+                    bt = max(0, bt_num/bt_denom)
 
-            # logger.info('Polak-Ribiere coefficient: %f ' % bt)
+                # logger.info('Polak-Ribiere coefficient: %f ' % bt)
 
-            self.ob_grad << new_ob_grad
-            self.pr_grad << new_pr_grad
+                self.ob_grad << new_ob_grad
+                self.pr_grad << new_pr_grad
 
-            dt = self.ptycho.FType
-            # 3. Next conjugate
-            self.ob_h *= bt / self.tmin
+                # 3. Next conjugate
+                self.ob_h *= bt / self.tmin
 
-            # Smoothing preconditioner
-            if self.smooth_gradient:
-                for name, s in self.ob_h.storages.items():
-                    s.data[:] -= self.smooth_gradient(self.ob_grad.storages[name].data)
-            else:
-                self.ob_h -= self.ob_grad
+                # Smoothing preconditioner
+                if self.smooth_gradient:
+                    for name, s in self.ob_h.storages.items():
+                        s.data[:] -= self.smooth_gradient(self.ob_grad.storages[name].data)
+                else:
+                    self.ob_h -= self.ob_grad
 
-            self.pr_h *= bt / self.tmin
-            self.pr_grad *= self.scale_p_o
-            self.pr_h -= self.pr_grad
+                self.pr_h *= bt / self.tmin
+                self.pr_grad *= self.scale_p_o
+                self.pr_h -= self.pr_grad
 
             # In principle, the way things are now programmed this part
             # could be iterated over in a real Newton-Raphson style.
@@ -337,6 +377,107 @@ class ML(PositionCorrectionEngine):
         """
         pass
 
+    def _smooth(self, data):
+        """
+        Apply the smoothing preconditioner to an object array.
+        """
+        return self.smooth_gradient(data)
+
+    def _lbfgs_initialize(self):
+        """
+        Allocate `lbfgs_memory` history slots, each holding an object and
+        probe step (s) and gradient change (y).
+        """
+        self.lbfgs_history = []
+        self.lbfgs_pool = []
+        for i in range(self.p.lbfgs_memory):
+            slot = u.Param()
+            slot.ob_s = self.ob.copy(self.ob.ID + '_s%d' % i, fill=0.)
+            slot.ob_y = self.ob.copy(self.ob.ID + '_y%d' % i, fill=0.)
+            slot.pr_s = self.pr.copy(self.pr.ID + '_s%d' % i, fill=0.)
+            slot.pr_y = self.pr.copy(self.pr.ID + '_y%d' % i, fill=0.)
+            slot.rho = 0.
+            self.lbfgs_pool.append(slot)
+
+    def _lbfgs_dot(self, ob_a, pr_a, ob_b, pr_b):
+        """
+        Real inner product of two (object, probe) pairs.
+        """
+        return np.real(Cdot(ob_a, ob_b)) + np.real(Cdot(pr_a, pr_b))
+
+    def _lbfgs_reset(self):
+        self.lbfgs_pool += self.lbfgs_history
+        self.lbfgs_history = []
+
+    def _lbfgs_begin_update(self):
+        """
+        Keep the previous gradient in a free history slot (the oldest
+        one if the history is full), before it is replaced.
+        """
+        if not self.tmin > 0:
+            # The line search went uphill, start over
+            self._lbfgs_reset()
+        slot = self.lbfgs_pool.pop() if self.lbfgs_pool else self.lbfgs_history.pop(0)
+        slot.ob_y << self.ob_grad
+        slot.pr_y << self.pr_grad
+        self._lbfgs_slot = slot
+
+    def _lbfgs_direction(self):
+        """
+        Complete the history with the last step (still in ob_h, pr_h) and
+        the change of gradient, then compute the new minimization direction
+        with the L-BFGS two-loop recursion. The initial inverse Hessian is
+        the CG preconditioner (smoothing, probe/object scaling), scaled
+        by the curvature of the last update.
+        """
+        dt = self.ptycho.FType
+        slot = self._lbfgs_slot
+        self._lbfgs_slot = None
+        slot.ob_y *= -1.
+        slot.ob_y += self.ob_grad
+        slot.pr_y *= -1.
+        slot.pr_y += self.pr_grad
+        slot.ob_s << self.ob_h
+        slot.pr_s << self.pr_h
+        sy = self._lbfgs_dot(slot.ob_s, slot.pr_s, slot.ob_y, slot.pr_y)
+        if sy > 0:
+            slot.rho = 1. / sy
+            self.lbfgs_history.append(slot)
+        else:
+            # No curvature information (e.g. first iteration)
+            self.lbfgs_pool.append(slot)
+
+        def two_loop():
+            self.ob_h << self.ob_grad
+            self.pr_h << self.pr_grad
+            alphas = []
+            for slot in reversed(self.lbfgs_history):
+                a = slot.rho * self._lbfgs_dot(slot.ob_s, slot.pr_s, self.ob_h, self.pr_h)
+                Caxpy(dt(-a), slot.ob_y, self.ob_h)
+                Caxpy(dt(-a), slot.pr_y, self.pr_h)
+                alphas.append(a)
+            if self.lbfgs_history:
+                last = self.lbfgs_history[-1]
+                gamma = 1. / (last.rho * (Cnorm2(last.ob_y) + self.scale_p_o * Cnorm2(last.pr_y)))
+            else:
+                gamma = 1.
+            if self.smooth_gradient:
+                for name, s in self.ob_h.storages.items():
+                    s.data[:] = self._smooth(s.data)
+            self.ob_h *= dt(-gamma)
+            self.pr_h *= dt(-gamma * self.scale_p_o)
+            for slot, a in zip(self.lbfgs_history, reversed(alphas)):
+                b = slot.rho * self._lbfgs_dot(slot.ob_y, slot.pr_y, self.ob_h, self.pr_h)
+                # The direction carries the minus sign
+                Caxpy(dt(-a - b), slot.ob_s, self.ob_h)
+                Caxpy(dt(-a - b), slot.pr_s, self.pr_h)
+
+        two_loop()
+        if self.lbfgs_history and self._lbfgs_dot(self.ob_grad, self.pr_grad, self.ob_h, self.pr_h) >= 0:
+            logger.debug('L-BFGS direction is not a descent direction, resetting history')
+            self._lbfgs_reset()
+            two_loop()
+
     def engine_finalize(self):
         """
         Delete temporary containers.
@@ -353,6 +494,12 @@ class ML(PositionCorrectionEngine):
         del self.pr_grad_new
         del self.ptycho.containers[self.pr_h.ID]
         del self.pr_h
+        if self.lbfgs_history is not None:
+            for slot in self.lbfgs_history + self.lbfgs_pool:
+                for c in (slot.ob_s, slot.ob_y, slot.pr_s, slot.pr_y):
+                    del self.ptycho.containers[c.ID]
+            self.lbfgs_history = None
+            self.lbfgs_pool = None
 
         # Save floating intensities into runtime
         self.ptycho.runtime["float_intens"] = parallel.gather_dict(self.ML_model.float_intens_coeff)
@@ -393,6 +540,10 @@ class BaseModel(object):
         # Create working variables
         self.LL = 0.
 
+        # Propagated waves of the current object and probe, kept
+        # from new_grad for the line search
+        self.wave_cache = {}
+        self.wave_cache_nbytes = 0
 
     def prepare(self):
         # Useful quantities
@@ -426,6 +577,58 @@ class BaseModel(object):
             except:
                 pass
 
+    def _clear_wave_cache(self):
+        self.wave_cache = {}
+        self.wave_cache_nbytes = 0
+
+    def _keep_wave(self, key, f):
+        """
+        Keep the propagated wave `f` for the line search if it fits
+        into the ``wave_cache`` budget.
+        """
+        if self.wave_cache_nbytes + f.nbytes <= self.p.wave_cache * 1e6:
+            self.wave_cache[key] = f
+            self.wave_cache_nbytes += f.nbytes
+
+    def _cached_wave(self, key):
+        """
+        Return (and release) the wave kept for `key`, or None.
+        """
+        f = self.wave_cache.pop(key, None)
+        if f is not None:
+            self.wave_cache_nbytes -= f.nbytes
+        return f
+
+    def _forward_wave(self, name, pod):
+        """
+        Far-field wave of the current object and probe of `pod`.
+        """
+        f = self._cached_wave(name)
+        if f is None:
+            f = pod.fw(pod.probe * pod.object)
+        return f
+
+    def _reduce_grad(self, LL):
+        """
+        MPI reduction of the object and probe gradients and of the
+        negative log-likelihood `LL` (in place). The reductions are
+        non-blocking and overlap with the computation of the object
+        regularizer, which is added once they are complete.
+        """
+        requests = self.pr_grad.iallreduce()
+        requests += self.ob_grad.iallreduce()
+        requests.append(parallel.iallreduce(LL))
+
+        reg_grad = []
+        if self.regularizer:
+            for name, s in self.ob.storages.items():
+                reg_grad.append((name, self.regularizer.grad(s.data), self.regularizer.LL))
+
+        parallel.waitall(requests)
+        for name, grad, reg_LL in reg_grad:
+            self.ob_grad.storages[name].data += grad
+            LL += reg_LL
+
     def new_grad(self):
         """
         Compute a new gradient direction according to the noise model.
@@ -488,6 +691,7 @@ class GaussianModel(BaseModel):
         Note: The negative log-likelihood and local errors are also computed
         here.
         """
+        self._clear_wave_cache()
         self.ob_grad.fill(0.)
         self.pr_grad.fill(0.)
 
@@ -512,6 +716,7 @@ class GaussianModel(BaseModel):
                 if not pod.active:
                     continue
                 f[name] = pod.fw(pod.probe * pod.object)
+                self._keep_wave(name, f[name])
                 Imodel += pod.downsample(u.abs2(f[name]))
 
             # Floating intensity option
@@ -535,17 +740,8 @@ class GaussianModel(BaseModel):
             error_dct[dname] = np.array([0, LLL / np.prod(DI.shape), 0])
             LL += LLL
 
-        # MPI reduction of gradients
-        self.ob_grad.allreduce()
-        self.pr_grad.allreduce()
-        parallel.allreduce(LL)
-
-        # Object regularizer
-        if self.regularizer:
-            for name, s in self.ob.storages.items():
-                self.ob_grad.storages[name].data += self.regularizer.grad(
-                    s.data)
-                LL += self.regularizer.LL
+        # MPI reduction of gradients, object regularizer
+        self._reduce_grad(LL)
         self.LL = LL / self.tot_measpts
 
         return error_dct
@@ -575,7 +771,7 @@ class GaussianModel(BaseModel):
             for name, pod in diff_view.pods.items():
                 if not pod.active:
                     continue
-                f = pod.fw(pod.probe * pod.object)
+                f = self._forward_wave(name, pod)
                 a = pod.fw(pod.probe * ob_h[pod.ob_view]
                            + pr_h[pod.pr_view] * pod.object)
                 b = pod.fw(pr_h[pod.pr_view] * ob_h[pod.ob_view])
@@ -648,7 +844,7 @@ class GaussianModel(BaseModel):
                 for name, pod in diff_view.pods.items():
                     if not pod.active:
                         continue
-                    f = pod.fw(pod.probe * pod.object)
+                    f = self._forward_wave(name, pod)
                     a = pod.fw(pod.probe * ob_h[pod.ob_view]
                             + pr_h[pod.pr_view] * pod.object)
                     b = pod.fw(pr_h[pod.pr_view] * ob_h[pod.ob_view])
@@ -731,6 +927,7 @@ class PoissonModel(BaseModel):
         Note: The negative log-likelihood and local errors are also computed
         here.
         """
+        self._clear_wave_cache()
         self.ob_grad.fill(0.)
         self.pr_grad.fill(0.)
 
@@ -755,6 +952,7 @@ class PoissonModel(BaseModel):
                 if not pod.active:
                     continue
                 f[name] = pod.fw(pod.probe * pod.object)
+                self._keep_wave(name, f[name])
                 Imodel += u.abs2(f[name])
 
             # Floating intensity option
@@ -778,17 +976,8 @@ class PoissonModel(BaseModel):
             error_dct[dname] = np.array([0, LLL / np.prod(DI.shape), 0])
             LL += LLL
 
-        # MPI reduction of gradients
-        self.ob_grad.allreduce()
-        self.pr_grad.allreduce()
-        parallel.allreduce(LL)
-
-        # Object regularizer
-        if self.regularizer:
-            for name, s in self.ob.storages.items():
-                self.ob_grad.storages[name].data += self.regularizer.grad(
-                    s.data)
-                LL += self.regularizer.LL
+        # MPI reduction of gradients, object regularizer
+        self._reduce_grad(LL)
 
         self.LL = LL / self.tot_measpts
 
@@ -818,7 +1007,7 @@ class PoissonModel(BaseModel):
             for name, pod in diff_view.pods.items():
                 if not pod.active:
                     continue
-                f = pod.fw(pod.probe * pod.object)
+                f = self._forward_wave(name, pod)
                 a = pod.fw(pod.probe * ob_h[pod.ob_view]
                            + pr_h[pod.pr_view] * pod.object)
                 b = pod.fw(pr_h[pod.pr_view] * ob_h[pod.ob_view])
@@ -889,7 +1078,7 @@ class PoissonModel(BaseModel):
             for name, pod in diff_view.pods.items():
                 if not pod.active:
                     continue
-                f = pod.fw(pod.probe * pod.object)
+                f = self._forward_wave(name, pod)
                 a = pod.fw(pod.probe * ob_h[pod.ob_view]
                            + pr_h[pod.pr_view] * pod.object)
                 b = pod.fw(pr_h[pod.pr_view] * ob_h[pod.ob_view])
@@ -987,6 +1176,7 @@ class EuclidModel(BaseModel):
         Note: The negative log-likelihood and local errors are also computed
         here.
         """
+        self._clear_wave_cache()
         self.ob_grad.fill(0.)
         self.pr_grad.fill(0.)
 
@@ -1011,6 +1201,7 @@ class EuclidModel(BaseModel):
                 if not pod.active:
                     continue
                 f[name] = pod.fw(pod.probe * pod.object)
+                self._keep_wave(name, f[name])
                 Amodel += np.sqrt(u.abs2(f[name]))
 
             # Floating intensity option
@@ -1034,17 +1225,8 @@ class EuclidModel(BaseModel):
             error_dct[dname] = np.array([0, LLL / np.prod(DA.shape), 0])
             LL += LLL
 
-        # MPI reduction of gradients
-        self.ob_grad.allreduce()
-        self.pr_grad.allreduce()
-        parallel.allreduce(LL)
-
-        # Object regularizer
-        if self.regularizer:
-            for name, s in self.ob.storages.items():
-                self.ob_grad.storages[name].data += self.regularizer.grad(
-                    s.data)
-                LL += self.regularizer.LL
+        # MPI reduction of gradients, object regularizer
+        self._reduce_grad(LL)
         self.LL = LL / self.tot_measpts
 
         return error_dct
@@ -1074,7 +1256,7 @@ class EuclidModel(BaseModel):
             for name, pod in diff_view.pods.items():
                 if not pod.active:
                     continue
-                f = pod.fw(pod.probe * pod.object)
+                f = self._forward_wave(name, pod)
                 a = pod.fw(pod.probe * ob_h[pod.ob_view]
                            + pr_h[pod.pr_view] * pod.object)
                 b = pod.fw(pr_h[pod.pr_view] * ob_h[pod.ob_view])
@@ -1146,7 +1328,7 @@ class EuclidModel(BaseModel):
             for name, pod in diff_view.pods.items():
                 if not pod.active:
                     continue
-                f = pod.fw(pod.probe * pod.object)
+                f = self._forward_wave(name, pod)
                 a = pod.fw(pod.probe * ob_h[pod.ob_view]
                            + pr_h[pod.pr_view] * pod.object)
                 b = pod.fw(pr_h[pod.pr_view] * ob_h[pod.ob_view])
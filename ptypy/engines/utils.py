@@ -539,3 +539,15 @@ def Cdot(c1, c2):
         r += np.vdot(c1.storages[name].data.flat, c2.storages[name].data.flat)
     return r
 
+
+
+def Caxpy(a, c1, c2):
+    """
+    In-place ``c2 += a * c1`` on whole containers `c1` and `c2`.
+    No check is made to ensure they are of the same kind.
+
+    :param scalar a: Factor
+    :param Container c1, c2: Input, `c2` is modified
+    """
+    for name, s in c2.storages.items():
+        s.data += a * c1.storages[name].data
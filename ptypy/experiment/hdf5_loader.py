@@ -346,7 +346,7 @@ class Hdf5Loader(PtyScan):
         self.normalisation = None
         self.normalisation_laid_out_like_positions = None
         self.darkfield_laid_out_like_data = None
-        self.flatfield_field_laid_out_like_data = None
+        self.flatfield_laid_out_like_data = None
         self.mask_laid_out_like_data = None
         self.preview_indices = None
         self.framefilter = None
@@ -594,33 +594,176 @@ class Hdf5Loader(PtyScan):
         """
         define how data should be loaded (center, cropping)
         """
-        # now lets figure out the cropping and centering roughly so we don't load the full data in.
+        # Work out the region of interest on the padded frame first, so
+        # that only the part of the frames inside of it is read.
         frame_shape = np.array(self.data_shape[-2:]) + self.pad.reshape(2,2).sum(1)
-        center = frame_shape // 2 if self.p.center is None else u.expect2(self.p.center)
-        center = np.array([_translate_to_pix(frame_shape[ix], center[ix]) for ix in range(len(frame_shape))])
 
         if self.p.shape is None:
-            self.frame_slices = (slice(None, None, 1), slice(None, None, 1))
-            self.frame_shape = self.data_shape[-2:]
+            pshape = frame_shape
+            low_pix = np.zeros(2, dtype=int)
             self.p.shape = frame_shape
             log(3, "Loading full shape frame.")
-        elif self.p.shape is not None and not self.p.auto_center:
+        else:
             pshape = u.expect2(self.p.shape)
-            low_pix = center - pshape // 2
-            high_pix = low_pix + pshape
-            self.frame_slices = (slice(int(low_pix[0]), int(high_pix[0]), 1), slice(int(low_pix[1]), int(high_pix[1]), 1))
-            self.frame_shape = self.p.shape
+            if self.p.auto_center:
+                center = self._estimate_center()
+                self.info.auto_center = False
+                log(3, "Loading in frame based on an estimated center in:%.1f, %.1f" % tuple(center))
+            else:
+                center = frame_shape // 2 if self.p.center is None else u.expect2(self.p.center)
+                center = np.array([_translate_to_pix(frame_shape[ix], center[ix]) for ix in range(len(frame_shape))])
+                log(3, "Loading in frame based on a center in:%i, %i" % tuple(center))
+            low_pix = np.round(center).astype(int) - pshape // 2
             self.p.center = pshape // 2 #the  new center going forward
             self.info.center = self.p.center
             self.p.shape = pshape
-            log(3, "Loading in frame based on a center in:%i, %i" % tuple(center))
+
+        # The hyperslab of the detector inside the region of interest,
+        # the rest of the region of interest is zero-padded.
+        raw_shape = np.array(self.data_shape[-2:])
+        low = low_pix - self.pad.reshape(2,2)[:,0]
+        high = low + pshape
+        low_raw = np.clip(low, 0, raw_shape)
+        high_raw = np.clip(high, 0, raw_shape)
+        if (high_raw <= low_raw).any():
+            raise RuntimeError("The region of interest does not overlap with the detector frames.")
+        self.frame_slices = tuple(slice(int(lo), int(hi), 1) for lo, hi in zip(low_raw, high_raw))
+        self.frame_shape = tuple(int(hi - lo) for lo, hi in zip(low_raw, high_raw))
+        self.roi_pad = np.array([low_raw - low, high - high_raw], dtype=int).T
+        if self.roi_pad.any():
+            log(3, "Padding the frames by {}".format(self.roi_pad.flatten().tolist()))
+
+    def _estimate_center(self, nframes=10):
+        """
+        Mean mass center (on the padded frame) of up to `nframes` full
+        frames spread over the scan.
+        """
+        full = (slice(None, None, 1), slice(None, None, 1))
+        picks = np.unique(np.linspace(0, self.num_frames - 1, min(nframes, self.num_frames)).astype(int))
+        indices = [self._frame_index(ii) for ii in picks]
+        frames = self._read_frames(self.intensities, indices, full)
+        if self.mask is None:
+            mask = np.ones(frames.shape[-2:], dtype=bool)
+        elif self.mask_laid_out_like_data:
+            mask = self._read_frames(self.mask, indices, full)
         else:
-            self.frame_slices = (slice(None, None, 1), slice(None, None, 1))
-            self.frame_shape = self.data_shape[-2:]
-            self.info.center = None
-            self.info.auto_center = self.p.auto_center
-            log(3, "center is %s, auto_center: %s" % (self.info.center, self.info.auto_center))
-            log(3, "The loader will not do any cropping.")
+            mask = self.mask[()]
+        if self.mask is not None and self.p.mask.invert:
+            mask = 1 - mask
+        frames = frames * (mask > 0)
+        centers = [u.mass_center(frame) for frame in frames if frame.sum() > 0]
+        if not centers:
+            log(3, "No intensity in the frames for the center estimate, using the frame center.")
+            return (np.array(frames.shape[-2:]) + self.pad.reshape(2,2).sum(1)) // 2
+        center = np.mean(centers, axis=0)
+        return center + self.pad.reshape(2,2)[:,0]
+
+    def _frame_index(self, ii):
+        """
+        Index into the leading dimensions of the intensities for
+        frame `ii` of the scan.
+        """
+        if self._scantype == 'arb':
+            return (int(self.preview_indices[ii]),)
+        slow_idx, fast_idx = self.preview_indices[:, ii]
+        if self._ismapped:
+            return (int(slow_idx), int(fast_idx))
+        return (int(slow_idx * self.slow_axis.shape[1] + fast_idx),)
+
+    def _sorted_frames(self, indices):
+        """
+        Sorts the scan `indices` by their frame index (see `_frame_index`)
+        so that neighbouring frames end up in the same hyperslab read.
+        Returns the sorted scan indices and frame indices.
+        """
+        frame_indices = [self._frame_index(ii) for ii in indices]
+        order = sorted(range(len(indices)), key=lambda k: frame_indices[k])
+        return [indices[k] for k in order], [frame_indices[k] for k in order]
+
+    def _frame_runs(self, indices, max_length=None):
+        """
+        Groups consecutive frames in `indices` into runs of at most
+        `max_length` frames. Returns a list of (source, destination)
+        selections, the source lacks the trailing frame slices.
+        """
+        outer = ()
+        if self._is_spectro_scan and self.p.outer_index is not None:
+            outer = (self.p.outer_index,)
+        max_length = len(indices) if max_length is None else max_length
+        runs = []
+        start = 0
+        while start < len(indices):
+            stop = start + 1
+            while (stop < len(indices) and stop - start < max_length
+                   and indices[stop][:-1] == indices[start][:-1]
+                   and indices[stop][-1] == indices[stop - 1][-1] + 1):
+                stop += 1
+            first = indices[start]
+            runs.append((outer + first[:-1] + (slice(first[-1], first[-1] + stop - start),), np.s_[start:stop]))
+            start = stop
+        return runs
+
+    def _read_frames(self, dset, indices, frame_slices=None, out=None):
+        """
+        Reads the frames at `indices` (see `_frame_index`) from `dset`,
+        cut to `frame_slices` (the region of interest by default), into
+        the array `out`. Consecutive frames are read with a single
+        hyperslab selection.
+        """
+        if frame_slices is None:
+            frame_slices = self.frame_slices
+        if out is None:
+            sh = tuple(len(range(*sl.indices(n))) for sl, n in zip(frame_slices, dset.shape[-2:]))
+            out = np.empty((len(indices),) + sh, dtype=dset.dtype)
+        for src, dest in self._frame_runs(indices):
+            dset.read_direct(out, src + frame_slices, dest)
+        return out
+
+    def _correct_frames(self, indices, intensities, weights=None):
+        """
+        Corrects a block of raw `intensities` for the frames at `indices`
+        for darkfield, flatfield and normalisation, and pads them to
+        the region of interest. The mask is read unless given as `weights`.
+        Returns the block of weights and intensities.
+        """
+        if self.darkfield is not None:
+            if self.darkfield_laid_out_like_data:
+                df = self._read_frames(self.darkfield, indices)
+            else:
+                df = self.darkfield[self.frame_slices]
+            intensities = self.subtract_dark(intensities, df)
+
+        if self.flatfield is not None:
+            if self.flatfield_laid_out_like_data:
+                intensities[:] = intensities / self._read_frames(self.flatfield, indices)
+            else:
+                intensities[:] = intensities / self.flatfield[self.frame_slices]
+
+        if self.normalisation is not None:
+            normalisation = self.normalisation[()]
+            if self.normalisation_laid_out_like_positions:
+                scale = np.array([normalisation[index] for index in indices])
+            else:
+                scale = np.array([np.mean(normalisation[index]) for index in indices])
+            valid = np.abs(scale - self.normalisation_mean) < (self.p.normalisation.sigma * self.normalisation_std)
+            intensities[valid] = intensities[valid] / scale[valid, None, None] * self.normalisation_mean
+
+        if weights is None:
+            if self.mask is None:
+                weights = np.ones_like(intensities, dtype=int)
+            elif self.mask_laid_out_like_data:
+                weights = self._read_frames(self.mask, indices)
+            else:
+                weights = np.broadcast_to(self.mask[self.frame_slices], intensities.shape).copy()
+        if self.mask is not None and self.p.mask.invert:
+            weights = 1 - weights
+
+        if self.roi_pad.any():
+            pad = ((0, 0),) + tuple(map(tuple, self.roi_pad))
+            intensities = np.pad(intensities, pad, mode='constant')
+            weights = np.pad(weights, pad, mode='constant')
+
+        return weights, intensities
 
     def _reorder_preview_indices(self):
         if self.p.frameorder.indices is None:
@@ -636,10 +779,12 @@ class Hdf5Loader(PtyScan):
         intensities = {}
         positions = {}
         weights = {}
-        for ii in indices:
+        indices, frame_indices = self._sorted_frames(indices)
+        raw = self._read_frames(self.intensities, frame_indices)
+        weights_block, intensities_block = self._correct_frames(frame_indices, raw)
+        for k, ii in enumerate(indices):
             slow_idx, fast_idx = self.preview_indices[:, ii]
-            intensity_index = slow_idx * self.slow_axis.shape[1] + fast_idx
-            weights[ii], intensities[ii] = self.get_corrected_intensities(intensity_index)
+            weights[ii], intensities[ii] = weights_block[k], intensities_block[k]
             positions[ii] = np.array([np.squeeze(self.slow_axis[slow_idx, fast_idx]) * self.p.positions.slow_multiplier,
                                       np.squeeze(self.fast_axis[slow_idx, fast_idx]) * self.p.positions.fast_multiplier])
         log(3, 'Data loaded successfully.')
@@ -649,9 +794,12 @@ class Hdf5Loader(PtyScan):
         intensities = {}
         positions = {}
         weights = {}
-        for jj in indices:
+        indices, frame_indices = self._sorted_frames(indices)
+        raw = self._read_frames(self.intensities, frame_indices)
+        weights_block, intensities_block = self._correct_frames(frame_indices, raw)
+        for k, jj in enumerate(indices):
             slow_idx, fast_idx = self.preview_indices[:, jj]
-            weights[jj], intensities[jj] = self.get_corrected_intensities((slow_idx, fast_idx))
+            weights[jj], intensities[jj] = weights_block[k], intensities_block[k]
             positions[jj] = np.array([np.squeeze(self.slow_axis[slow_idx, fast_idx]) * self.p.positions.slow_multiplier,
                                       np.squeeze(self.fast_axis[slow_idx, fast_idx]) * self.p.positions.fast_multiplier])
         log(3, 'Data loaded successfully.')
@@ -661,9 +809,12 @@ class Hdf5Loader(PtyScan):
         intensities = {}
         positions = {}
         weights = {}
-        for ii in indices:
+        indices, frame_indices = self._sorted_frames(indices)
+        raw = self._read_frames(self.intensities, frame_indices)
+        weights_block, intensities_block = self._correct_frames(frame_indices, raw)
+        for k, ii in enumerate(indices):
             jj = self.preview_indices[ii]
-            weights[ii], intensities[ii] = self.get_corrected_intensities(jj)
+            weights[ii], intensities[ii] = weights_block[k], intensities_block[k]
             positions[ii] = np.array([np.squeeze(self.slow_axis[jj]) * self.p.positions.slow_multiplier,
                                       np.squeeze(self.fast_axis[jj]) * self.p.positions.fast_multiplier])
         log(3, 'Data loaded successfully.')
@@ -678,57 +829,21 @@ class Hdf5Loader(PtyScan):
         corr[raw<dark] = 0
         return corr
 
-    def get_corrected_intensities(self, index):
+    def get_corrected_intensities(self, index, intensity=None):
         '''
-        Corrects the intensities for darkfield, flatfield and normalisations if they exist.
-        There is a lot of logic here, I wonder if there is a better way to get rid of it.
-        Limited a bit by the MPI, and thinking about extension to large data size.
+        Corrects the intensities of a single frame for darkfield, flatfield and normalisations if they exist.
+        The raw frame inside the region of interest is read unless given as `intensity`.
+        The load methods correct whole blocks of frames with `_correct_frames` instead.
         '''
         if not hasattr(index, '__iter__'):
             index = (index,)
-        indexed_frame_slices = tuple([slice(ix, ix+1, 1) for ix in index])
-        indexed_frame_slices += self.frame_slices
-        if self._is_spectro_scan and self.p.outer_index is not None:
-            indexed_frame_slices = (self.p.outer_index,) + indexed_frame_slices
-        intensity = self.intensities[indexed_frame_slices].squeeze()
-
-        # TODO: Remove these logic blocks into something a bit more sensible.
-        if self.darkfield is not None:
-            if self.darkfield_laid_out_like_data:
-                df = self.darkfield[indexed_frame_slices].squeeze()
-            else:
-                df = self.darkfield[self.frame_slices].squeeze()
-            intensity = self.subtract_dark(intensity, df)
-
-        if self.flatfield is not None:
-            if self.flatfield_laid_out_like_data:
-                intensity[:] = intensity / self.flatfield[indexed_frame_slices].squeeze()
-            else:
-                intensity[:] = intensity / self.flatfield[self.frame_slices].squeeze()
-
-        if self.normalisation is not None:
-            if self.normalisation_laid_out_like_positions:
-                scale =  self.normalisation[index]
-            else:
-                scale = np.squeeze(self.normalisation[indexed_frame_slices])
-            if np.abs(scale - self.normalisation_mean) < (self.p.normalisation.sigma * self.normalisation_std):
-                intensity[:] = intensity / scale * self.normalisation_mean
-
-        if self.mask is not None:
-            if self.mask_laid_out_like_data:
-                mask = self.mask[indexed_frame_slices].squeeze()
-            else:
-                mask = self.mask[self.frame_slices].squeeze()
-            if self.p.mask.invert:
-                mask = 1 - mask
+        index = tuple(int(ix) for ix in index)
+        if intensity is None:
+            intensity = self._read_frames(self.intensities, [index])
         else:
-            mask = np.ones_like(intensity, dtype=int)
-
-        if self.p.padding:
-            intensity = np.pad(intensity, tuple(self.pad.reshape(2,2)), mode='constant')
-            mask = np.pad(mask, tuple(self.pad.reshape(2,2)), mode='constant')
-
-        return mask, intensity
+            intensity = np.array(intensity)[None]
+        weights, intensities = self._correct_frames([index], intensity)
+        return weights[0], intensities[0]
 
     def compute_scan_mapping_and_trajectory(self, data_shape, positions_fast_shape, positions_slow_shape):
         '''
@@ -916,85 +1031,29 @@ class Hdf5LoaderFast(Hdf5Loader):
         self.intensities_array = None
         self.weights_array = None
 
-    @staticmethod
-    def subtract_dark(raw, dark):
-        """
-        Subtract dark current from a raw frame
-        and truncate negative values
-        """
-        corr = raw - dark
-        corr[raw<dark] = 0
-        return corr
-
     @staticmethod
     def _init_worker(intensities_raw_array, weights_raw_array,
                      intensities_handle,
                      weights_handle,
-                     darkfield_handle,
-                     flatfield_handle,
                      intensities_dtype, weights_dtype,
-                     array_shape,
-                     mask_laid_out_like_data,
-                     darkfield_laid_out_like_data,
-                     flatfield_laid_out_like_data):
+                     array_shape):
         Hdf5LoaderFast.worker_intensities_handle = intensities_handle
         Hdf5LoaderFast.worker_intensities_array = np.frombuffer(intensities_raw_array, intensities_dtype, -1).reshape(array_shape)
         Hdf5LoaderFast.worker_weights_handle = weights_handle
         Hdf5LoaderFast.worker_weights_array = np.frombuffer(weights_raw_array, weights_dtype, -1).reshape(array_shape) if weights_raw_array else None
-        Hdf5LoaderFast.worker_mask_laid_out_like_data = mask_laid_out_like_data
-        Hdf5LoaderFast.worker_darkfield_handle = darkfield_handle
-        Hdf5LoaderFast.worker_darkfield_laid_out_like_data = darkfield_laid_out_like_data
-        Hdf5LoaderFast.worker_flatfield_handle = flatfield_handle
-        Hdf5LoaderFast.worker_flatfield_laid_out_like_data = flatfield_laid_out_like_data
 
     @staticmethod
-    def _read_intensities_and_weights(slices):
+    def _read_intensities_and_weights(selections):
         '''
-        Copy intensities/weights into memory and correct for
-        darkfield/flatfield if they exist
+        Copy a run of intensities (and weights if laid out like
+        the data) into the shared memory
         '''
-        indexed_frame_slices, dest_slices = slices
-        frame_slices = tuple(np.array(indexed_frame_slices)[-2:])
-
-        # Handle / target array for intensities
-        src_intensities  = Hdf5LoaderFast.worker_intensities_handle
-        dest_intensities = Hdf5LoaderFast.worker_intensities_array
-
-        # Handle / target array for mask/weights
-        src_weights  = Hdf5LoaderFast.worker_weights_handle
-        dest_weights = Hdf5LoaderFast.worker_weights_array
-        mask_laid_out_like_data = Hdf5LoaderFast.worker_mask_laid_out_like_data
-
-        # Handle for darkfield
-        src_darkfield = Hdf5LoaderFast.worker_darkfield_handle
-        darkfield_laid_out_like_data = Hdf5LoaderFast.worker_darkfield_laid_out_like_data
-
-        # Handle for flatfield
-        src_flatfield = Hdf5LoaderFast.worker_flatfield_handle
-        flatfield_laid_out_like_data = Hdf5LoaderFast.worker_flatfield_laid_out_like_data
-
-        # Copy intensities and weights
-        src_intensities.read_direct(dest_intensities, indexed_frame_slices, dest_slices)
-        if src_weights is not None:
-            if mask_laid_out_like_data:
-                src_weights.read_direct(dest_weights, indexed_frame_slices, dest_slices)
-            else:
-                src_weights.read_direct(dest_weights, frame_slices, dest_slices)
-
-        # Correct darkfield
-        if src_darkfield is not None:
-            if darkfield_laid_out_like_data:
-                df = src_darkfield[indexed_frame_slices].squeeze()
-            else:
-                df = src_darkfield[frame_slices].squeeze()
-            dest_intensities[dest_slices] = Hdf5LoaderFast.subtract_dark(dest_intensities[dest_slices], df)
-
-        # Correct flatfield
-        if src_flatfield is not None:
-            if flatfield_laid_out_like_data:
-                dest_intensities[dest_slices] /= src_flatfield[indexed_frame_slices].squeeze()
-            else:
-                dest_intensities[dest_slices] /= src_flatfield[frame_slices].squeeze()
+        src_slices, dest_slices = selections
+        Hdf5LoaderFast.worker_intensities_handle.read_direct(Hdf5LoaderFast.worker_intensities_array,
+                                                             src_slices, dest_slices)
+        if Hdf5LoaderFast.worker_weights_array is not None:
+            Hdf5LoaderFast.worker_weights_handle.read_direct(Hdf5LoaderFast.worker_weights_array,
+                                                             src_slices, dest_slices)
 
     def _setup_raw_intensity_buffer(self, dtype, sh):
         npixels = int(np.prod(sh))
@@ -1007,120 +1066,78 @@ class Hdf5LoaderFast(Hdf5Loader):
         npixels = int(np.prod(sh))
         if (self.weights_array is not None) and (self.weights_array.size == npixels):
             return
-        if self.mask is not None:
+        if self.mask is not None and self.mask_laid_out_like_data:
             self._weights_raw_array = RawArray(np.ctypeslib.as_ctypes_type(dtype), npixels)
             self.weights_array = np.frombuffer(self._weights_raw_array, dtype, -1).reshape(sh)
         else:
             self._weights_raw_array = None
-            self.weights_array = np.ones(sh, dtype=int)
+            self.weights_array = None
 
-    def load_multiprocessing(self, src_slices):
-        sh = (len(src_slices),) + self.frame_shape
+    def load_multiprocessing(self, frame_indices):
+        '''
+        Reads the frames at `frame_indices` into shared memory, runs of
+        consecutive frames are split over the worker processes, and
+        corrects them like `Hdf5Loader` does.
+        '''
+        sh = (len(frame_indices),) + self.frame_shape
         self._setup_raw_intensity_buffer(self.intensities_dtype, sh)
         self._setup_raw_weights_buffer(self.mask_dtype, sh)
-        dest_slices = [np.s_[i:i+1] for i in range(len(src_slices))]
+        max_length = -(-len(frame_indices) // self.cpu_count_per_rank)
+        selections = [(src + self.frame_slices, dest)
+                      for src, dest in self._frame_runs(frame_indices, max_length)]
 
         with Pool(self.cpu_count_per_rank,
                   initializer=Hdf5LoaderFast._init_worker,
                   initargs=(self._intensities_raw_array, self._weights_raw_array,
-                            self.intensities, self.mask, self.darkfield, self.flatfield,
+                            self.intensities, self.mask,
                             self.intensities_dtype, self.mask_dtype,
-                            sh, self.mask_laid_out_like_data,
-                            self.darkfield_laid_out_like_data,
-                            self.flatfield_field_laid_out_like_data)) as p:
-            p.map(self._read_intensities_and_weights, zip(src_slices, dest_slices))
+                            sh)) as p:
+            p.map(self._read_intensities_and_weights, selections)
 
-    def load_unmapped_raster_scan(self, indices):
+        weights = None if self.weights_array is None else self.weights_array.copy()
+        return self._correct_frames(frame_indices, self.intensities_array.copy(), weights)
 
-        slices = []
-        for ii in indices:
-            slow_idx, fast_idx = self.preview_indices[:, ii]
-            jj = slow_idx * self.slow_axis.shape[1] + fast_idx
-            indexed_frame_slices = (jj,)
-            indexed_frame_slices += self.frame_slices
-            if self._is_spectro_scan and self.p.outer_index is not None:
-                indexed_frame_slices = (self.p.outer_index,) + indexed_frame_slices
-            slices.append(indexed_frame_slices)
-
-        self.load_multiprocessing(slices)
+    def load_unmapped_raster_scan(self, indices):
+        indices, frame_indices = self._sorted_frames(indices)
+        weights_block, intensities_block = self.load_multiprocessing(frame_indices)
 
         intensities = {}
         positions = {}
         weights = {}
         for k,ii in enumerate(indices):
             slow_idx, fast_idx = self.preview_indices[:,ii]
-            weights[ii], intensities[ii] = self.get_corrected_intensities(self.weights_array[k], self.intensities_array[k], ii, slices[k])
+            weights[ii], intensities[ii] = weights_block[k], intensities_block[k]
             positions[ii] = np.array([self.slow_axis[slow_idx, fast_idx] * self.p.positions.slow_multiplier,
                                       self.fast_axis[slow_idx, fast_idx] * self.p.positions.fast_multiplier])
         log(3, 'Data loaded successfully.')
         return intensities, positions, weights
 
     def load_mapped_and_raster_scan(self, indices):
-
-        slices = []
-        for ii in indices:
-            index = self.preview_indices[:, ii]
-            indexed_frame_slices = tuple(index)
-            indexed_frame_slices += self.frame_slices
-            if self._is_spectro_scan and self.p.outer_index is not None:
-                indexed_frame_slices = (self.p.outer_index,) + indexed_frame_slices
-            slices.append(indexed_frame_slices)
-
-        self.load_multiprocessing(slices)
+        indices, frame_indices = self._sorted_frames(indices)
+        weights_block, intensities_block = self.load_multiprocessing(frame_indices)
 
         intensities = {}
         positions = {}
         weights = {}
         for k,ii in enumerate(indices):
             slow_idx, fast_idx = self.preview_indices[:, ii]
-            weights[ii], intensities[ii] = self.get_corrected_intensities(self.weights_array[k], self.intensities_array[k], ii, slices[k])
+            weights[ii], intensities[ii] = weights_block[k], intensities_block[k]
             positions[ii] = np.array([self.slow_axis[slow_idx, fast_idx] * self.p.positions.slow_multiplier,
                                       self.fast_axis[slow_idx, fast_idx] * self.p.positions.fast_multiplier])
         log(3, 'Data loaded successfully.')
         return intensities, positions, weights
 
     def load_mapped_and_arbitrary_scan(self, indices):
-
-        slices = []
-        for ii in indices:
-            jj = self.preview_indices[ii]
-            indexed_frame_slices = (jj,)
-            indexed_frame_slices += self.frame_slices
-            if self._is_spectro_scan and self.p.outer_index is not None:
-                indexed_frame_slices = (self.p.outer_index,) + indexed_frame_slices
-            slices.append(indexed_frame_slices)
-
-        self.load_multiprocessing(slices)
+        indices, frame_indices = self._sorted_frames(indices)
+        weights_block, intensities_block = self.load_multiprocessing(frame_indices)
 
         intensities = {}
         positions = {}
         weights = {}
         for k,ii in enumerate(indices):
             jj = self.preview_indices[ii]
-            weights[ii], intensities[ii] = self.get_corrected_intensities(self.weights_array[k], self.intensities_array[k], ii, slices[k])
+            weights[ii], intensities[ii] = weights_block[k], intensities_block[k]
             positions[ii] = np.array([self.slow_axis[jj] * self.p.positions.slow_multiplier,
                                       self.fast_axis[jj] * self.p.positions.fast_multiplier])
         log(3, 'Data loaded successfully.')
         return intensities, positions, weights
-
-    def get_corrected_intensities(self, weights, intensities, index, indexed_frame_slice):
-        '''
-        Corrects the intensities for normalisation and padding
-        '''
-
-        if self.normalisation is not None:
-            if self.normalisation_laid_out_like_positions:
-                scale =  self.normalisation[index]
-            else:
-                scale = np.squeeze(self.normalisation[indexed_frame_slice])
-            if np.abs(scale - self.normalisation_mean) < (self.p.normalisation.sigma * self.normalisation_std):
-                intensities *= 1 / (scale * self.normalisation_mean)
-
-        if self.p.padding:
-            intensities = np.pad(intensities, tuple(self.pad.reshape(2,2)), mode='constant')
-            weights = np.pad(weights, tuple(self.pad.reshape(2,2)), mode='constant')
-
-        if self.p.mask.invert:
-            weights = 1 - weights
-
-        return weights, intensities
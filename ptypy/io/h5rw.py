@@ -24,10 +24,44 @@ h5options = dict(
     H5PY_VERSION=h5py.version.version,
     # UNSUPPORTED = 'ignore',
     UNSUPPORTED='fail',
-    SLASH_ESCAPE='_SLASH_')
+    SLASH_ESCAPE='_SLASH_',
+    # Compression filter for arrays: None, 'lzf' or 'gzip'
+    COMPRESSION='gzip',
+    # gzip level (0-9), None for the h5py default
+    COMPRESSION_OPTS=None,
+    # Byte shuffle filter, helps compressing floating point data
+    SHUFFLE=False,
+    # Chunk shape for arrays of the same dimensionality, entries <= 0
+    # span the full axis. None for automatic chunking.
+    CHUNKS=None)
 STR_CONVERT = [type]
 
 
+def _dataset_options(shape, options=None):
+    """
+    Compression and chunking arguments of `create_dataset`
+    for a compressed array of shape `shape`, according to `options`
+    (defaults to `h5options`).
+    """
+    if options is None:
+        options = h5options
+    compression = options['COMPRESSION']
+    if compression is None or compression == 'none':
+        kwargs = {}
+    elif compression == 'lzf':
+        kwargs = dict(compression='lzf')
+    elif compression == 'gzip':
+        kwargs = dict(compression='gzip', compression_opts=options['COMPRESSION_OPTS'])
+    else:
+        raise ValueError("Unsupported compression '%s', use None, 'lzf' or 'gzip'" % compression)
+    if options['SHUFFLE']:
+        kwargs['shuffle'] = True
+    chunks = options['CHUNKS']
+    if chunks is not None and len(chunks) == len(shape) and all(shape):
+        kwargs['chunks'] = tuple(min(c, n) if c > 0 else n for c, n in zip(chunks, shape))
+    return kwargs
+
+
 def sdebug(f):
     """
     debugging decorator for _store functions
@@ -53,7 +87,7 @@ class Str_to_Slice(object):
 str_to_slice = Str_to_Slice()
 
 
-def _h5write(filename, mode, *args, **kwargs):
+def _h5write(filename, mode, *args, options=None, **kwargs):
     """\
     _h5write(filename, mode, {'var1'=..., 'var2'=..., ...})
     _h5write(filename, mode, var1=..., var2=..., ...)
@@ -75,10 +109,20 @@ def _h5write(filename, mode, *args, **kwargs):
 
     The file mode can be chosen according to the h5py documentation.
     It defaults to overwriting an existing file.
+
+    The dictionary `options` overrides entries of `h5options` for
+    this call only.
     """
 
     filename = os.path.abspath(os.path.expanduser(filename))
 
+    opts = dict(h5options)
+    if options is not None:
+        unknown = set(options) - set(h5options)
+        if unknown:
+            raise ValueError('Unknown h5options: %s' % ', '.join(sorted(unknown)))
+        opts.update(options)
+
     ctime = time.asctime()
     mtime = ctime
 
@@ -108,7 +152,7 @@ def _h5write(filename, mode, *args, **kwargs):
     # @sdebug
     def _store_numpy(group, a, name, compress=True):
         if compress:
-            dset = group.create_dataset(name, data=a, compression='gzip')
+            dset = group.create_dataset(name, data=a, **_dataset_options(np.shape(a), opts))
         else:
             dset = group.create_dataset(name, data=a)
         dset.attrs['type'] = 'array'
@@ -160,7 +204,7 @@ def _h5write(filename, mode, *args, **kwargs):
         dset.attrs['type'] = 'dict'
         for k, v in d.items():
             if k.find('/') > -1:
-                k = k.replace('/', h5options['SLASH_ESCAPE'])
+                k = k.replace('/', opts['SLASH_ESCAPE'])
                 ndset = _store(dset, v, k)
                 if ndset is not None:
                     ndset.attrs['escaped'] = '1'
@@ -250,9 +294,9 @@ def _h5write(filename, mode, *args, **kwargs):
         elif type(a) in STR_CONVERT:
             dset = _store_string(group, str(a), name)
         else:
-            if h5options['UNSUPPORTED'] == 'fail':
+            if opts['UNSUPPORTED'] == 'fail':
                 raise RuntimeError('Unsupported data type : %s' % type(a))
-            elif h5options['UNSUPPORTED'] == 'pickle':
+            elif opts['UNSUPPORTED'] == 'pickle':
                 dset = _store_pickle(group, a, name)
             else:
                 dset = None
@@ -264,7 +308,7 @@ def _h5write(filename, mode, *args, **kwargs):
         os.makedirs(base)
     # Open the file and save everything
     with h5py.File(filename, mode) as f:
-        f.attrs['h5rw_version'] = h5options['H5RW_VERSION']
+        f.attrs['h5rw_version'] = opts['H5RW_VERSION']
         f.attrs['ctime'] = ctime
         f.attrs['mtime'] = mtime
         for k, v in d.items():
@@ -279,7 +323,7 @@ def _h5write(filename, mode, *args, **kwargs):
     return
 
 
-def h5write(filename, *args, **kwargs):
+def h5write(filename, *args, options=None, **kwargs):
     """\
     h5write(filename, {'var1'=..., 'var2'=..., ...})
     h5write(filename, var1=..., var2=..., ...)
@@ -300,13 +344,16 @@ def h5write(filename, *args, **kwargs):
 
     The file mode can be chosen according to the h5py documentation.
     It defaults to overwriting an existing file.
+
+    The dictionary `options` overrides entries of `h5options` for
+    this call only.
     """
 
-    _h5write(filename, 'w', *args, **kwargs)
+    _h5write(filename, 'w', *args, options=options, **kwargs)
     return
 
 
-def h5append(filename, *args, **kwargs):
+def h5append(filename, *args, options=None, **kwargs):
     """\
     h5append(filename, {'var1'=..., 'var2'=..., ...})
     h5append(filename, var1=..., var2=..., ...)
@@ -327,9 +374,12 @@ def h5append(filename, *args, **kwargs):
 
     The file mode can be chosen according to the h5py documentation.
     It defaults to overwriting an existing file.
+
+    The dictionary `options` overrides entries of `h5options` for
+    this call only.
     """
 
-    _h5write(filename, 'a', *args, **kwargs)
+    _h5write(filename, 'a', *args, options=options, **kwargs)
     return
 
 
@@ -8,6 +8,8 @@ This file is part of the PTYPY package.
     :license: see LICENSE for details.
 """
 import os
+import mmap
+import tempfile
 import numpy as np
 from functools import wraps
 from collections import OrderedDict
@@ -16,7 +18,7 @@ from collections import namedtuple
 __all__ = ['str2int', 'str2range', 'complex_overload', 'expect2',
            'expect3', 'keV2m', 'keV2nm', 'nm2keV', 'm2keV', 'clean_path',
            'unique_path', 'Table', 'all_subclasses', 'expectN', 'isstr',
-           'electron_wavelength']
+           'electron_wavelength', 'file_backed_zeros', 'mmap_of', 'advise_pages']
 
 
 def all_subclasses(cls, names=False):
@@ -340,6 +342,64 @@ def clean_path(filename):
     return filename
 
 
+def file_backed_zeros(shape, dtype, directory):
+    """\
+    Array of zeros mapped onto an unlinked temporary file in `directory`.
+    Its pages are written back to that file instead of being held in
+    memory, see :py:func:`advise_pages`.
+
+    Parameters
+    ----------
+    shape : tuple
+            Shape of the array.
+
+    dtype : dtype
+            Data type of the array.
+
+    directory : str
+            Directory for the temporary file.
+    """
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if nbytes == 0:
+        return np.zeros(shape, dtype=dtype)
+    with tempfile.TemporaryFile(dir=directory) as f:
+        f.truncate(nbytes)
+        buf = mmap.mmap(f.fileno(), nbytes)
+    return np.frombuffer(buf, dtype=dtype).reshape(shape)
+
+
+def mmap_of(a):
+    """\
+    Returns the mmap that array `a` is mapped onto, or None.
+    """
+    while isinstance(a, np.ndarray):
+        a = a.base
+    if isinstance(a, memoryview):
+        a = a.obj
+    return a if isinstance(a, mmap.mmap) else None
+
+
+def advise_pages(a, advice):
+    """\
+    Passes `advice` on the pages of the file-backed array `a` on to the
+    kernel. Does nothing for other arrays or if the platform does not
+    know the advice.
+
+    Parameters
+    ----------
+    a : numpy-ndarray or mmap
+            Array as returned by :py:func:`file_backed_zeros`, or its mmap.
+
+    advice : str
+            Name of a ``mmap.MADV_*`` constant, e.g. ``'MADV_DONTNEED'``
+            to release the pages or ``'MADV_WILLNEED'`` to read them ahead.
+    """
+    buf = a if isinstance(a, mmap.mmap) else mmap_of(a)
+    advice = getattr(mmap, advice, None)
+    if buf is not None and advice is not None:
+        buf.madvise(advice)
+
+
 def electron_wavelength(electron_energy):
     r"""
     Calculate electron wavelength based on energy in keV:
@@ -26,8 +26,8 @@ MPIenabled = not (size == 1)
 master = (rank == 0)
 
 __all__ = ['MPIenabled', 'comm', 'MPI', 'master','barrier',
-           'LoadManager', 'loadmanager','allreduce','send','receive','bcast',
-           'bcast_dict', 'gather_dict', 'gather_list', 
+           'LoadManager', 'loadmanager','allreduce','iallreduce','waitall','send','receive','bcast',
+           'bcast_dict', 'gather_dict', 'gather_list', 'allgatherv', 'scatterv',
            'MPIrand_normal', 'MPIrand_uniform','MPInoise2d']
 
 
@@ -197,6 +197,116 @@ def allreduce(a, op=None):
     else:
         return a
 
+def iallreduce(a, op=None):
+    """
+    Wrapper for comm.Iallreduce, always in place. Starts the reduction
+    and returns immediately, such that computation can go on while the
+    data is communicated.
+
+    Parameters
+    ----------
+    a : numpy-ndarray
+        The array to operate on. It must not be accessed until the
+        reduction has been completed with :py:func:`waitall`.
+
+    op : operation
+        MPI operation to execute, see :py:func:`allreduce`. If None,
+        uses MPI.SUM.
+
+    Returns
+    -------
+    request : MPI.Request or None
+        Handle of the pending reduction, None if MPI is disabled.
+
+    See also
+    --------
+    allreduce
+    waitall
+    """
+    if not MPIenabled:
+        return None
+    if op is None:
+        return comm.Iallreduce(MPI.IN_PLACE, a)
+    else:
+        return comm.Iallreduce(MPI.IN_PLACE, a, op=op)
+
+
+def waitall(requests):
+    """
+    Completes pending non-blocking operations.
+
+    Parameters
+    ----------
+    requests : MPI.Request, list or None
+        Request handle(s) as returned by :py:func:`iallreduce`.
+        None entries are ignored.
+    """
+    if requests is None:
+        return
+    if not isinstance(requests, (list, tuple)):
+        requests = [requests]
+    requests = [r for r in requests if r is not None]
+    if requests:
+        MPI.Request.Waitall(requests)
+
+
+def allreduce_halo(a, boxes, communicator=None):
+    """
+    In-place sum of `a` across processes, restricted to the regions
+    where the bounding box of this process overlaps with the bounding
+    boxes of the others. Only those halo regions are communicated,
+    with non-blocking point-to-point messages.
+
+    Parameters
+    ----------
+    a : numpy-ndarray
+        The array to operate on. Boxes refer to its last two axes.
+
+    boxes : list
+        A ``(row_start, row_stop, col_start, col_stop)`` tuple for every
+        rank, identical on all processes. Empty boxes are allowed.
+
+    communicator : MPI.Comm, optional
+        Communicator to exchange the halos with. Defaults to
+        :py:data:`comm` if MPI is enabled.
+
+    Note
+    ----
+    After the call, `a` holds the full sum inside the box of this process
+    provided that no other process contributed to it from outside its own
+    box. Values outside the own box are left untouched.
+
+    See also
+    --------
+    allreduce
+    """
+    if communicator is None:
+        if not MPIenabled:
+            return a
+        communicator = comm
+    me = communicator.Get_rank()
+    r0, r1, c0, c1 = boxes[me]
+    requests = []
+    halos = []
+    for other, (s0, s1, d0, d1) in enumerate(boxes):
+        if other == me:
+            continue
+        y0, y1 = max(r0, s0), min(r1, s1)
+        x0, x1 = max(c0, d0), min(c1, d1)
+        if y0 >= y1 or x0 >= x1:
+            continue
+        sl = (Ellipsis, slice(y0, y1), slice(x0, x1))
+        sendbuf = a[sl].copy()
+        recvbuf = np.empty_like(sendbuf)
+        requests.append(communicator.Isend(sendbuf, dest=other))
+        requests.append(communicator.Irecv(recvbuf, source=other))
+        halos.append((sl, sendbuf, recvbuf))
+    for request in requests:
+        request.Wait()
+    for sl, sendbuf, recvbuf in halos:
+        a[sl] += recvbuf
+    return a
+
 def allreduceC(c):
     """
     Performs MPI parallel ``allreduce`` with a sum as reduction
@@ -589,6 +699,89 @@ def gather_dict(dct, target=0):
     #     barrier()
     # return out
 
+def allgatherv(a):
+    """
+    Wrapper for `comm.Allgatherv`. Concatenates the arrays `a` of all
+    processes along the first axis, in the order of the ranks, and
+    distributes the result to every process without pickling.
+
+    Parameters
+    ----------
+    a : ndarray
+        Local array. Arrays of all processes need to agree in data type
+        and in shape except for the first axis, which may be of zero length.
+
+    Returns
+    -------
+    out : ndarray
+        The concatenated array, identical at every process.
+    """
+    if not MPIenabled:
+        return a
+
+    a = np.ascontiguousarray(a)
+    dtypestr = a.dtype.str
+    if dtypestr == '|b1':
+        a = a.view('|u1')
+    rowsize = int(np.prod(a.shape[1:]))
+
+    counts = np.empty((size,), dtype=np.int64)
+    comm.Allgather(np.array([a.size], dtype=np.int64), counts)
+    out = np.empty((counts.sum() // max(rowsize, 1),) + a.shape[1:], dtype=a.dtype)
+    comm.Allgatherv(a, [out, counts])
+
+    if dtypestr == '|b1':
+        out = out.view('bool')
+    return out
+
+
+def scatterv(a, counts, source=0):
+    """
+    Wrapper for `comm.Scatterv`. Scatters consecutive blocks of rows of
+    the array `a` from ``rank==source``: process `r` receives the next
+    ``counts[r]`` rows. Only the rows a process owns are transmitted to it.
+
+    Parameters
+    ----------
+    a : ndarray
+        Array to scatter, only needed at ``rank==source``.
+    counts : list of int
+        Number of rows for each process, known to every process.
+    source : int
+        The rank of the source node / process. Defaults to 0 (master).
+
+    Returns
+    -------
+    out : ndarray
+        The rows of `a` assigned to this process.
+
+    See also
+    --------
+    bcast
+    """
+    if not MPIenabled:
+        return a
+
+    if rank == source:
+        a = np.ascontiguousarray(a)
+        shape, dtypestr = comm.bcast((a.shape[1:], a.dtype.str), source)
+    else:
+        shape, dtypestr = comm.bcast(None, source)
+
+    newdtype = '|u1' if dtypestr == '|b1' else dtypestr
+    rowsize = int(np.prod(shape))
+    out = np.empty((counts[rank],) + tuple(shape), dtype=newdtype)
+    if rank == source:
+        sendbuf = [a.view(newdtype), np.asarray(counts, dtype=np.int64) * rowsize]
+    else:
+        sendbuf = None
+    comm.Scatterv(sendbuf, out, root=source)
+
+    if dtypestr == '|b1':
+        out = out.view('bool')
+    return out
+
+
 def _send(data, dest=0, tag=0):
     """
     Wrapper for comm.Send
@@ -0,0 +1,69 @@
+'''
+Tests for the incremental address book of the serial engines
+'''
+
+import unittest
+import numpy as np
+from ptypy import utils as u
+from ptypy.accelerate.base.engines.projectional_serial import AddressBook, serialize_array_access
+from test import utils as tu
+
+
+class AddressBookTest(unittest.TestCase):
+
+    def set_up_ptycho(self, scanmodel="Full", num_object_modes=1):
+        scan = u.Param(coherence=u.Param(num_object_modes=num_object_modes))
+        return tu.EngineTestRunner(None, autosave=False, scanmodel=scanmodel, verbose_level="critical",
+                                   num_frames=50, shape=32, frames_per_block=20, scan=scan, level=2)
+
+    def assert_same_addresses(self, book, d):
+        view_IDs, poe_IDs, addr = book.serialize(d)
+        expected_view_IDs, expected_poe_IDs, expected_addr = serialize_array_access(d)
+        self.assertEqual(view_IDs, expected_view_IDs)
+        self.assertEqual(poe_IDs, expected_poe_IDs)
+        self.assertEqual(addr.dtype, expected_addr.dtype)
+        np.testing.assert_array_equal(addr, expected_addr)
+
+    def test_serialize(self):
+        for scanmodel in ["Full", "BlockFull"]:
+            for nmodes in [1, 2]:
+                P = self.set_up_ptycho(scanmodel, nmodes)
+                book = AddressBook()
+                for d in P.diff.storages.values():
+                    self.assert_same_addresses(book, d)
+
+    def test_serialize_incremental(self):
+        P = self.set_up_ptycho()
+        d = list(P.diff.storages.values())[0]
+        views = d.views
+        book = AddressBook()
+
+        # only some views are there on the first call
+        for v in views[::2]:
+            v.active = False
+        self.assert_same_addresses(book, d)
+
+        # the rest arrives later and the object is padded
+        for v in views[::2]:
+            v.active = True
+        ob = P.obj.storages[list(P.obj.storages.keys())[0]]
+        ob.padding = 7
+        P.obj.reformat()
+        self.assert_same_addresses(book, d)
+
+    def test_serialize_swapped_views(self):
+        P = self.set_up_ptycho()
+        d = list(P.diff.storages.values())[0]
+        views = d.views
+        book = AddressBook()
+        views[-1].active = False
+        self.assert_same_addresses(book, d)
+
+        # as many views as before, but not the same ones
+        views[0].active = False
+        views[-1].active = True
+        self.assert_same_addresses(book, d)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -167,5 +167,35 @@ class MLSerialTest(unittest.TestCase):
                                            scanmodel="BlockFull", autosave=False, verbose_level="critical"))
         self.check_engine_output(out, plotting=False, debug=False)
 
+    def test_ML_serial_poisson(self):
+        out = []
+        for eng in ["ML", "ML_serial"]:
+            engine_params = u.Param()
+            engine_params.name = eng
+            engine_params.ML_type = "Poisson"
+            engine_params.numiter = 100
+            engine_params.floating_intensities = False
+            engine_params.reg_del2 = True
+            engine_params.reg_del2_amplitude = 1.
+            engine_params.scale_precond = False
+            out.append(tu.EngineTestRunner(engine_params, output_path=self.outpath, init_correct_probe=True,
+                                           scanmodel="BlockFull", autosave=False, verbose_level="critical"))
+        self.check_engine_output(out, plotting=False, debug=False)
+
+    def test_ML_serial_euclid(self):
+        out = []
+        for eng in ["ML", "ML_serial"]:
+            engine_params = u.Param()
+            engine_params.name = eng
+            engine_params.ML_type = "Euclid"
+            engine_params.numiter = 100
+            engine_params.floating_intensities = False
+            engine_params.reg_del2 = True
+            engine_params.reg_del2_amplitude = 1.
+            engine_params.scale_precond = False
+            out.append(tu.EngineTestRunner(engine_params, output_path=self.outpath, init_correct_probe=True,
+                                           scanmodel="BlockFull", autosave=False, verbose_level="critical"))
+        self.check_engine_output(out, plotting=False, debug=False)
+
 if __name__ == "__main__":
     unittest.main()
@@ -441,6 +441,37 @@ class FourierUpdateKernelTest(unittest.TestCase):
 
         np.testing.assert_array_equal(f, expected_f, err_msg="the f array from the fmag_all_update kernesl isnot behaving as expected.")
 
+    def test_fmag_all_update_chunked(self):
+        '''
+        setup
+        '''
+        N = 7  # number of frames, not a multiple of the chunk size
+        nmodes = 2
+        rng = np.random.default_rng(1234)
+        f = (rng.random((N * nmodes, 8, 8)) + 1j * rng.random((N * nmodes, 8, 8))).astype(COMPLEX_TYPE)
+        fmag = rng.random((N, 8, 8)).astype(FLOAT_TYPE)
+        mask = (rng.random((N, 8, 8)) > 0.2).astype(FLOAT_TYPE)
+        mask_sum = mask.sum(-1).sum(-1)
+
+        '''
+        test
+        '''
+        out = []
+        for chunk_size in [None, 3]:
+            aux = f.copy()
+            err_fmag = np.zeros(N, dtype=FLOAT_TYPE)
+            FUK = FourierUpdateKernel(aux, nmodes=nmodes, chunk_size=chunk_size)
+            FUK.allocate()
+            FUK.fourier_error(aux, None, fmag, mask, mask_sum)
+            FUK.error_reduce(None, err_fmag)
+            FUK.fmag_all_update(aux, None, fmag, mask, err_fmag, pbound=0.1)
+            out.append((aux, err_fmag))
+
+        np.testing.assert_array_equal(out[0][1], out[1][1],
+                                      err_msg="The chunked fourier error differs from the unchunked one.")
+        np.testing.assert_array_equal(out[0][0], out[1][0],
+                                      err_msg="The chunked fmag_all_update differs from the unchunked one.")
+
     # TODO: This test needs to be redesigne to NOT use components from the archive test
     @unittest.skip('This test needs to be redone')
     def test_log_likelihood(self):
@@ -0,0 +1,78 @@
+'''
+Tests for the domain logic of the halo exchange in the serial engines
+'''
+
+import unittest
+import numpy as np
+from ptypy.accelerate.base.engines.projectional_serial import addressed_box, union_box, \
+    largest_halo, cover_weights, owner_map
+
+
+class HaloExchangeTest(unittest.TestCase):
+
+    shape = (25, 30)
+    domains = [(0, 10, 0, 12), (6, 20, 4, 16), (15, 25, 0, 30), (0, 0, 0, 0)]
+
+    def test_addressed_box(self):
+        # 3 views with 2 modes, object address in row 1
+        addr = np.zeros((3, 2, 5, 3), dtype=np.int32)
+        addr[:, :, 1, 1:] = [[[4, 7]], [[9, 2]], [[6, 11]]]
+        self.assertEqual(addressed_box(addr, (8, 6)), (4, 17, 2, 17))
+        self.assertEqual(addressed_box(addr, (8, 6), margin=2), (2, 19, 0, 19))
+
+    def test_union_box(self):
+        boxes = [(4, 17, 2, 17), (-3, 12, 10, 40)]
+        self.assertEqual(union_box(boxes, self.shape), (0, 17, 2, 30))
+        self.assertEqual(union_box(boxes[:1], self.shape), (4, 17, 2, 17))
+        self.assertEqual(union_box([], self.shape), (0, 0, 0, 0))
+
+    def test_largest_halo(self):
+        # rank 1 overlaps with rank 0 on 4x8 and with rank 2 on 5x12 pixels
+        self.assertEqual(largest_halo(self.domains), 4 * 8 + 5 * 12)
+        self.assertEqual(largest_halo([(0, 10, 0, 10), (10, 20, 0, 10)]), 0)
+        self.assertEqual(largest_halo([(0, 10, 0, 10)] * 3), 200)
+
+    def test_cover_weights(self):
+        weights = cover_weights(self.domains, self.shape)
+        size = len(self.domains)
+        total = np.zeros(self.shape)
+        covered = np.zeros(self.shape, dtype=bool)
+        for r0, r1, c0, c1 in self.domains:
+            total[r0:r1, c0:c1] += weights[r0:r1, c0:c1]
+            covered[r0:r1, c0:c1] = True
+        # the halo sum counts the inertia as often as a full allreduce
+        np.testing.assert_allclose(total[covered], size)
+        np.testing.assert_allclose(weights[~covered], size)
+
+    def test_owner_map(self):
+        owner = owner_map(self.domains, self.shape)
+        for row in range(self.shape[0]):
+            for col in range(self.shape[1]):
+                ranks = [n for n, (r0, r1, c0, c1) in enumerate(self.domains)
+                         if r0 <= row < r1 and c0 <= col < c1]
+                self.assertEqual(owner[row, col], min(ranks, default=0))
+
+        # boxes follow a shifted object origin
+        shifted = owner_map(self.domains, (27, 33), offset=(2, 3))
+        np.testing.assert_array_equal(shifted[2:, 3:], owner)
+        self.assertTrue(np.all(shifted[:2] == 0) and np.all(shifted[:, :3] == 0))
+
+    def test_assemble(self):
+        # each rank is up to date inside its own box only
+        rng = np.random.default_rng(0)
+        full = rng.random(self.shape)
+        owner = owner_map(self.domains, self.shape)
+        obs = []
+        for n, (r0, r1, c0, c1) in enumerate(self.domains):
+            ob = rng.random(self.shape)
+            ob[r0:r1, c0:c1] = full[r0:r1, c0:c1]
+            if n == 0:
+                # rank 0 also owns the pixels outside all boxes
+                ob[owner == 0] = full[owner == 0]
+            obs.append(ob)
+        assembled = np.sum([ob * (owner == n) for n, ob in enumerate(obs)], axis=0)
+        np.testing.assert_array_equal(assembled, full)
+
+
+if __name__ == '__main__':
+    unittest.main()
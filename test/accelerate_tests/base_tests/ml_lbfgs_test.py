@@ -0,0 +1,65 @@
+'''
+Tests for the L-BFGS optimizer of the ML_serial engine
+'''
+
+import unittest
+import numpy as np
+from ptypy import utils as u
+import ptypy
+ptypy.load_gpu_engines("serial")
+from test import utils as tu
+
+
+class MLSerialLBFGSTest(unittest.TestCase):
+
+    def set_up_ptycho(self, smooth_gradient_method):
+        engine_params = u.Param()
+        engine_params.name = "ML_serial"
+        engine_params.numiter = 10
+        engine_params.optimizer = "lbfgs"
+        engine_params.lbfgs_memory = 3
+        engine_params.reg_del2 = True
+        engine_params.reg_del2_amplitude = 0.01
+        engine_params.smooth_gradient = 1.0
+        engine_params.smooth_gradient_method = smooth_gradient_method
+        np.random.seed(0)
+        return tu.EngineTestRunner(engine_params, autosave=False, scanmodel="BlockFull", verbose_level="critical",
+                                   num_frames=50, shape=32, run=False)
+
+    def test_lbfgs_smoothed(self):
+        for method in ["convolution", "fft"]:
+            P = self.set_up_ptycho(method)
+            engine = P.engines["engine00"]
+            begin_update = engine._lbfgs_begin_update
+            direction = engine._lbfgs_direction
+            history = []
+            slopes = []
+
+            def checked_begin_update():
+                if engine.curiter == 6:
+                    # pretend the last line search went uphill
+                    engine.tmin = engine.ptycho.FType(-1.)
+                begin_update()
+                history.append(len(engine.lbfgs_history))
+
+            def checked_direction():
+                direction()
+                self.assertLessEqual(len(engine.lbfgs_history), 3)
+                slopes.append(engine._lbfgs_dot(engine.ob_grad, engine.pr_grad, engine.ob_h, engine.pr_h))
+
+            engine._lbfgs_begin_update = checked_begin_update
+            engine._lbfgs_direction = checked_direction
+            P.run()
+
+            # curvature pairs are collected, and dropped after an uphill step
+            self.assertGreater(history[5], 0, msg=method)
+            self.assertEqual(history[6], 0, msg=method)
+            # every direction goes downhill and the likelihood decreases
+            self.assertEqual(len(slopes), 10)
+            self.assertTrue(all(s < 0 for s in slopes), msg="%s: %s" % (method, slopes))
+            LL = [info["error"][1] for info in P.runtime.iter_info]
+            self.assertLess(LL[-1], 0.1 * LL[0], msg=method)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+'''
+Tests for the wave cache of the ML engines
+'''
+
+import unittest
+import numpy as np
+from ptypy import utils as u
+import ptypy
+ptypy.load_gpu_engines("serial")
+from test import utils as tu
+
+
+class MLWaveCacheTest(unittest.TestCase):
+
+    def set_up_ptycho(self, name, wave_cache, ML_type):
+        engine_params = u.Param()
+        engine_params.name = name
+        engine_params.numiter = 5
+        engine_params.ML_type = ML_type
+        engine_params.reg_del2 = True
+        engine_params.wave_cache = wave_cache
+        scan = u.Param()
+        scan.coherence = u.Param(num_probe_modes=2)
+        scan.illumination = u.Param(diversity=u.Param(noise=(0.5, 1.0), power=0.1))
+        np.random.seed(0)
+        P = tu.EngineTestRunner(engine_params, autosave=False, scanmodel="BlockFull", verbose_level="critical",
+                                num_frames=50, shape=32, frames_per_block=10, scan=scan, run=False)
+        waves = self.count_waves(P.engines["engine00"])
+        P.run()
+        return P, waves
+
+    @staticmethod
+    def count_waves(engine):
+        """
+        Record the number of waves kept after each gradient and the
+        number of them reused by the line search.
+        """
+        waves = {'kept': [], 'reused': 0}
+        initialize = engine.engine_initialize
+
+        def engine_initialize():
+            initialize()
+            model = engine.ML_model
+            new_grad = model.new_grad
+            cached_wave = model._cached_wave
+
+            def counted_new_grad():
+                error = new_grad()
+                waves['kept'].append(len(model.wave_cache))
+                return error
+
+            def counted_cached_wave(key):
+                f = cached_wave(key)
+                waves['reused'] += f is not None
+                return f
+
+            model.new_grad = counted_new_grad
+            model._cached_wave = counted_cached_wave
+
+        engine.engine_initialize = engine_initialize
+        return waves
+
+    def test_same_result(self):
+        # A budget for all waves and one for only a part of them
+        for name in ["ML", "ML_serial"]:
+            for ML_type in ["gaussian", "poisson", "euclid"]:
+                P0, waves0 = self.set_up_ptycho(name, 0., ML_type)
+                self.assertEqual(waves0['reused'], 0)
+                kept = {}
+                for budget in [100., 0.4]:
+                    P1, waves1 = self.set_up_ptycho(name, budget, ML_type)
+                    for c in ["obj", "probe"]:
+                        np.testing.assert_array_equal(getattr(P0, c).S["SMFG00"].data, getattr(P1, c).S["SMFG00"].data,
+                                                      err_msg="%s %s with a wave cache of %s MB differs" % (name, ML_type, budget))
+                    # every kept wave is reused by the following line search
+                    self.assertEqual(len(waves1['kept']), 5)
+                    self.assertEqual(waves1['reused'], sum(waves1['kept']))
+                    kept[budget] = waves1['kept'][0]
+                self.assertGreater(kept[0.4], 0, msg="%s %s" % (name, ML_type))
+                self.assertGreater(kept[100.], kept[0.4], msg="%s %s" % (name, ML_type))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,7 @@
 
 import unittest
 import numpy as np
-from ptypy.accelerate.base.kernels import PoUpdateKernel
+from ptypy.accelerate.base.kernels import PoUpdateKernel, VectorizedPoUpdateKernel
 
 COMPLEX_TYPE = np.complex64
 FLOAT_TYPE = np.float32
@@ -14,6 +14,8 @@ INT_TYPE = np.int32
 
 class PoUpdateKernelTest(unittest.TestCase):
 
+    KERNEL = PoUpdateKernel
+
     def setUp(self):
         import sys
         np.set_printoptions(threshold=sys.maxsize, linewidth=np.inf)
@@ -22,7 +24,7 @@ class PoUpdateKernelTest(unittest.TestCase):
         np.set_printoptions()
 
     def test_init(self):
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
 
         np.testing.assert_equal(POUK.kernels,
                                 ['pr_update', 'ob_update'],
@@ -95,7 +97,7 @@ class PoUpdateKernelTest(unittest.TestCase):
         addr, object_array, object_array_denominator, probe, exit_wave, probe_denominator = self.prepare_arrays()
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # doesn't do anything but is the call signature
         POUK.ob_update(addr, object_array, object_array_denominator, probe, exit_wave)
 
@@ -152,7 +154,7 @@ class PoUpdateKernelTest(unittest.TestCase):
         addr, object_array, object_array_denominator, probe, exit_wave, probe_denominator = self.prepare_arrays()
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # this doesn't do anything, but is the call pattern.
         POUK.pr_update(addr, probe, probe_denominator, object_array, exit_wave)
 
@@ -192,7 +194,7 @@ class PoUpdateKernelTest(unittest.TestCase):
         addr, object_array, object_array_denominator, probe, exit_wave, probe_denominator = self.prepare_arrays()
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # this doesn't do anything, but is the call pattern.
         POUK.pr_update_ML(addr, probe, object_array, exit_wave)
 
@@ -217,7 +219,7 @@ class PoUpdateKernelTest(unittest.TestCase):
         addr, object_array, object_array_denominator, probe, exit_wave, probe_denominator = self.prepare_arrays()
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # this doesn't do anything, but is the call pattern.
         POUK.ob_update_ML(addr, object_array, probe, exit_wave)
 
@@ -300,7 +302,7 @@ class PoUpdateKernelTest(unittest.TestCase):
             position_idx += 1
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # this doesn't do anything, but is the call pattern.
         POUK.ob_norm_local(addr, object_array, object_norm)
         POUK.pr_update_local(addr, probe, object_array, exit_wave, auxiliary_wave, object_norm, object_norm.max())
@@ -371,7 +373,7 @@ class PoUpdateKernelTest(unittest.TestCase):
             position_idx += 1
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # this doesn't do anything, but is the call pattern.
         POUK.pr_norm_local(addr, probe, probe_norm)
         POUK.ob_update_local(addr, object_array, probe, exit_wave, auxiliary_wave, probe_norm)
@@ -434,7 +436,7 @@ class PoUpdateKernelTest(unittest.TestCase):
             position_idx += 1
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # this doesn't do anything, but is the call pattern.
         POUK.pr_norm_local(addr, probe, probe_norm)
 
@@ -495,7 +497,7 @@ class PoUpdateKernelTest(unittest.TestCase):
             position_idx += 1
 
         # test
-        POUK = PoUpdateKernel()
+        POUK = self.KERNEL()
         POUK.allocate()  # this doesn't do anything, but is the call pattern.
         POUK.ob_norm_local(addr, object_array, object_norm)
 
@@ -508,5 +510,14 @@ class PoUpdateKernelTest(unittest.TestCase):
         np.testing.assert_array_equal(object_norm, expected_object_norm,
                                       err_msg="The object norm has not been updated as expected")
 
+
+class VectorizedPoUpdateKernelTest(PoUpdateKernelTest):
+    """
+    Runs the same checks against the scatter-add implementation.
+    """
+
+    KERNEL = VectorizedPoUpdateKernel
+
+
 if __name__ == '__main__':
     unittest.main()
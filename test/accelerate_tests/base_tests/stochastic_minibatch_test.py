@@ -0,0 +1,93 @@
+'''
+Tests for the mini-batch mode of the serial stochastic engines
+'''
+
+import unittest
+import numpy as np
+from ptypy import utils as u
+import ptypy
+ptypy.load_gpu_engines("serial")
+from test import utils as tu
+
+
+class FixedOrder(object):
+    """ Replaces the view shuffling with a given order """
+    def __init__(self, order):
+        self.order = order
+
+    def shuffle(self, x):
+        x[:] = self.order
+
+
+class StochasticMinibatchTest(unittest.TestCase):
+
+    def set_up_ptycho(self, name, minibatch_size, probe_update_start=0, threads=1):
+        engine_params = u.Param()
+        engine_params.name = name
+        engine_params.numiter = 1
+        engine_params.minibatch_size = minibatch_size
+        engine_params.threads = threads
+        engine_params.probe_update_start = probe_update_start
+        np.random.seed(0)
+        return tu.EngineTestRunner(engine_params, autosave=False, scanmodel="BlockFull", verbose_level="critical",
+                                   num_frames=100, shape=32, run=False)
+
+    def test_disjoint_sets(self):
+        P = self.set_up_ptycho("EPIE_serial", 6)
+        eng = P.engines["engine00"]
+        P.run()
+        for prep in eng.diff_info.values():
+            rows, cols = prep.mag.shape[-2:]
+            sets = eng._minibatches(prep)
+            order = np.concatenate(sets)
+            self.assertEqual(sorted(order), list(range(prep.addr.shape[0])))
+            for views in sets:
+                self.assertLessEqual(len(views), 6)
+                pos = prep.addr[views, 0, 1, 1:]
+                dy = np.abs(pos[:, None, 0] - pos[None, :, 0])
+                dx = np.abs(pos[:, None, 1] - pos[None, :, 1])
+                overlap = (dy < rows) & (dx < cols)
+                np.testing.assert_array_equal(overlap, np.eye(len(views), dtype=bool))
+
+    def compare_to_sequential(self, name, **kwargs):
+        # With a fixed probe, updating the sets of non-overlapping views
+        # together equals a sequential pass over the views in the order
+        # of the sets
+        P1 = self.set_up_ptycho(name, probe_update_start=10, **kwargs)
+        eng = P1.engines["engine00"]
+        orders = {}
+        minibatches = eng._minibatches
+
+        def record(prep):
+            sets = minibatches(prep)
+            orders[prep.label] = np.concatenate(sets)
+            return sets
+        eng._minibatches = record
+        P1.run()
+
+        P2 = self.set_up_ptycho(name, 1, probe_update_start=10)
+        eng = P2.engines["engine00"]
+        engine_prepare = eng.engine_prepare
+
+        def prepare():
+            engine_prepare()
+            for prep in eng.diff_info.values():
+                prep.rng = FixedOrder(orders[prep.label])
+        eng.engine_prepare = prepare
+        P2.run()
+
+        np.testing.assert_allclose(P1.obj.S["SMFG00"].data, P2.obj.S["SMFG00"].data, rtol=1e-5, atol=1e-6,
+                                   err_msg="%s update of %s differs from the sequential one" % (name, kwargs))
+
+    def test_sequential_object_update(self):
+        for name in ["EPIE_serial", "SDR_serial"]:
+            self.compare_to_sequential(name, minibatch_size=8)
+
+    def test_threaded_object_update(self):
+        for name in ["EPIE_serial", "SDR_serial"]:
+            self.compare_to_sequential(name, minibatch_size=1, threads=3)
+            self.compare_to_sequential(name, minibatch_size=4, threads=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
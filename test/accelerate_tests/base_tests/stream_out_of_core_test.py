@@ -0,0 +1,65 @@
+'''
+Tests for the out-of-core mode of DM_serial_stream
+'''
+
+import unittest
+import tempfile
+import tracemalloc
+import shutil
+import numpy as np
+from ptypy import utils as u
+from test import utils as tu
+import ptypy
+ptypy.load_gpu_engines("serial")
+
+
+class StreamOutOfCoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp("StreamOutOfCoreTest")
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def run_engine(self, out_of_core=None, num_frames=100, density=0.2, **kwargs):
+        engine_params = u.Param()
+        engine_params.name = "DM_serial_stream"
+        engine_params.numiter = 5
+        engine_params.update(kwargs)
+        # The probe photons would otherwise be taken from the first block only
+        scan = u.Param(out_of_core=out_of_core, illumination=u.Param(photons=1e8),
+                       data=u.Param(density=density))
+        np.random.seed(0)
+        return tu.EngineTestRunner(engine_params, autosave=False, scanmodel="BlockFull",
+                                   verbose_level="critical", num_frames=num_frames,
+                                   frames_per_block=20, scan=scan)
+
+    def test_out_of_core(self):
+        P1 = self.run_engine()
+        for read_ahead in [0, 2]:
+            P2 = self.run_engine(out_of_core=self.outdir, read_ahead=read_ahead)
+            eng = P2.engines["engine00"]
+            self.assertEqual(len(eng._mapped), 5)
+            for dID, prep in eng.diff_info.items():
+                arrays = [P2.diff.S[dID].data, P2.mask.S[dID].data, P2.exit.S[prep.poe_IDs[2]].data,
+                          prep.mag, prep.ma]
+                for a in arrays:
+                    self.assertIsNotNone(u.mmap_of(a))
+            np.testing.assert_array_equal(P1.obj.S["SMFG00"].data, P2.obj.S["SMFG00"].data)
+            np.testing.assert_array_equal(P1.probe.S["SMFG00"].data, P2.probe.S["SMFG00"].data)
+
+    def test_peak_memory(self):
+        # tracemalloc only sees the arrays that are held in memory
+        tracemalloc.start()
+        try:
+            P = self.run_engine(out_of_core=self.outdir, num_frames=400, density=0.05)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        full = sum(s.data.nbytes for c in (P.diff, P.mask, P.exit) for s in c.S.values())
+        self.assertGreater(len(P.diff.S), 10)
+        self.assertLess(peak, full)
+
+
+if __name__ == '__main__':
+    unittest.main()
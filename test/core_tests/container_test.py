@@ -4,6 +4,7 @@ A test for the Container class
 
 import unittest
 from ptypy.core import Container, Storage, View, Base
+from ptypy.utils import parallel
 import numpy as np
 
 class ContainerTest(unittest.TestCase):
@@ -48,5 +49,15 @@ class ContainerTest(unittest.TestCase):
         assert np.all(
             C5.storages['S0'].data == 2)
 
+    def test_container_iallreduce(self):
+        C = Container(data_type='real')
+        C.new_storage(ID='S0', shape=(1, 5, 5), fill=2.)
+        C.new_storage(ID='S1', shape=(1, 3, 3), fill=3.)
+        requests = C.iallreduce()
+        assert len(requests) == 2
+        parallel.waitall(requests)
+        assert np.allclose(C.storages['S0'].data, 2. * parallel.size)
+        assert np.allclose(C.storages['S1'].data, 3. * parallel.size)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
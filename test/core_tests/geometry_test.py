@@ -104,7 +104,69 @@ class GeometryTest(unittest.TestCase):
         G = self.set_up_farfield()
         P = BasicFarfieldPropagator(G.p,ffttype="scipy")
         self. _basic_propagator_test(P)
-    
+
+    def test_basic_nearfield_propagator_planned(self):
+        G = self.set_up_nearfield()
+        P = BasicNearfieldPropagator(G.p,ffttype="planned")
+        self. _basic_propagator_test(P)
+
+    def test_basic_farfield_propagator_planned(self):
+        G = self.set_up_farfield()
+        P = BasicFarfieldPropagator(G.p,ffttype="planned")
+        self. _basic_propagator_test(P)
+
+    def test_planned_fft_batched_out(self):
+        G = self.set_up_farfield()
+        P = BasicFarfieldPropagator(G.p, ffttype="planned", fft_workers=2)
+        S = (4, 64, 64)
+        A = (np.random.random(S) + 1j * np.random.random(S)).astype(np.complex64)
+        out = np.empty_like(A)
+
+        B = P.fft(A, out=out)
+        assert B is out, "planned FFT did not write into the output buffer"
+        assert B.dtype == np.complex64, "planned FFT changed the dtype"
+        np.testing.assert_allclose(B, np.fft.fft2(A), rtol=1e-4, atol=1e-3)
+
+        # transform in place and check the plan is reused
+        C = A.copy()
+        P.ifft(P.fft(C, out=C), out=C)
+        np.testing.assert_allclose(C, A, rtol=1e-5, atol=1e-5)
+        assert len(P.FFTch._plans) == 2, "planned FFT did not reuse its plans"
+
+    def _inplace_propagator_test(self, prop):
+        S = (3, 256, 256)
+        A = (np.random.random(S) + 1j * np.random.random(S)).astype(np.complex64)
+        for fw, fw_inplace in [(prop.fw, prop.fw_inplace), (prop.bw, prop.bw_inplace)]:
+            B = A.copy()
+            C = fw_inplace(B)
+            assert C is B, "in-place propagation did not return its input"
+            np.testing.assert_allclose(B, fw(A), rtol=1e-4, atol=1e-4)
+
+    def test_inplace_propagators(self):
+        for ffttype in ["scipy", "planned"]:
+            G = self.set_up_farfield()
+            self._inplace_propagator_test(BasicFarfieldPropagator(G.p, ffttype=ffttype, dtype=np.complex64))
+            G = self.set_up_nearfield()
+            self._inplace_propagator_test(BasicNearfieldPropagator(G.p, ffttype=ffttype, dtype=np.complex64))
+
+    def test_inplace_plans(self):
+        G = self.set_up_farfield()
+        P = BasicFarfieldPropagator(G.p, ffttype="planned", dtype=np.complex64)
+        A = np.ones((2, 256, 256), dtype=np.complex64)
+        P.fw_inplace(A)
+        P.bw_inplace(A)
+        plans = list(P.FFTch._plans.values())
+        assert len(plans) == 2 and all(plan.inplace for plan in plans), \
+            "in-place propagation did not use in-place plans"
+
+    def test_zero_fft_workers(self):
+        for ffttype in ["scipy", "planned"]:
+            G = self.set_up_farfield()
+            with self.assertRaises(ValueError):
+                BasicFarfieldPropagator(G.p, ffttype=ffttype, fft_workers=0)
+        with self.assertRaises(ValueError):
+            geometry.FFTPlan((8, 8), np.complex64, workers=0)
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,62 @@
+'''
+Tests for the data statistics of the scan models
+'''
+
+import unittest
+import numpy as np
+from ptypy import utils as u
+from test import utils as tu
+
+
+class ScanModelStatsTest(unittest.TestCase):
+
+    def set_up_scan(self, model):
+        scan = u.Param(data=u.Param(min_frames=7, add_poisson_noise=True))
+        np.random.seed(0)
+        P = tu.EngineTestRunner(None, autosave=False, scanmodel=model, verbose_level="critical",
+                                num_frames=40, shape=32, frames_per_block=7, scan=scan, level=2)
+        P.model.new_data()
+        return P, P.model.scans['MF']
+
+    def assert_stats(self, scan):
+        # Statistics of all active frames, computed in one go
+        views = [(m, d) for m, d in zip(scan.mask_views, scan.diff_views) if d.active]
+        frames = np.array([m.data * d.data for m, d in views])
+        norm = np.sum([m.data for m, d in views], axis=0)
+        Itotal = frames.sum(axis=(1, 2))
+        npix = np.prod(scan.diff_shape)
+        np.testing.assert_allclose(scan.diff.tot_power, Itotal.sum(), rtol=1e-6)
+        self.assertEqual(scan.diff.max_power, Itotal.max())
+        np.testing.assert_allclose(scan.diff.mean_power, Itotal.sum() / (len(scan.diff_views) * npix), rtol=1e-6)
+        self.assertEqual(scan.diff.pbound_stub, Itotal.max() / npix)
+        np.testing.assert_array_equal(scan.diff.max, np.maximum(frames.max(axis=0), 0))
+        np.testing.assert_array_equal(scan.diff.min, np.minimum(frames.min(axis=0), 0))
+        np.testing.assert_array_equal(scan.diff.norm, norm)
+        np.testing.assert_allclose(scan.diff.mean, frames.sum(axis=0) / (norm + (norm == 0)), rtol=1e-6)
+
+    def check_stats(self, model):
+        P, scan = self.set_up_scan(model)
+        self.assertGreater(len(P.diff.S), 1 if model.startswith('Block') else 0)
+        self.assert_stats(scan)
+
+    def test_stats_scanmodel(self):
+        self.check_stats('Full')
+
+    def test_stats_blockscanmodel(self):
+        self.check_stats('BlockFull')
+
+    def test_stats_deactivated_frames(self):
+        # Frames moved away, e.g. to another process, drop out of the statistics
+        P, scan = self.set_up_scan('Full')
+        Itotal = [np.sum(m.data * d.data) for m, d in zip(scan.mask_views, scan.diff_views)]
+        brightest = int(np.argmax(Itotal))
+        for k in [brightest, 3]:
+            scan.diff_views[k].active = False
+            scan.mask_views[k].active = False
+        scan._update_stats()
+        self.assertLess(scan.diff.max_power, Itotal[brightest])
+        self.assert_stats(scan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -52,6 +52,95 @@ class StorageTest(unittest.TestCase):
         S.reformat()
         assert np.allclose(S[V], 1.)
 
+    def test_storage_update_views(self):
+        """
+        Test that updating all views at once matches updating them one by one
+        """
+        psize = .1
+        C = Container(data_dims=2)
+        S = C.new_storage(psize=psize)
+        rng = np.random.default_rng(0)
+        # enough views to make the record table grow a few times
+        views = [View(container=C, storageID=S.ID, coord=tuple(rng.random(2) * 20.),
+                      shape=(5, 7), psize=psize, layer=k % 4) for k in range(100)]
+        views.append(views[3].copy())
+        views[5].active = False
+        inactive = views[5].dlow.copy(), views[5].dhigh.copy(), views[5].sp.copy()
+        S.origin = S.origin + 0.123
+        S.reformat()
+        assert S.layermap == [0, 1, 2, 3]
+
+        # inactive views are left alone
+        S.update_views()
+        for a, b in zip((views[5].dlow, views[5].dhigh, views[5].sp), inactive):
+            np.testing.assert_array_equal(a, b)
+
+        for V in views[:5] + views[6:]:
+            dlow, dhigh, sp = V.dlow.copy(), V.dhigh.copy(), V.sp.copy()
+            S.update_views(V)
+            np.testing.assert_array_equal(V.dlow, dlow)
+            np.testing.assert_array_equal(V.dhigh, dhigh)
+            np.testing.assert_array_equal(V.sp, sp)
+            assert V.dlayer == S.layermap.index(V.layer)
+            assert S[V].shape == (5, 7)
+
+
+    def test_storage_fill_without_copy(self):
+        """
+        Test that an array of matching dtype becomes the buffer itself
+        """
+        C = Container(data_dims=2, data_type='real')
+        S = C.new_storage(shape=(1, 8, 8))
+        a = np.ones((3, 8, 8), dtype=C.dtype)
+        S.fill(a, copy=False)
+        assert S.data is a
+        assert S.shape == (3, 8, 8)
+        S.fill(a)
+        assert S.data is not a
+        b = np.ones((3, 8, 8), dtype=np.int32)
+        S.fill(b, copy=False)
+        assert S.data.dtype == C.dtype
+
+
+    def test_storage_append_layers(self):
+        """
+        Test that layers added in many small steps are appended to a
+        buffer with spare capacity
+        """
+        C = Container(data_dims=2)
+        S = C.new_storage(shape=(1, 6, 6), fill=3.)
+        buffers = set()
+        for k in range(50):
+            V = View(container=C, storageID=S.ID, coord=(0., 0.), shape=(6, 6), layer=k)
+            S.reformat()
+            S[V] = k
+            buffers.add(id(S._layer_buffer))
+            assert S.data.shape == (k + 1, 6, 6)
+            assert S.layermap == list(range(k + 1))
+            assert S.data.flags.c_contiguous
+        # capacity grows geometrically
+        assert len(buffers) < 10
+        np.testing.assert_array_equal(S.data[:, 0, 0], np.arange(50))
+        assert '_layer_buffer' not in S._to_dict()
+
+    def test_storage_slots(self):
+        """
+        Test the hashed lookup of buffer indices for layers
+        """
+        C = Container(data_dims=2)
+        S = C.new_storage(shape=(4, 6, 6), layermap=[7, 3, 9, 5])
+        assert S.slots(9) == 2
+        np.testing.assert_array_equal(S.slots([5, 7, 3]), [3, 0, 1])
+        S[3] = 1.
+        np.testing.assert_array_equal(S.data[1], 1.)
+        self.assertRaises(ValueError, S.slots, [7, 4])
+        # follows a new layermap
+        S.layermap = [5, 7, 3, 9]
+        np.testing.assert_array_equal(S.slots([5, 7, 3, 9]), np.arange(4))
+        S.layermap.append(11)
+        assert S.slots(11) == 4
+        assert '_slot_cache' not in S._to_dict()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -48,6 +48,21 @@ class MLTest(unittest.TestCase):
         engine_params.probe_update_start = 0
         tu.EngineTestRunner(engine_params, output_path=self.outpath)
 
+    def test_ML_farfield_lbfgs(self):
+        engine_params = u.Param()
+        engine_params.name = 'ML'
+        engine_params.numiter = 5
+        engine_params.optimizer = 'lbfgs'
+        engine_params.lbfgs_memory = 3
+        engine_params.floating_intensities = False
+        engine_params.intensity_renormalization = 1.0
+        engine_params.reg_del2 =True
+        engine_params.reg_del2_amplitude = 0.01
+        engine_params.smooth_gradient = 0.0
+        engine_params.scale_precond =False
+        engine_params.probe_update_start = 0
+        tu.EngineTestRunner(engine_params, output_path=self.outpath)
+
 
     def test_ML_nearfield(self):
         engine_params = u.Param()
@@ -0,0 +1,76 @@
+'''
+Tests that saving in the background writes the same files as saving inline
+'''
+
+import unittest
+import tempfile
+import shutil
+import os
+import numpy as np
+
+from ptypy.core.ptycho import _BackgroundSaver
+from ptypy import io
+import ptypy.utils as u
+from test import utils as tu
+
+
+class BackgroundSaveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outpath = tempfile.mkdtemp(prefix='background_save')
+
+    def tearDown(self):
+        shutil.rmtree(self.outpath)
+
+    def run_and_list_files(self, background):
+        home = self.outpath + os.sep + ('background' if background else 'inline')
+        io_params = u.Param()
+        io_params.rfile = "recons/final.ptyr"
+        io_params.background_save = background
+        io_params.autosave = u.Param(interval=2, rfile="dumps/dump_%(iterations)04d.ptyr")
+        np.random.seed(1)
+        P = tu.EngineTestRunner(u.Param(name='DM', numiter=6), output_path=home, verbose_level="critical",
+                                num_frames=50, shape=32, io=io_params, level=5)
+        files = {}
+        for root, dirs, names in os.walk(home):
+            for name in names:
+                files[name] = os.path.join(root, name)
+        return P, files
+
+    def test_background_save(self):
+        P1, files1 = self.run_and_list_files(background=False)
+        P2, files2 = self.run_and_list_files(background=True)
+        self.assertIsNone(P2._saver)
+        self.assertEqual(sorted(files1), sorted(files2))
+        self.assertIn('final.ptyr', files2)
+        self.assertEqual(len(files2), 4)
+        for name in files1:
+            c1 = io.h5read(files1[name], 'content')['content']
+            c2 = io.h5read(files2[name], 'content')['content']
+            for kind in ['probe', 'obj']:
+                for ID, st in c1[kind].items():
+                    np.testing.assert_array_equal(st['data'], c2[kind][ID]['data'],
+                                                  err_msg='%s of %s differs' % (kind, name))
+        for ID, st in P2.obj.storages.items():
+            c = io.h5read(files2['final.ptyr'], 'content')['content']
+            np.testing.assert_array_equal(c['obj'][ID]['data'], st.data)
+
+    def test_snapshot_buffers(self):
+        saver = _BackgroundSaver()
+        a = np.arange(6.).reshape(2, 3)
+        content = {'S00': {'data': a, 'shape': (2, 3), 'layers': [np.ones(2)]}}
+        snap = saver.snapshot(content)
+        self.assertIsNot(snap['S00']['data'], a)
+        np.testing.assert_array_equal(snap['S00']['data'], a)
+        self.assertEqual(snap['S00']['shape'], (2, 3))
+        a += 1
+        self.assertEqual(snap['S00']['data'][0, 0], 0.)
+        # The next snapshot reuses the buffers
+        buf = snap['S00']['data']
+        snap = saver.snapshot(content)
+        self.assertIs(snap['S00']['data'], buf)
+        np.testing.assert_array_equal(buf, a)
+
+
+if __name__ == '__main__':
+    unittest.main()
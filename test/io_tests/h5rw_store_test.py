@@ -19,11 +19,13 @@ class owntype(object):
 class H5rwStoreTest(unittest.TestCase):
 
     def setUp(self):
+        self.h5options = dict(io.h5options)
         io.h5options['UNSUPPORTED'] = 'fail'
         self.folder = tempfile.mkdtemp(suffix="H5rwTest")
         self.filepath = self.folder +'%s.h5'
 
     def tearDown(self):
+        io.h5options.update(self.h5options)
         shutil.rmtree(self.folder)
 
     def test_store_str(self):
@@ -171,5 +173,48 @@ class H5rwStoreTest(unittest.TestCase):
         except:
             self.fail(msg="This should not have produced an exception!")
 
+    def test_compression_options(self):
+        data = (np.random.rand(3, 40, 50) + 1j).astype(np.complex64)
+        content = {'array': data, 'scalar': 1.0}
+        for compression, opts, shuffle, chunks in [(None, None, False, None),
+                                                   ('lzf', None, True, (1, 0, 0)),
+                                                   ('gzip', 1, True, (2, 16, 100))]:
+            io.h5options['COMPRESSION'] = compression
+            io.h5options['COMPRESSION_OPTS'] = opts
+            io.h5options['SHUFFLE'] = shuffle
+            io.h5options['CHUNKS'] = chunks
+            filename = self.filepath % ("store_compression_%s_test" % compression)
+            io.h5write(filename, content=content)
+            with h5.File(filename, 'r') as f:
+                dset = f['content/array']
+                self.assertEqual(dset.compression, compression)
+                self.assertEqual(dset.compression_opts, opts)
+                self.assertEqual(dset.shuffle, shuffle)
+                if chunks is None:
+                    self.assertIsNone(dset.chunks)
+                else:
+                    self.assertEqual(dset.chunks, tuple(min(c, n) if c > 0 else n
+                                                        for c, n in zip(chunks, data.shape)))
+            out = io.h5read(filename, 'content')['content']
+            np.testing.assert_array_equal(out['array'], data)
+            self.assertEqual(out['scalar'], 1.0)
+
+    def test_unknown_compression(self):
+        io.h5options['COMPRESSION'] = 'zip'
+        with self.assertRaises(ValueError):
+            io.h5write(self.filepath % "store_unknown_compression_test", content={'array': np.ones(3)})
+
+    def test_options_per_call(self):
+        filename = self.filepath % "store_options_test"
+        content = {'Owntype data': owntype(), 'array': np.ones(3)}
+        io.h5write(filename, content=content, options={'UNSUPPORTED': 'ignore'})
+        self.assertEqual(io.h5options['UNSUPPORTED'], 'fail')
+        out = io.h5read(filename, 'content')['content']
+        self.assertNotIn('Owntype data', out)
+        np.testing.assert_array_equal(out['array'], np.ones(3))
+        with self.assertRaises(ValueError):
+            io.h5write(filename, content=content, options={'UNSUPPORTD': 'ignore'})
+
+
 if __name__=='__main__':
     unittest.main()
\ No newline at end of file
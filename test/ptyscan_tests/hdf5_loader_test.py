@@ -6,7 +6,7 @@ import shutil
 import numpy as np
 import ptypy
 from test.utils import PtyscanTestRunner
-from ptypy.experiment.hdf5_loader import Hdf5Loader
+from ptypy.experiment.hdf5_loader import Hdf5Loader, Hdf5LoaderFast
 from ptypy import utils as u
 
 
@@ -509,6 +509,210 @@ class Hdf5LoaderTestNoSWMR(unittest.TestCase):
         data_params.positions.fast_key = self.positions_fast_key
         output = PtyscanTestRunner(Hdf5Loader, data_params, auto_frames=k, cleanup=False)
 
+    def test_crop_load_at_edge_with_padding(self):
+        k = 12
+        frame_size_m = 50
+        frame_size_n = 50
+
+        positions_slow = np.arange(k)
+        positions_fast = np.arange(k)
+
+        with h5.File(self.positions_file, 'w') as f:
+            f[self.positions_slow_key] = positions_slow
+            f[self.positions_fast_key] = positions_fast
+
+        data = np.arange(k*frame_size_m*frame_size_n, dtype=float).reshape((k, frame_size_m, frame_size_n))
+        with h5.File(self.intensity_file, 'w') as f:
+            f[self.intensity_key] = data
+
+        data_params = u.Param()
+        data_params.auto_center = False
+        data_params.padding = (2, 2, 2, 2)
+        data_params.shape = (10, 10)
+        data_params.center = (3, 50)
+        data_params.intensities = u.Param()
+        data_params.intensities.file = self.intensity_file
+        data_params.intensities.key = self.intensity_key
+
+        data_params.positions = u.Param()
+        data_params.positions.file = self.positions_file
+        data_params.positions.slow_key = self.positions_slow_key
+        data_params.positions.fast_key = self.positions_fast_key
+
+        loader = Hdf5Loader(data_params)
+        # only the part of the region of interest on the detector is read
+        self.assertEqual(loader.frame_shape, (6, 7))
+        np.testing.assert_array_equal(loader.roi_pad, [[4, 0], [0, 3]])
+
+        indices = [0, 1, 2, 5, 7, 8]
+        intensities, positions, weights = loader.load(indices)
+        # the padded frame, extended by the part of the region of interest outside of it
+        padded = np.pad(data, ((0, 0), (6, 2), (2, 3)), mode='constant')
+        for ii in indices:
+            np.testing.assert_array_equal(intensities[ii], padded[ii, 2:12, 45:55])
+            self.assertEqual(weights[ii].shape, (10, 10))
+            self.assertFalse(weights[ii][:4].any())
+            self.assertFalse(weights[ii][:, 7:].any())
+
+    def test_crop_load_auto_center(self):
+        k = 12
+        frame_size_m = 50
+        frame_size_n = 50
+
+        positions_slow = np.arange(k)
+        positions_fast = np.arange(k)
+
+        with h5.File(self.positions_file, 'w') as f:
+            f[self.positions_slow_key] = positions_slow
+            f[self.positions_fast_key] = positions_fast
+
+        data = np.zeros((k, frame_size_m, frame_size_n))
+        data[:, 14:17, 30:33] = 1.
+        with h5.File(self.intensity_file, 'w') as f:
+            f[self.intensity_key] = data
+
+        data_params = u.Param()
+        data_params.auto_center = True
+        data_params.shape = (8, 8)
+        data_params.intensities = u.Param()
+        data_params.intensities.file = self.intensity_file
+        data_params.intensities.key = self.intensity_key
+
+        data_params.positions = u.Param()
+        data_params.positions.file = self.positions_file
+        data_params.positions.slow_key = self.positions_slow_key
+        data_params.positions.fast_key = self.positions_fast_key
+
+        loader = Hdf5Loader(data_params)
+        self.assertEqual(loader.frame_slices, (slice(11, 19, 1), slice(27, 35, 1)))
+        self.assertFalse(loader.info.auto_center)
+        intensities, positions, weights = loader.load(list(range(k)))
+        for ii in range(k):
+            np.testing.assert_array_equal(intensities[ii], data[ii, 11:19, 27:35])
+
+    def test_crop_load_auto_center_without_mask(self):
+        k = 12
+        frame_size_m = 50
+        frame_size_n = 50
+
+        positions_slow = np.arange(k)
+        positions_fast = np.arange(k)
+
+        with h5.File(self.positions_file, 'w') as f:
+            f[self.positions_slow_key] = positions_slow
+            f[self.positions_fast_key] = positions_fast
+
+        data_params = u.Param()
+        data_params.auto_center = True
+        data_params.shape = (8, 8)
+        data_params.intensities = u.Param()
+        data_params.intensities.file = self.intensity_file
+        data_params.intensities.key = self.intensity_key
+        # no mask is given, inverting it has no effect
+        data_params.mask = u.Param()
+        data_params.mask.invert = True
+
+        data_params.positions = u.Param()
+        data_params.positions.file = self.positions_file
+        data_params.positions.slow_key = self.positions_slow_key
+        data_params.positions.fast_key = self.positions_fast_key
+
+        data = np.zeros((k, frame_size_m, frame_size_n))
+        data[:, 14:17, 30:33] = 1.
+        with h5.File(self.intensity_file, 'w') as f:
+            f[self.intensity_key] = data
+        loader = Hdf5Loader(data_params.copy(99))
+        self.assertEqual(loader.frame_slices, (slice(11, 19, 1), slice(27, 35, 1)))
+
+        # without any intensity, the frame center is used
+        empty_file = os.path.join(self.outdir, 'empty_intensity.h5')
+        with h5.File(empty_file, 'w') as f:
+            f[self.intensity_key] = np.zeros((k, frame_size_m, frame_size_n))
+        data_params.intensities.file = empty_file
+        loader = Hdf5Loader(data_params.copy(99))
+        self.assertEqual(loader.frame_slices, (slice(21, 29, 1), slice(21, 29, 1)))
+
+    def test_block_corrections(self):
+        '''
+        Corrects the frames of a chunk together, in both loaders
+        '''
+        k = 12
+        frame_size_m = 20
+        frame_size_n = 20
+
+        positions_slow = np.arange(k)
+        positions_fast = np.arange(k)
+
+        with h5.File(self.positions_file, 'w') as f:
+            f[self.positions_slow_key] = positions_slow
+            f[self.positions_fast_key] = positions_fast
+
+        rng = np.random.default_rng(0)
+        data = rng.uniform(0, 100, (k, frame_size_m, frame_size_n))
+        with h5.File(self.intensity_file, 'w') as f:
+            f[self.intensity_key] = data
+
+        darkfield = rng.uniform(0, 20, (frame_size_m, frame_size_n))
+        with h5.File(self.dark_file, 'w') as f:
+            f[self.dark_key] = darkfield
+
+        flatfield = rng.uniform(0.5, 1.5, data.shape)
+        with h5.File(self.flat_file, 'w') as f:
+            f[self.flat_key] = flatfield
+
+        normalisation = np.ones(k)
+        normalisation[3] = 1.2
+        normalisation[7] = 0.9
+        with h5.File(self.normalisation_file, 'w') as f:
+            f[self.normalisation_key] = normalisation
+
+        mask = rng.integers(0, 2, data.shape)
+        with h5.File(self.mask_file, 'w') as f:
+            f[self.mask_key] = mask
+
+        data_params = u.Param()
+        data_params.auto_center = False
+        data_params.padding = (1, 0, 0, 2)
+        data_params.intensities = u.Param()
+        data_params.intensities.file = self.intensity_file
+        data_params.intensities.key = self.intensity_key
+        data_params.darkfield = u.Param()
+        data_params.darkfield.file = self.dark_file
+        data_params.darkfield.key = self.dark_key
+        data_params.flatfield = u.Param()
+        data_params.flatfield.file = self.flat_file
+        data_params.flatfield.key = self.flat_key
+        data_params.normalisation = u.Param()
+        data_params.normalisation.file = self.normalisation_file
+        data_params.normalisation.key = self.normalisation_key
+        data_params.normalisation.sigma = 3
+        data_params.mask = u.Param()
+        data_params.mask.file = self.mask_file
+        data_params.mask.key = self.mask_key
+        data_params.mask.invert = True
+        data_params.positions = u.Param()
+        data_params.positions.file = self.positions_file
+        data_params.positions.slow_key = self.positions_slow_key
+        data_params.positions.fast_key = self.positions_fast_key
+
+        scale = np.ones(k)
+        valid = np.abs(normalisation - normalisation.mean()) < 3 * normalisation.std()
+        scale[valid] = normalisation[valid] / normalisation.mean()
+        corrected = np.clip(data - darkfield, 0, None) / flatfield / scale[:, None, None]
+        corrected = np.pad(corrected, ((0, 0), (1, 0), (0, 2)), mode='constant')
+        weights = np.pad(1 - mask, ((0, 0), (1, 0), (0, 2)), mode='constant')
+
+        indices = [9, 2, 3, 4, 11, 0, 1]
+        for loader_class in [Hdf5Loader, Hdf5LoaderFast]:
+            loader = loader_class(data_params)
+            out_intensities, out_positions, out_weights = loader.load(indices)
+            self.assertEqual(sorted(out_intensities), sorted(indices))
+            for ii in indices:
+                np.testing.assert_allclose(out_intensities[ii], corrected[ii], rtol=1e-12,
+                                           err_msg="Frame %d of %s is not corrected" % (ii, loader_class.__name__))
+                np.testing.assert_array_equal(out_weights[ii], weights[ii])
+            loader._finalize()
+
     def test_position_data_mapping_case_2(self):
         '''
         axis_data.shape (k,) for data.shape (k, frame_size_m, frame_size_n)
@@ -77,6 +77,130 @@ class PtyscanTest(unittest.TestCase):
         d = io.h5read(out['output_file'])
 
 
+    def test_prefetch(self):
+        '''
+        prefetched packages equal the synchronously loaded ones
+        '''
+        from ptypy.core.data import EOS, WAIT
+        import numpy as np
+        pars = DATA.copy()
+        pars.add_poisson_noise = False
+        np.random.seed(0)
+        out = tu.PtyscanTestRunner(MoonFlowerScan, data_params=pars, save_type=None, auto_frames=20, ncalls=3)
+        pars.prefetch = 2
+        np.random.seed(0)
+        a = MoonFlowerScan(pars)
+        a.initialize()
+        msgs = []
+        while not msgs or msgs[-1] != EOS:
+            msg = a.auto(20)
+            if msg != WAIT:
+                msgs.append(msg)
+        self.assertTrue(a.end_of_scan)
+        self.assertFalse(a._prefetcher.thread.is_alive())
+        self.assertEqual(len(msgs), 4)
+        for ref, msg in zip(out['msgs'], msgs[:3]):
+            self.assertEqual(ref['chunk'].indices, msg['chunk'].indices)
+            for fr, f in zip(ref['iterable'], msg['iterable']):
+                np.testing.assert_array_equal(fr['data'], f['data'])
+                np.testing.assert_array_equal(fr['mask'], f['mask'])
+
+    def test_ptydscan_defaults(self):
+        '''
+        PtydScan keeps its own defaults
+        '''
+        from ptypy.core.data import PtydScan
+        self.assertEqual(PtydScan.DEFAULT.name, 'PtydScan')
+        self.assertIn('dfile', PtydScan.DEFAULT)
+        self.assertIn('source', PtydScan.DEFAULT)
+
+    def test_loaded_positions_and_weights(self):
+        '''
+        positions and weights returned by load() end up in the package
+        '''
+        import numpy as np
+
+        class PosScan(MoonFlowerScan):
+            def load(self, indices):
+                raw, _, _ = super().load(indices)
+                pos = {k: np.array([k * 1e-6, -k * 2e-6]) for k in indices}
+                weights = {k: np.arange(128 * 128).reshape(128, 128) % (k + 2) > 0 for k in indices}
+                return raw, pos, weights
+
+        for lp in ['data', 'common']:
+            pars = DATA.copy()
+            pars.load_parallel = lp
+            out = tu.PtyscanTestRunner(PosScan, data_params=pars, save_type=None, auto_frames=20)
+            msg = out['msgs'][0]
+            np.testing.assert_allclose(msg['chunk'].positions,
+                                       [[k * 1e-6, -k * 2e-6] for k in msg['chunk'].indices])
+            for frame in msg['iterable']:
+                k = frame['index']
+                np.testing.assert_array_equal(frame['mask'], np.arange(128 * 128).reshape(128, 128) % (k + 2) > 0)
+
+
+    def test_frame_blocks(self):
+        '''
+        frames arrive in contiguous blocks that the storages adopt
+        '''
+        import numpy as np
+        from ptypy.core import Ptycho
+        pars = DATA.copy()
+        pars.add_poisson_noise = False
+        for shape in [128, 64]:
+            pars.shape = shape
+            np.random.seed(0)
+            out = tu.PtyscanTestRunner(MoonFlowerScan, data_params=pars, save_type=None, auto_frames=20)
+            ref = out['msgs'][0]
+
+            np.random.seed(0)
+            a = MoonFlowerScan(pars)
+            a.block_dtypes = (np.float32, bool)
+            a.initialize()
+            msg = a.auto(20)
+            chunk = msg['chunk']
+            self.assertEqual(chunk.data_block.shape, (20, shape, shape))
+            self.assertEqual(chunk.data_block.dtype, np.float32)
+            self.assertEqual(chunk.weights_block.dtype, bool)
+            for k, (fr, f) in enumerate(zip(ref['iterable'], msg['iterable'])):
+                self.assertTrue(np.shares_memory(f['data'], chunk.data_block))
+                np.testing.assert_array_equal(f['data'], fr['data'].astype(np.float32))
+                np.testing.assert_array_equal(f['mask'], fr['mask'])
+
+        p = u.Param()
+        p.verbose_level = "critical"
+        p.io = u.Param(rfile=None)
+        p.io.autosave = u.Param(active=False)
+        p.io.autoplot = u.Param(active=False)
+        p.io.interaction = u.Param(active=False)
+        p.scans = u.Param()
+        p.scans.MF = u.Param(name='BlockFull', propagation='farfield')
+        p.scans.MF.data = u.Param(name='MoonFlowerScan', num_frames=50, shape=32, save=None)
+        p.frames_per_block = 20
+        P = Ptycho(p, level=1)
+        ptyscan = P.model.scans['MF'].ptyscan
+        auto = ptyscan.auto
+        chunks = []
+
+        def recorded_auto(*args, **kwargs):
+            msg = auto(*args, **kwargs)
+            if isinstance(msg, dict):
+                chunks.append(msg['chunk'])
+            return msg
+
+        ptyscan.auto = recorded_auto
+        P.init_data()
+        diffs = list(P.diff.storages.values())
+        masks = list(P.mask.storages.values())
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(diffs), 3)
+        for chunk, s, m in zip(chunks, diffs, masks):
+            for v in P.diff.views_in_storage(s):
+                self.assertTrue(np.shares_memory(v.data, s.data))
+            # adopted, not copied
+            self.assertIs(s.data, chunk.data_block)
+            self.assertIs(m.data, chunk.weights_block)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+'''
+Tests for the MPI helpers that can run on a single process
+'''
+
+import unittest
+import queue
+import threading
+import numpy as np
+from ptypy.utils import parallel
+
+
+class FakeRequest(object):
+
+    def __init__(self, complete=None):
+        self.complete = complete
+
+    def Wait(self):
+        if self.complete is not None:
+            self.complete()
+
+
+class FakeComm(object):
+    """
+    Point-to-point messages between ranks that run as threads
+    of this process.
+    """
+    def __init__(self, rank, mailboxes):
+        self.rank = rank
+        self.mailboxes = mailboxes
+
+    def Get_rank(self):
+        return self.rank
+
+    def Isend(self, buf, dest):
+        self.mailboxes[(self.rank, dest)].put(buf.copy())
+        return FakeRequest()
+
+    def Irecv(self, buf, source):
+        def complete():
+            buf[...] = self.mailboxes[(source, self.rank)].get(timeout=10)
+        return FakeRequest(complete)
+
+
+class ParallelTest(unittest.TestCase):
+
+    def test_allreduce_halo_without_mpi(self):
+        a = np.ones((2, 8, 8))
+        out = parallel.allreduce_halo(a, [(0, 8, 0, 8)])
+        self.assertIs(out, a)
+        np.testing.assert_array_equal(a, 1.)
+
+    def test_allreduce_halo(self):
+        boxes = [(0, 10, 0, 12), (6, 20, 4, 16), (15, 25, 0, 30), (0, 0, 0, 0), (2, 8, 20, 30)]
+        size = len(boxes)
+        rng = np.random.default_rng(0)
+        arrays = []
+        for r0, r1, c0, c1 in boxes:
+            a = np.zeros((2, 25, 30))
+            a[:, r0:r1, c0:c1] = rng.integers(1, 10, size=(2, r1 - r0, c1 - c0))
+            arrays.append(a)
+        # what a full allreduce would give
+        full = np.sum(arrays, axis=0)
+        before = [a.copy() for a in arrays]
+
+        mailboxes = {(i, j): queue.Queue() for i in range(size) for j in range(size)}
+        errors = []
+
+        def run(rank):
+            try:
+                parallel.allreduce_halo(arrays[rank], boxes, FakeComm(rank, mailboxes))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(rank,)) for rank in range(size)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+        for rank, (r0, r1, c0, c1) in enumerate(boxes):
+            inside = np.zeros((25, 30), dtype=bool)
+            inside[r0:r1, c0:c1] = True
+            np.testing.assert_array_equal(arrays[rank][:, inside], full[:, inside])
+            np.testing.assert_array_equal(arrays[rank][:, ~inside], before[rank][:, ~inside])
+        for q in mailboxes.values():
+            self.assertTrue(q.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
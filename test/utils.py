@@ -45,13 +45,22 @@ def PtyscanTestRunner(ptyscan_instance, data_params, save_type='append', auto_fr
 
 
 def EngineTestRunner(engine_params,propagator='farfield',output_path='./', output_file=None,
-                    autosave=True, scanmodel="Full", verbose_level="info", init_correct_probe=False):
-
+                    autosave=True, scanmodel="Full", verbose_level="info", init_correct_probe=False,
+                    num_frames=200, shape=64, frames_per_block=None, io=None, scan=None,
+                    level=4, run=True):
+    """
+    Set up a Ptycho instance for a MoonFlowerScan and run `engine_params`
+    on it. The `io` and `scan` parameters are merged into ``p.io`` and
+    ``p.scans.MF``. With ``run=False`` or ``level < 4`` the instance is
+    returned before the engine runs, e.g. to instrument the engine first.
+    """
     p = u.Param()
     p.verbose_level = verbose_level
+    if frames_per_block is not None:
+        p.frames_per_block = frames_per_block
     p.io = u.Param()
     p.io.home = output_path
-    p.io.rfile = "%s.ptyr" % output_file
+    p.io.rfile = None if output_file is None else "%s.ptyr" % output_file
     p.io.interaction = u.Param()
     p.io.interaction.active = False
     p.io.autosave = u.Param(active=autosave)
@@ -62,8 +71,8 @@ def EngineTestRunner(engine_params,propagator='farfield',output_path='./', outpu
     p.scans.MF.propagation = propagator
     p.scans.MF.data = u.Param()
     p.scans.MF.data.name = 'MoonFlowerScan'
-    p.scans.MF.data.num_frames = 200
-    p.scans.MF.data.shape = 64
+    p.scans.MF.data.num_frames = num_frames
+    p.scans.MF.data.shape = shape
     p.scans.MF.data.save = None
     p.scans.MF.data.photons = 1e8
     p.scans.MF.data.psf = 0.0
@@ -71,12 +80,18 @@ def EngineTestRunner(engine_params,propagator='farfield',output_path='./', outpu
     p.scans.MF.data.add_poisson_noise = False
     p.scans.MF.coherence = u.Param()
     p.scans.MF.coherence.num_probe_modes = 1
-    p.engines = u.Param()
-    p.engines.engine00 = engine_params
-    P = Ptycho(p, level=4)
+    if io is not None:
+        p.io.update(io, in_place_depth=3)
+    if scan is not None:
+        p.scans.MF.update(scan, in_place_depth=3)
+    if engine_params is not None:
+        p.engines = u.Param()
+        p.engines.engine00 = engine_params
+    P = Ptycho(p, level=level)
     if init_correct_probe:
         P.probe.S['SMFG00'].data[0] = P.model.scans['MF'].ptyscan.pr
-    P.run()
+    if run and level == 4:
+        P.run()
 
     # important for subdividing data, ensure a fresh start if a test will be
     # run afterwards